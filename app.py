@@ -1,16 +1,76 @@
-from flask import Flask, render_template, request, send_file
+from flask import Flask, Request, Response, g, render_template, request, send_file, jsonify, stream_with_context
+from werkzeug.exceptions import RequestEntityTooLarge
+from werkzeug.utils import secure_filename
+from werkzeug.security import safe_join
+import hashlib
 import os
+import io
 import json
-import tempfile
-from utils.generator import build_docx, build_pdf
+import time
+from utils import metrics
+from utils.cache import RenderCache, render_key
+from utils.compress import compressor
+from utils.drafts import DraftConflict, apply_patch, draft_store
+from utils.executor import RenderExecutor, RenderBusy, RenderTimeout
+from utils.zipstream import iter_zip
+from utils.jobs import JobManager, MemoryResultStore, FileResultStore
+from utils.preview import PREVIEW_FORMATS, render_preview
+from utils.generator import fragment_cache, render
+from utils.images import MAX_PHOTO_BYTES, photo_store
+from utils.layout import build_layout
+from utils.ratelimit import RateLimited, client_id, limiter_from_env, request_cost
+from utils.scheduler import FairScheduler
+from utils.schema import MAX_PAYLOAD_BYTES, TEMPLATES, PayloadTooLarge, SchemaError, parse_form, parse_json
+from utils.warmup import WARMUP_CV, WarmUp, render_steps
+
+class CVRequest(Request):
+    @property
+    def max_content_length(self):
+        # enforced as the body is read, so chunked uploads or ones without a Content-Length are cut off too.
+        # Werkzeug stops quietly at the limit, so bodies are read one byte past it for _body to tell.
+        if self.endpoint == "upload_photo":
+            return MAX_PHOTO_BYTES + PHOTO_FORM_OVERHEAD
+        if self.endpoint == "generate_batch":
+            return None  # read one item at a time; each is checked by the schema
+        return MAX_PAYLOAD_BYTES + 1
 
 app = Flask(__name__)
+app.request_class = CVRequest
+
+render_cache = RenderCache(
+    max_entries=int(os.environ.get("CV_CACHE_ENTRIES", 128)),
+    max_bytes=int(os.environ.get("CV_CACHE_BYTES", 64 * 1024 * 1024)),
+    disk_dir=os.environ.get("CV_CACHE_DIR") or None,
+    disk_max_bytes=int(os.environ.get("CV_CACHE_DISK_BYTES", 256 * 1024 * 1024)),
+)
+
+render_executor = RenderExecutor(
+    workers=int(os.environ.get("CV_RENDER_WORKERS", 0)),
+    max_pending=int(os.environ.get("CV_RENDER_QUEUE", 0)) or None,
+    timeout=float(os.environ.get("CV_RENDER_TIMEOUT", 30)),
+)
+
+# admission control: per-client token buckets, then fair turns at the render slots
+rate_limiter = limiter_from_env()
+API_KEYS = frozenset(k for k in os.environ.get("CV_API_KEYS", "").split(",") if k)
+_slots = int(os.environ.get("CV_RENDER_SLOTS", 0)) or render_executor.workers or 1
+scheduler = FairScheduler(
+    slots=_slots,
+    max_waiting=int(os.environ.get("CV_RENDER_WAITING", 0)) or max(32, 8 * _slots),
+    max_waiting_per_client=int(os.environ.get("CV_RENDER_WAITING_PER_CLIENT", 0)) or None,
+    timeout=render_executor.timeout,
+)
+
+MIMETYPES = {
+    "docx": "application/vnd.openxmlformats-officedocument.wordprocessingml.document",
+    "pdf": "application/pdf",
+}
 
 @app.route('/favicon.ico')
 def favicon():
     icon_path = os.path.join(os.path.dirname(__file__), 'static', 'curriculum-vitae.png')
     if os.path.exists(icon_path):
-        return send_file(icon_path, mimetype='image/png')
+        return send_file(icon_path, mimetype='image/png', max_age=86400)
     return ('', 404)
 
 @app.route("/")
@@ -24,81 +84,504 @@ def index():
 def classic():
     return render_template("index.html")
 
-@app.route("/generate", methods=["POST"]) 
-def generate():
-    name = request.form.get("name", "").strip()
-    job_title = request.form.get("job_title", "").strip()
-    phone = request.form.get("phone", "").strip()
-    email = request.form.get("email", "").strip()
-    location = request.form.get("location", "").strip()
-    linkedin = request.form.get("linkedin", "").strip()
-    github = request.form.get("github", "").strip()
-    website = request.form.get("website", "").strip()
-    summary = request.form.get("summary", "").strip()
-    skills = request.form.get("skills", "").strip()
-    languages = request.form.get("languages", "").strip()
-    references = request.form.get("references", "").strip()
-
-    experiences_json = request.form.get("experiences_json", "[]")
-    education_json = request.form.get("education_json", "[]")
-    projects_json = request.form.get("projects_json", "[]")
-    certifications_json = request.form.get("certifications_json", "[]")
-    extras_json = request.form.get("extras_json", "[]")
+def _client(req=request):
+    return client_id(req.headers, req.remote_addr, API_KEYS)
 
+def _render_cached(key, data, output_format, template, accent, block=False, client="-", cost=1.0, optimize=None):
+    # block waits for a render slot as long as it takes instead of answering 503
+    body = render_cache.get(key)
+    if body is None:
+        with scheduler.slot(client, cost, timeout=None if block else -1):
+            body = render_executor.render(data, output_format, template, accent, block=block, optimize=optimize)
+        render_cache.put(key, body)
+    return body
+
+def _render_job(data, output_format, template, accent, block=False, optimize=None, client="-"):
+    # a background job takes its turn at the render slots in the queue of the client that submitted it
+    return _render_cached(render_key(data, template, accent, output_format, optimize), data, output_format, template,
+                          accent, block=block, client=client, cost=request_cost(data), optimize=optimize)
+
+job_manager = JobManager(
+    _render_job,
+    store=FileResultStore(os.environ["CV_JOB_STORE_DIR"]) if os.environ.get("CV_JOB_STORE_DIR") else MemoryResultStore(),
+    workers=int(os.environ.get("CV_JOB_WORKERS", 2)),
+    ttl=float(os.environ.get("CV_JOB_TTL", 600)),
+    max_pending=int(os.environ.get("CV_JOB_QUEUE", 100)),
+)
+
+def _warmup_steps():
+    if render_executor.workers:
+        # each worker renders every template and format as it starts; wait for all of them
+        steps = [("workers", render_executor.warm)]
+    else:
+        steps = render_steps(render)
+    steps += [
+        (f"preview/{template}/{fmt}", lambda t=template, f=fmt: render_preview(WARMUP_CV, t, fmt=f))
+        for template in TEMPLATES
+        for fmt in PREVIEW_FORMATS
+    ]
+    steps.append(("parse", lambda: parse_json(WARMUP_CV)))
+    return steps
+
+warmup = WarmUp(_warmup_steps())
+if os.environ.get("CV_WARMUP", "1") != "0":
+    warmup.start()
+else:
+    warmup.skip()
+
+@app.before_request
+def start_timing():
+    g.request_start = time.perf_counter()
+    g.timing_ctx = metrics.collect()
+    g.timings = g.timing_ctx.__enter__()
+
+@app.after_request
+def finish_timing(response):
+    if "timings" not in g:
+        return response
+    elapsed = time.perf_counter() - g.request_start
+    endpoint = request.endpoint or "unknown"
+    metrics.REGISTRY.observe("cv_request_seconds", elapsed, {"endpoint": endpoint})
+    if request.args.get("timing") == "1" or request.headers.get("X-Server-Timing"):
+        response.headers["Server-Timing"] = metrics.server_timing(g.timings) + f", total;dur={elapsed * 1000:.2f}"
+    if endpoint in ("generate", "generate_draft") and response.status_code == 200:
+        response.response = _timed_body(response.response)
+        response.direct_passthrough = False
+    return response
+
+def _timed_body(body):
+    # call_on_close doesn't fire for send_file's passthrough body, so time the iteration itself
+    t0 = time.perf_counter()
     try:
-        experiences = json.loads(experiences_json) if experiences_json else []
-    except Exception:
-        experiences = []
-    try:
-        education = json.loads(education_json) if education_json else []
-    except Exception:
-        education = []
-    try:
-        projects = json.loads(projects_json) if projects_json else []
-    except Exception:
-        projects = []
+        yield from body
+    finally:
+        if hasattr(body, "close"):
+            body.close()
+        metrics.REGISTRY.observe("cv_stage_seconds", time.perf_counter() - t0, {"stage": "send"})
+
+_static_hashes = {}
+
+def static_hash(filename):
+    # a static file's content hash, recomputed when the file changes; None if there's no such file
+    path = safe_join(app.static_folder, filename)
     try:
-        certifications = json.loads(certifications_json) if certifications_json else []
-    except Exception:
-        certifications = []
+        mtime = os.stat(path).st_mtime_ns
+    except (OSError, TypeError):
+        return None
+    cached = _static_hashes.get(filename)
+    if cached is None or cached[0] != mtime:
+        with open(path, "rb") as f:
+            cached = _static_hashes[filename] = (mtime, hashlib.sha256(f.read()).hexdigest()[:12])
+    return cached[1]
+
+@app.url_defaults
+def static_version(endpoint, values):
+    # url_for("static", ...) names the file's content: /static/style.css?v=<hash>
+    if endpoint == "static" and "v" not in values:
+        version = static_hash(values.get("filename", ""))
+        if version:
+            values["v"] = version
+
+@app.after_request
+def cache_static(response):
+    # a versioned static URL only ever has that content, so browsers needn't ask again
+    if (request.endpoint == "static" and response.status_code in (200, 304)
+            and request.args.get("v") == static_hash(request.view_args["filename"])):
+        response.headers["Cache-Control"] = "public, max-age=31536000, immutable"
+    return response
+
+@app.after_request
+def compress_response(response):
+    # registered last so it runs first, before finish_timing wraps the body
+    return compressor.apply(request, response)
+
+@app.teardown_request
+def stop_timing(exc):
+    ctx = g.pop("timing_ctx", None)
+    if ctx is not None:
+        ctx.__exit__(None, None, None)
+
+@app.errorhandler(RenderBusy)
+def render_busy(e):
+    return jsonify(error="server busy, retry later"), 503, {"Retry-After": str(e.retry_after)}
+
+@app.errorhandler(RenderTimeout)
+def render_timeout(e):
+    return jsonify(error=str(e)), 504
+
+@app.errorhandler(RateLimited)
+def rate_limited(e):
+    return jsonify(error="rate limit exceeded, retry later"), 429, {"Retry-After": str(e.retry_after)}
+
+@app.errorhandler(DraftConflict)
+def draft_conflict(e):
+    return jsonify(error="draft has changed; fetch it again", draft=e.draft.to_dict()), 412, {"ETag": f'"{e.draft.etag}"'}
+
+@app.errorhandler(SchemaError)
+def invalid_payload(e):
+    return jsonify(error=e.title, fields=e.errors), e.status
+
+@app.errorhandler(RequestEntityTooLarge)
+def body_too_large(e):
+    # the body ran over CVRequest.max_content_length while it was read
+    limit = request.max_content_length
+    return invalid_payload(PayloadTooLarge(f"more than {limit}", limit))
+
+def _body(req=request):
+    # the whole body, refused if it's over MAX_PAYLOAD_BYTES whether or not it said how long it was;
+    # the form parser then reads it from here
+    if req.content_length and req.content_length > MAX_PAYLOAD_BYTES:
+        raise PayloadTooLarge(req.content_length)
+    body = req.get_data(cache=True)
+    if len(body) > MAX_PAYLOAD_BYTES:
+        raise PayloadTooLarge(len(body))
+    return body
+
+def _request_data(req=request, multiple=False):
+    # (data, output_format, template, accent, optimize) from one JSON object or the page's form;
+    # with multiple, output_format and template are tuples
+    _body(req)
+    if req.is_json:
+        cv, *options = parse_json(req.get_json(silent=True), multiple)
+    else:
+        cv, *options = parse_form(req.form, multiple)
+    return (cv.to_dict(), *options)
+
+def _combinations(data, formats, templates, accent, optimize=None):
+    # [(filename, key, template, format)] for every template × format of one request
+    base = secure_filename(data["name"] or "cv") or "cv"
+    return [
+        (f"{base}-{template}.{fmt}" if len(templates) > 1 else f"{base}.{fmt}",
+         render_key(data, template, accent, fmt, optimize), template, fmt)
+        for template in templates
+        for fmt in formats
+    ]
+
+def _zip_combinations(combos, bodies):
+    return b"".join(iter_zip((filename, body) for (filename, *_), body in zip(combos, bodies)))
+
+def _render_combinations(data, combos, accent, client="-", cost=1.0, optimize=None):
+    # cached documents as they are; the rest share one build_layout() and render in parallel
+    bodies = [render_cache.get(key) for _, key, _, _ in combos]
+    missing = [i for i, body in enumerate(bodies) if body is None]
+    if missing:
+        layout = build_layout(data)
+        jobs = [(layout, combos[i][3], combos[i][2], accent, optimize) for i in missing]
+        # a slot per worker process the documents occupy; inline they render one after another in one
+        with scheduler.slot(client, cost, n=len(jobs) if render_executor.workers else 1):
+            rendered = render_executor.render_many(jobs)
+        for i, body in zip(missing, rendered):
+            render_cache.put(combos[i][1], body)
+            bodies[i] = body
+    return bodies
+
+@app.route("/generate", methods=["POST"]) 
+def generate():
+    with metrics.timer("cv_stage_seconds", stage="parse"):
+        data, formats, templates, accent, optimize = _request_data(multiple=True)
+    return _generate(data, formats, templates, accent, optimize)
+
+def _generate(data, formats, templates, accent, optimize=None):
+    client = _client()
+    cost = request_cost(data, len(formats) * len(templates))
+    rate_limiter.take(client, cost)
+    if len(formats) > 1 or len(templates) > 1:
+        return _generate_many(data, formats, templates, accent, client, cost, optimize)
+    output_format, template = formats[0], templates[0]
+    name = data["name"]
+    key = render_key(data, template, accent, output_format, optimize)
+    if request.if_none_match.contains_weak(key):
+        return ("", 304, {"ETag": f'"{key}"'})
+    with metrics.timer("cv_stage_seconds", stage="render", template=template, format=output_format):
+        body = _render_cached(key, data, output_format, template, accent, client=client, cost=cost, optimize=optimize)
+    rv = send_file(
+        io.BytesIO(body),
+        mimetype=MIMETYPES[output_format],
+        as_attachment=True,
+        download_name=f"{name or 'cv'}.{output_format}",
+        etag=key,
+    )
+    rv.headers["Cache-Control"] = "private, no-cache"
+    return rv
+
+def _generate_many(data, formats, templates, accent, client, cost, optimize=None):
+    # several formats and/or templates from one parse, as a ZIP
+    key = render_key(data, ",".join(templates), accent, ",".join(formats), optimize)
+    if request.if_none_match.contains_weak(key):
+        return ("", 304, {"ETag": f'"{key}"'})
+    combos = _combinations(data, formats, templates, accent, optimize)
+    with metrics.timer("cv_stage_seconds", stage="render", template=",".join(templates), format=",".join(formats)):
+        bodies = _render_combinations(data, combos, accent, client, cost, optimize)
+    rv = send_file(
+        io.BytesIO(_zip_combinations(combos, bodies)),
+        mimetype="application/zip",
+        as_attachment=True,
+        download_name=f"{data['name'] or 'cv'}.zip",
+        etag=key,
+    )
+    rv.headers["Cache-Control"] = "private, no-cache"
+    return rv
+
+# a preview draws one page of the layout, so it is charged this fraction of rendering the document
+PREVIEW_COST = 0.25
+
+@app.route("/preview", methods=["POST"])
+def preview():
+    data, _, template, accent, _ = _request_data()
+    fmt = (request.args.get("format") or request.form.get("format") or "svg").lower()
+    if fmt not in PREVIEW_FORMATS:
+        return jsonify(error=f"format must be one of: {', '.join(PREVIEW_FORMATS)}"), 400
+    client = _client()
+    cost = request_cost(data) * PREVIEW_COST
+    rate_limiter.take(client, cost)
+    key = render_key(data, template, accent, f"preview-{fmt}")
+    if request.if_none_match.contains_weak(key):
+        return ("", 304, {"ETag": f'"{key}"'})
+    body = render_cache.get(key)
+    if body is None:
+        # first page only and rendered in-process: it's cheap enough to skip the pool, but it
+        # still takes a render slot so previews can't crowd out documents
+        with scheduler.slot(client, cost):
+            with metrics.timer("cv_stage_seconds", stage="preview", template=template, format=fmt):
+                body = render_preview(data, template, accent, fmt)
+        render_cache.put(key, body)
+    rv = Response(body, mimetype=PREVIEW_FORMATS[fmt])
+    rv.set_etag(key)
+    rv.headers["Cache-Control"] = "private, no-cache"
+    return rv
+
+# saving or patching a draft is charged this fraction of a render
+DRAFT_COST = 0.1
+
+def _draft_json():
+    _body()
+    # JSON Patch has its own media type; any JSON body is accepted
+    body = request.get_json(force=True, silent=True)
+    if body is None:
+        raise SchemaError([{"field": "", "message": "expected a JSON body"}])
+    return body
+
+def _draft_response(draft, status=200):
+    rv = jsonify(draft.to_dict())
+    rv.status_code = status
+    rv.set_etag(draft.etag)
+    rv.headers["Location"] = f"/drafts/{draft.id}"
+    return rv
+
+def _valid_draft(doc):
+    parse_json(doc, multiple=True)
+    return doc
+
+@app.route("/drafts", methods=["POST"])
+def create_draft():
+    # a CV as /generate takes it, kept here so edits and exports needn't send all of it
+    doc = _draft_json()
+    rate_limiter.take(_client(), DRAFT_COST)
+    return _draft_response(draft_store.create(_valid_draft(doc)), 201)
+
+@app.route("/drafts/<draft_id>", methods=["GET"])
+def get_draft(draft_id):
+    draft = draft_store.get(draft_id)
+    if draft is None:
+        return jsonify(error="unknown or expired draft"), 404
+    rv = jsonify(draft.doc)
+    rv.set_etag(draft.etag)
+    rv.headers["Cache-Control"] = "private, no-cache"
+    return rv.make_conditional(request)
+
+@app.route("/drafts/<draft_id>", methods=["PATCH"])
+def patch_draft(draft_id):
+    # an RFC 6902 JSON Patch; with If-Match, only if the draft is still at that revision
+    patch = _draft_json()
+    rate_limiter.take(_client(), DRAFT_COST)
+    revision = None
+    if request.if_match and not request.if_match.star_tag:
+        tags = list(request.if_match)
+        revision = int(tags[0]) if len(tags) == 1 and tags[0].isdigit() else -1
+    draft = draft_store.update(draft_id, lambda doc: _valid_draft(apply_patch(doc, patch)), revision)
+    if draft is None:
+        return jsonify(error="unknown or expired draft"), 404
+    return _draft_response(draft)
+
+@app.route("/drafts/<draft_id>", methods=["DELETE"])
+def delete_draft(draft_id):
+    if not draft_store.delete(draft_id):
+        return jsonify(error="unknown or expired draft"), 404
+    return ("", 204)
+
+@app.route("/drafts/<draft_id>/generate", methods=["GET", "POST"])
+def generate_draft(draft_id):
+    # /generate for a stored draft: the body (or query) only picks output_format, template, accent and optimize.
+    # An unchanged draft renders to the same key, so its documents come from the render cache.
+    draft = draft_store.get(draft_id)
+    if draft is None:
+        return jsonify(error="unknown or expired draft"), 404
+    options = request.get_json(silent=True) if request.is_json else request.values
+    options = options if hasattr(options, "get") else {}
+    overrides = {k: options.get(k) for k in ("output_format", "template", "accent", "optimize") if options.get(k)}
+    with metrics.timer("cv_stage_seconds", stage="parse"):
+        cv, formats, templates, accent, optimize = parse_json({**draft.doc, **overrides}, multiple=True)
+    return _generate(cv.to_dict(), formats, templates, accent, optimize)
+
+# room for the multipart framing around an uploaded file
+PHOTO_FORM_OVERHEAD = 64 * 1024
+
+@app.route("/photos", methods=["POST"])
+def upload_photo():
+    # a headshot or logo: the image as the request body, or a form's "photo" file. It's
+    # prepared once here; CVs then send the returned id as their "photo".
+    multipart = request.mimetype == "multipart/form-data"
+    if request.content_length and request.content_length > MAX_PHOTO_BYTES + (PHOTO_FORM_OVERHEAD if multipart else 0):
+        raise PayloadTooLarge(request.content_length, MAX_PHOTO_BYTES)
+    client = _client()
+    rate_limiter.take(client, 1.0)
+    if multipart:
+        f = request.files.get("photo")
+        raw = f.read(MAX_PHOTO_BYTES + 1) if f else b""
+    else:
+        raw = request.stream.read(MAX_PHOTO_BYTES + 1)
+    if not raw:
+        raise SchemaError([{"field": "photo", "message": "expected an image as the body or a photo file field"}])
+    if len(raw) > MAX_PHOTO_BYTES:
+        raise PayloadTooLarge(len(raw), MAX_PHOTO_BYTES)
+    # decoding takes a render slot's worth of CPU, so it queues like one
+    with scheduler.slot(client), metrics.timer("cv_stage_seconds", stage="photo"):
+        photo = photo_store.put(raw)
+    rv = jsonify(photo.to_dict())
+    rv.status_code = 201
+    rv.headers["Location"] = f"/photos/{photo.id}"
+    return rv
+
+@app.route("/photos/<photo_id>")
+def get_photo(photo_id):
+    photo = photo_store.get(photo_id)
+    if photo is None:
+        return jsonify(error="unknown or expired photo"), 404
+    rv = Response(photo.data, mimetype=photo.mimetype)
+    rv.set_etag(photo.id)
+    # the id is the upload's hash, so what it names never changes
+    rv.headers["Cache-Control"] = "private, max-age=31536000, immutable"
+    return rv.make_conditional(request)
+
+NDJSON_MIMETYPES = ("application/x-ndjson", "application/jsonl")
+
+def _ndjson_items(stream):
+    # read line by line so the request body is never held in full
+    for line in stream:
+        line = line.strip()
+        if line:
+            yield json.loads(line)
+
+def _batch_entries(items, client):
+    errors = []
+    i = 0
     try:
-        extras = json.loads(extras_json) if extras_json else []
-    except Exception:
-        extras = []
-
-    output_format = request.form.get("output_format", "docx").lower()
-    template = request.form.get("template", "sidebar")
-    accent = request.form.get("accent", "#b87333")
-
-    data = {
-        "name": name,
-        "job_title": job_title,
-        "phone": phone,
-        "email": email,
-        "location": location,
-        "linkedin": linkedin,
-        "github": github,
-        "website": website,
-        "summary": summary,
-        "skills": [s.strip() for s in skills.split("\n") if s.strip()],
-        "languages": [l.strip() for l in languages.split("\n") if l.strip()],
-        "references": references,
-        "experiences": experiences,
-        "education": education,
-        "projects": projects,
-        "certifications": certifications,
-        "extras": extras,
-    }
-
-    tmp_dir = tempfile.mkdtemp()
-    if output_format == "pdf":
-        tmp_path = os.path.join(tmp_dir, f"{name or 'cv'}.pdf")
-        build_pdf(data, tmp_path, template, accent)
-        return send_file(tmp_path, as_attachment=True)
+        for i, item in enumerate(items):
+            try:
+                cv, output_format, template, accent, optimize = parse_json(item)
+            except SchemaError as e:
+                errors.append(f"{i}: {e}")
+                continue
+            data = cv.to_dict()
+            base = secure_filename(str(item.get("filename") or data["name"] or "cv")) or "cv"
+            key = render_key(data, template, accent, output_format, optimize)
+            cost = request_cost(data)
+            try:
+                # each item is charged like a /generate; once the bucket is empty the archive ends here
+                rate_limiter.take(client, cost)
+            except RateLimited as e:
+                errors.append(f"{i}: rate limit exceeded, retry the remaining items after {e.retry_after}s")
+                break
+            try:
+                # batch items wait for a free slot instead of shedding load
+                body = _render_cached(key, data, output_format, template, accent, block=True,
+                                      client=client, cost=cost, optimize=optimize)
+            except Exception as e:
+                errors.append(f"{i}: {e}")
+                continue
+            yield f"{i:05d}-{base}.{output_format}", body
+    except ValueError as e:
+        errors.append(f"invalid NDJSON after item {i}: {e}")
+    if errors:
+        yield "errors.txt", "\n".join(errors).encode("utf-8")
+
+@app.route("/generate/batch", methods=["POST"])
+def generate_batch():
+    # streamed as it's built, so no length or ETag to serve a Range from; resumable downloads are /jobs
+    if request.mimetype in NDJSON_MIMETYPES:
+        items = _ndjson_items(request.stream)
     else:
-        tmp_path = os.path.join(tmp_dir, f"{name or 'cv'}.docx")
-        build_docx(data, tmp_path, template, accent)
-        return send_file(tmp_path, as_attachment=True)
+        items = request.get_json(silent=True)
+        if not isinstance(items, list):
+            return jsonify(error="expected a JSON array or NDJSON stream of CV payloads"), 400
+    return Response(
+        stream_with_context(iter_zip(_batch_entries(items, _client()))),
+        mimetype="application/zip",
+        headers={"Content-Disposition": 'attachment; filename="cvs.zip"'},
+    )
+
+@app.route("/jobs", methods=["POST"])
+def create_job():
+    data, output_format, template, accent, optimize = _request_data()
+    client = _client()
+    rate_limiter.take(client, request_cost(data))
+    job = job_manager.submit(data, output_format, template, accent, f"{data['name'] or 'cv'}.{output_format}",
+                             optimize, client)
+    rv = jsonify(job.to_dict())
+    rv.status_code = 202
+    rv.headers["Location"] = f"/jobs/{job.id}"
+    return rv
+
+@app.route("/jobs/<job_id>")
+def job_status(job_id):
+    job = job_manager.get(job_id)
+    if job is None:
+        return jsonify(error="unknown or expired job"), 404
+    return jsonify(job.to_dict())
+
+@app.route("/jobs/<job_id>/result")
+def job_result(job_id):
+    job = job_manager.get(job_id)
+    if job is None:
+        return jsonify(error="unknown or expired job"), 404
+    if job.status == "failed":
+        return jsonify(job.to_dict()), 500
+    f = job_manager.store.open(job.id) if job.status == "done" else None
+    if f is None:
+        return jsonify(job.to_dict()), 409
+    # a job's result never changes, so its id is a strong ETag: If-Range can resume a download
+    return send_file(f, mimetype=MIMETYPES[job.output_format], as_attachment=True, download_name=job.filename,
+                     etag=job.id)
+
+@app.route("/healthz")
+def healthz():
+    # readiness: 503 until the startup warm-up has rendered every template and format
+    state = warmup.to_dict()
+    if warmup.ready:
+        return jsonify(state)
+    return jsonify(state), 503, {"Retry-After": "1"}
+
+@app.route("/metrics")
+def prometheus_metrics():
+    extra = [(f"cv_cache_{k}_total", "counter", v) for k, v in render_cache.counters.items()]
+    extra += [(f"cv_fragment_cache_{k}_total", "counter", v) for k, v in fragment_cache.counters.items()]
+    extra += [(f"cv_rate_limit_{k}_total", "counter", v) for k, v in rate_limiter.counters.items()]
+    extra += [(f"cv_scheduler_{k}_total", "counter", v) for k, v in scheduler.counters.items()]
+    extra += [(f"cv_render_executor_{k}_total", "counter", v) for k, v in render_executor.counters.items()]
+    extra += [(f"cv_photo_cache_{k}_total", "counter", v) for k, v in photo_store.counters.items()]
+    extra += [(f"cv_drafts_{k}_total", "counter", v) for k, v in draft_store.counters.items()]
+    extra += [(f"cv_compressed_{k}_total", "counter", v) for k, v in compressor.counters.items()]
+    body = metrics.REGISTRY.render(extra)
+    return Response(body, mimetype="text/plain", headers={"Content-Type": "text/plain; version=0.0.4"})
+
+@app.route("/cache/stats")
+def cache_stats():
+    stats = render_cache.stats()
+    stats["fragments"] = fragment_cache.stats()
+    stats["photos"] = photo_store.stats()
+    stats["drafts"] = draft_store.stats()
+    stats["compressed"] = compressor.stats()
+    return jsonify(stats)
 
 if __name__ == "__main__":
     port = int(os.environ.get("PORT", 5000))
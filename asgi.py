@@ -0,0 +1,263 @@
+"""ASGI entry point: ``uvicorn asgi:app``.
+
+POST /generate is served natively. The request body is read as it arrives
+without holding a thread, the render runs on the render executor (a worker
+process, or a thread when CV_RENDER_WORKERS=0) and the document goes out in
+chunks, each send awaited so a slow reader only costs a socket and one chunk
+of buffer. Every other route is the Flask app from app.py, called in a
+thread through a small WSGI bridge; its request body and response are
+streamed the same way.
+"""
+import asyncio
+import contextvars
+import io
+import sys
+import time
+
+from werkzeug.utils import send_file
+from werkzeug.wrappers import Request
+
+from app import (
+    API_KEYS, MIMETYPES, _combinations, _request_data, _zip_combinations, app as flask_app, job_manager, rate_limiter,
+    render_cache, render_executor, scheduler,
+)
+from utils import metrics
+from utils.cache import render_key
+from utils.compress import compressor
+from utils.executor import RenderBusy, RenderTimeout
+from utils.layout import build_layout
+from utils.ratelimit import RateLimited, client_id, request_cost
+from utils.schema import MAX_PAYLOAD_BYTES, PayloadTooLarge, SchemaError
+
+CHUNK_SIZE = 64 * 1024
+
+
+def _environ(scope, body):
+    # WSGI environ for an ASGI http scope; body is a readable binary stream
+    server = scope.get("server") or ("localhost", 80)
+    client = scope.get("client") or ("", 0)
+    environ = {
+        "REQUEST_METHOD": scope["method"],
+        "SCRIPT_NAME": scope.get("root_path", "").encode("utf-8").decode("latin-1"),
+        "PATH_INFO": scope["path"].encode("utf-8").decode("latin-1"),
+        "QUERY_STRING": scope["query_string"].decode("latin-1"),
+        "SERVER_NAME": server[0],
+        "SERVER_PORT": str(server[1]),
+        "SERVER_PROTOCOL": f"HTTP/{scope.get('http_version', '1.1')}",
+        "REMOTE_ADDR": client[0],
+        "REMOTE_PORT": str(client[1]),
+        "wsgi.version": (1, 0),
+        "wsgi.url_scheme": scope.get("scheme", "http"),
+        "wsgi.input": body,
+        "wsgi.input_terminated": True,
+        "wsgi.errors": sys.stderr,
+        "wsgi.multithread": True,
+        "wsgi.multiprocess": False,
+        "wsgi.run_once": False,
+    }
+    for name, value in scope["headers"]:
+        name = name.decode("latin-1").upper().replace("-", "_")
+        value = value.decode("latin-1")
+        if name not in ("CONTENT_TYPE", "CONTENT_LENGTH"):
+            name = "HTTP_" + name
+        environ[name] = f"{environ[name]},{value}" if name in environ else value
+    return environ
+
+
+class _ReceiveStream(io.RawIOBase):
+    """wsgi.input for a thread: each read waits on the event loop's receive()."""
+
+    def __init__(self, receive, loop):
+        self._receive = receive
+        self._loop = loop
+        self._buf = b""
+        self._more = True
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        while not self._buf and self._more:
+            message = asyncio.run_coroutine_threadsafe(self._receive(), self._loop).result()
+            if message["type"] == "http.disconnect":
+                raise OSError("client disconnected")
+            self._buf = message.get("body", b"")
+            self._more = message.get("more_body", False)
+        n = min(len(b), len(self._buf))
+        b[:n] = self._buf[:n]
+        self._buf = self._buf[n:]
+        return n
+
+
+async def _read_body(scope, receive, limit):
+    # the whole body, refused as soon as it (or its Content-Length) goes over limit
+    for name, value in scope["headers"]:
+        if name == b"content-length" and value.isdigit() and int(value) > limit:
+            raise PayloadTooLarge(int(value), limit)
+    chunks, size, more = [], 0, True
+    while more:
+        message = await receive()
+        if message["type"] == "http.disconnect":
+            raise ConnectionResetError("client disconnected")
+        chunk = message.get("body", b"")
+        size += len(chunk)
+        if size > limit:
+            raise PayloadTooLarge(size, limit)
+        chunks.append(chunk)
+        more = message.get("more_body", False)
+    return b"".join(chunks)
+
+
+async def _send(send, status, headers, chunks):
+    # chunks is an iterable of bytes; each send() waits for the transport to drain
+    await send({"type": "http.response.start", "status": status, "headers": headers})
+    for chunk in chunks:
+        if chunk:
+            await send({"type": "http.response.body", "body": chunk, "more_body": True})
+    await send({"type": "http.response.body", "body": b""})
+
+
+def _headers(rv):
+    return [(k.lower().encode("latin-1"), v.encode("latin-1")) for k, v in rv.headers.to_wsgi_list()]
+
+
+def _error(status, payload, headers=()):
+    body = flask_app.json.dumps(payload).encode("utf-8") + b"\n"
+    return status, [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())] + list(headers), [body]
+
+
+def _chunked(body):
+    view = memoryview(body)
+    return (bytes(view[i:i + CHUNK_SIZE]) for i in range(0, len(view), CHUNK_SIZE))
+
+
+async def _render(data, formats, templates, accent, client, cost, optimize=None):
+    # the document, or a ZIP of every template × format rendered concurrently from one layout
+    combos = _combinations(data, formats, templates, accent, optimize)
+    bodies = [render_cache.get(key) for _, key, _, _ in combos]
+    missing = [i for i, body in enumerate(bodies) if body is None]
+    if missing:
+        layout = build_layout(data) if len(combos) > 1 else data
+        # a slot per document: they render at once, on worker processes or executor threads
+        async with scheduler.slot_async(client, cost, n=len(missing)):
+            rendered = await asyncio.gather(*[
+                render_executor.render_async(layout, combos[i][3], combos[i][2], accent, optimize) for i in missing
+            ])
+        for i, body in zip(missing, rendered):
+            render_cache.put(combos[i][1], body)
+            bodies[i] = body
+    return bodies[0] if len(combos) == 1 else _zip_combinations(combos, bodies)
+
+
+async def _generate(scope, receive):
+    try:
+        with metrics.timer("cv_stage_seconds", stage="parse"):
+            req = Request(_environ(scope, io.BytesIO(await _read_body(scope, receive, MAX_PAYLOAD_BYTES))))
+            data, formats, templates, accent, optimize = _request_data(req, multiple=True)
+        client = client_id(req.headers, req.remote_addr, API_KEYS)
+        cost = request_cost(data, len(formats) * len(templates))
+        rate_limiter.take(client, cost)
+        if len(formats) > 1 or len(templates) > 1:
+            # several documents from one parse, as a ZIP (see app._generate_many)
+            key = render_key(data, ",".join(templates), accent, ",".join(formats), optimize)
+            mimetype, download_name = "application/zip", f"{data['name'] or 'cv'}.zip"
+        else:
+            output_format, template = formats[0], templates[0]
+            key = render_key(data, template, accent, output_format, optimize)
+            mimetype, download_name = MIMETYPES[output_format], f"{data['name'] or 'cv'}.{output_format}"
+        if req.if_none_match.contains_weak(key):
+            return 304, [(b"etag", f'"{key}"'.encode())], []
+        with metrics.timer("cv_stage_seconds", stage="render", template=",".join(templates), format=",".join(formats)):
+            body = await _render(data, formats, templates, accent, client, cost, optimize)
+    except SchemaError as e:
+        return _error(e.status, {"error": e.title, "fields": e.errors})
+    except RateLimited as e:
+        return _error(429, {"error": "rate limit exceeded, retry later"}, [(b"retry-after", str(e.retry_after).encode())])
+    except RenderBusy as e:
+        return _error(503, {"error": "server busy, retry later"}, [(b"retry-after", str(e.retry_after).encode())])
+    except RenderTimeout as e:
+        return _error(504, {"error": str(e)})
+    # headers, ETag, Range handling and encoding as Flask's send_file and after_request give /generate
+    rv = send_file(
+        io.BytesIO(body),
+        req.environ,
+        mimetype=mimetype,
+        as_attachment=True,
+        download_name=download_name,
+        etag=key,
+    )
+    rv.headers["Cache-Control"] = "private, no-cache"
+    compressor.apply(req, rv)
+    if rv.status_code == 200:
+        return 200, _headers(rv), _chunked(rv.get_data() if "Content-Encoding" in rv.headers else body)
+    return rv.status_code, _headers(rv), list(rv.iter_encoded())
+
+
+async def _native(scope, receive, send, handler, endpoint):
+    t0 = time.perf_counter()
+    try:
+        status, headers, chunks = await handler(scope, receive)
+    except ConnectionResetError:
+        return  # gone before the request was complete; nothing to answer
+    t_send = time.perf_counter()
+    try:
+        await _send(send, status, headers, chunks)
+    finally:
+        if endpoint == "generate" and status == 200:
+            metrics.REGISTRY.observe("cv_stage_seconds", time.perf_counter() - t_send, {"stage": "send"})
+        metrics.REGISTRY.observe("cv_request_seconds", time.perf_counter() - t0, {"endpoint": endpoint})
+
+
+async def _wsgi(scope, receive, send):
+    # The Flask app in a thread; response chunks are pulled in the thread and sent from the
+    # loop. Every step runs in the same copied context, which stream_with_context relies on.
+    loop = asyncio.get_running_loop()
+    context = contextvars.copy_context()
+    environ = _environ(scope, io.BufferedReader(_ReceiveStream(receive, loop)))
+    started = []
+
+    def start_response(status, headers, exc_info=None):
+        started[:] = [int(status.split(" ", 1)[0]), [(k.lower().encode("latin-1"), v.encode("latin-1")) for k, v in headers]]
+
+    def step(fn, *args):
+        return loop.run_in_executor(None, context.run, fn, *args)
+
+    body = await step(flask_app, environ, start_response)
+    try:
+        chunks = iter(body)
+        chunk = await step(next, chunks, None)
+        await send({"type": "http.response.start", "status": started[0], "headers": started[1]})
+        while chunk is not None:
+            if chunk:
+                await send({"type": "http.response.body", "body": chunk, "more_body": True})
+            chunk = await step(next, chunks, None)
+        await send({"type": "http.response.body", "body": b""})
+    finally:
+        if hasattr(body, "close"):
+            await step(body.close)
+
+
+async def _lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            render_executor.shutdown()
+            job_manager.shutdown()
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+
+NATIVE = {("POST", "/generate"): (_generate, "generate")}
+
+
+async def app(scope, receive, send):
+    if scope["type"] == "lifespan":
+        return await _lifespan(receive, send)
+    if scope["type"] != "http":
+        return
+    route = NATIVE.get((scope["method"], scope["path"]))
+    if route is None:
+        return await _wsgi(scope, receive, send)
+    return await _native(scope, receive, send, *route)
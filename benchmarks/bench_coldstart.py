@@ -0,0 +1,72 @@
+"""First-request latency in a fresh process, with and without the startup warm-up.
+
+    python -m benchmarks.bench_coldstart [runs]
+
+Each run starts a new interpreter, imports the app and sends one /generate
+per template and format. "cold" sets CV_WARMUP=0; "warm" waits for
+/healthz to report ready first; "steady" repeats the warm requests with new
+content, which is what any later request costs. Times are medians over the
+runs.
+"""
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+from benchmarks.sample import sample_cv
+
+COMBOS = [(t, f) for t in ("sidebar", "band", "minimal") for f in ("pdf", "docx")]
+
+
+def _child():
+    t0 = time.perf_counter()
+    from app import app, warmup
+    out = {"import": time.perf_counter() - t0}
+    client = app.test_client()
+    while client.get("/healthz").status_code != 200:
+        time.sleep(0.005)
+    out["ready"] = time.perf_counter() - t0
+    for label in ("first", "steady"):
+        # steady: the same requests again with new content, so nothing is served from a cache
+        data = sample_cv()
+        for exp in data["experiences"]:
+            exp["title"] += f" ({label})"
+        for template, fmt in COMBOS:
+            t = time.perf_counter()
+            rv = client.post("/generate", json=dict(data, template=template, output_format=fmt))
+            assert rv.status_code == 200, rv.status_code
+            out[f"{label} {template}/{fmt}"] = time.perf_counter() - t
+    out["warmup"] = warmup.seconds or 0.0
+    print(json.dumps(out))
+
+
+def _run(warm):
+    env = dict(os.environ, CV_WARMUP="1" if warm else "0", CV_RENDER_WORKERS="0")
+    res = subprocess.run([sys.executable, "-m", "benchmarks.bench_coldstart", "--child"],
+                         env=env, capture_output=True, text=True, check=True)
+    return json.loads(res.stdout.strip().splitlines()[-1])
+
+
+def main(runs=5):
+    results = {mode: [_run(mode == "warm") for _ in range(runs)] for mode in ("cold", "warm")}
+    med = {mode: {k: statistics.median(r[k] for r in rs) * 1000 for k in rs[0]} for mode, rs in results.items()}
+    print("ms".ljust(16) + "cold".rjust(10) + "warm".rjust(10) + "steady".rjust(10))
+    for k in ("import", "ready"):
+        print(k.ljust(16) + f"{med['cold'][k]:10.1f}{med['warm'][k]:10.1f}")
+    for t, f in COMBOS:
+        k = f"{t}/{f}"
+        print(k.ljust(16) + f"{med['cold']['first ' + k]:10.1f}{med['warm']['first ' + k]:10.1f}"
+              f"{med['warm']['steady ' + k]:10.1f}")
+    total = {mode: sum(med[mode][f"first {t}/{f}"] for t, f in COMBOS) for mode in med}
+    print("all six".ljust(16) + f"{total['cold']:10.1f}{total['warm']:10.1f}"
+          f"{sum(med['warm'][f'steady {t}/{f}'] for t, f in COMBOS):10.1f}")
+    print(f"warm-up itself: {med['warm']['warmup']:.1f}ms (included in warm 'ready')")
+
+
+if __name__ == "__main__":
+    if sys.argv[1:] == ["--child"]:
+        _child()
+    else:
+        main(int(sys.argv[1]) if len(sys.argv) > 1 else 5)
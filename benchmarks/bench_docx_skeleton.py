@@ -0,0 +1,44 @@
+"""build_docx with the cached template skeleton vs rebuilding it for every document.
+
+    python -m benchmarks.bench_docx_skeleton [iterations]
+"""
+import io
+import sys
+import time
+import tracemalloc
+
+from benchmarks.sample import sample_cv
+from utils import generator
+
+
+def _measure(fn, n):
+    fn()
+    t0 = time.perf_counter()
+    for _ in range(n):
+        fn()
+    elapsed = (time.perf_counter() - t0) / n * 1000
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    blocks = sum(stat.count for stat in tracemalloc.take_snapshot().statistics("filename"))
+    tracemalloc.stop()
+    return elapsed, peak, blocks
+
+
+def main(n=30):
+    data = sample_cv()
+    for template in ["sidebar", "band", "minimal"]:
+        def cold():
+            generator._docx_skeleton.cache_clear()
+            generator.build_docx(data, io.BytesIO(), template)
+
+        def warm():
+            generator.build_docx(data, io.BytesIO(), template)
+
+        for label, fn in [("fresh", cold), ("skeleton", warm)]:
+            ms, peak, blocks = _measure(fn, n)
+            print(f"{template:8} {label:9} {ms:7.2f}ms  peak={peak / 1024:8.1f} KiB  retained blocks={blocks}")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 30)
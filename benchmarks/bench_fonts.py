@@ -0,0 +1,70 @@
+"""PDF size and render time: base-14 Helvetica vs the embedded TrueType family.
+
+    python -m benchmarks.bench_fonts [iterations]
+
+Renders a Latin CV and one with Cyrillic/Greek text, each with
+fonts="helvetica" (the old behaviour; non-Latin text comes out wrong) and
+fonts="unicode", and for comparison the size of the font files a PDF would
+carry without subsetting. Fragments aren't reused, so every render wraps
+all of its text. "auto" picks Helvetica for the first CV and the TrueType
+family for the second.
+"""
+import io
+import os
+import statistics
+import sys
+import time
+
+from benchmarks.sample import sample_cv
+from utils import fonts
+from utils.generator import build_pdf
+from utils.layout import build_layout
+
+
+def _non_latin():
+    data = sample_cv(experiences=8)
+    data["name"] = "Анна Ковалёва"
+    data["job_title"] = "Μηχανικός λογισμικού"
+    data["location"] = "Київ, Україна"
+    for exp in data["experiences"]:
+        exp["company"] = "ООО «Ромашка»"
+        exp["bullets"][0] = "Перенесла биллинг на новую платформу без простоя"
+    return data
+
+
+def _render(layout, template, mode):
+    buf = io.BytesIO()
+    build_pdf(layout, buf, template, fonts=mode, incremental=False)
+    return buf.getvalue()
+
+
+def _time(layout, template, mode, n):
+    times = []
+    for _ in range(n):
+        t0 = time.perf_counter()
+        _render(layout, template, mode)
+        times.append((time.perf_counter() - t0) * 1000)
+    return statistics.median(times)
+
+
+def main(n=20):
+    t0 = time.perf_counter()
+    family = fonts.unicode_family()
+    print(f"registering {', '.join(os.path.basename(f) for f in family.files.values())}: "
+          f"{(time.perf_counter() - t0) * 1000:.1f}ms, once per process")
+    full = sum(os.path.getsize(f) for f in set(family.files.values()))
+    print(f"font files without subsetting: {full / 1024:.0f} KiB")
+    cvs = {"latin": sample_cv(experiences=8), "cyrillic/greek": _non_latin()}
+    print("cv".ljust(16) + "template".ljust(10) + "fonts".ljust(11) + "size".rjust(10) + "render".rjust(10))
+    for label, data in cvs.items():
+        layout = build_layout(data)
+        print(f"{label}: auto picks {fonts.pdf_family(layout).name}")
+        for template in ("sidebar", "band", "minimal"):
+            for mode in ("helvetica", "unicode"):
+                size = len(_render(layout, template, mode))
+                ms = _time(layout, template, mode, n)
+                print(label.ljust(16) + template.ljust(10) + mode.ljust(11) + f"{size / 1024:8.1f}KB{ms:8.1f}ms")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 20)
@@ -0,0 +1,76 @@
+"""Compare the old temp-directory /generate path with in-memory rendering.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_generate [iterations]
+"""
+import io
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+from app import app, warmup
+from benchmarks.sample import sample_cv, form_fields
+from utils.generator import build_docx, build_pdf
+
+
+def _dir_size(path):
+    total = 0
+    for root, _, files in os.walk(path):
+        for f in files:
+            total += os.path.getsize(os.path.join(root, f))
+    return total
+
+
+def render_tempdir(data, fmt, scratch):
+    # what /generate used to do: a fresh mkdtemp per request, never removed
+    tmp_dir = tempfile.mkdtemp(dir=scratch)
+    path = os.path.join(tmp_dir, f"cv.{fmt}")
+    (build_pdf if fmt == "pdf" else build_docx)(data, path)
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def render_memory(data, fmt):
+    buf = io.BytesIO()
+    (build_pdf if fmt == "pdf" else build_docx)(data, buf)
+    return buf.getvalue()
+
+
+def _timeit(fn, n):
+    samples = []
+    for _ in range(n):
+        t0 = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - t0) * 1000)
+    samples.sort()
+    return statistics.median(samples), samples[int(len(samples) * 0.95) - 1]
+
+
+def main(n=50):
+    warmup.wait()  # don't measure alongside the startup warm-up
+    data = sample_cv()
+    scratch = tempfile.mkdtemp(prefix="cvbench-")
+    try:
+        for fmt in ["docx", "pdf"]:
+            before = _dir_size(scratch)
+            p50_t, p95_t = _timeit(lambda: render_tempdir(data, fmt, scratch), n)
+            leaked = _dir_size(scratch) - before
+            p50_m, p95_m = _timeit(lambda: render_memory(data, fmt), n)
+            print(f"{fmt:4}  tempdir  p50={p50_t:7.2f}ms p95={p95_t:7.2f}ms  disk={leaked / 1024:8.1f} KiB")
+            print(f"{fmt:4}  memory   p50={p50_m:7.2f}ms p95={p95_m:7.2f}ms  disk={0:8.1f} KiB")
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+
+    client = app.test_client()
+    for fmt in ["docx", "pdf"]:
+        fields = form_fields(data, fmt)
+        p50, p95 = _timeit(lambda: client.post("/generate", data=fields).get_data(), n)
+        print(f"{fmt:4}  /generate p50={p50:7.2f}ms p95={p95:7.2f}ms")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 50)
@@ -0,0 +1,47 @@
+"""Edit-and-regenerate cycle on a long multi-page CV, with and without fragment reuse.
+
+    python -m benchmarks.bench_incremental [edits]
+
+Each cycle changes one bullet of one experience (a different one each time)
+and rebuilds the whole document, the way /generate does after an edit.
+"""
+import io
+import statistics
+import sys
+import time
+
+from benchmarks.sample import sample_cv
+from utils import generator
+
+BUILDERS = {"pdf": generator.build_pdf, "docx": generator.build_docx}
+
+
+def _cycle_times(template, fmt, edits, incremental):
+    data = sample_cv(experiences=30, bullets=5, projects=10)
+    data["certifications"] = [f"Certification {i}" for i in range(10)]
+    build = BUILDERS[fmt]
+    generator.fragment_cache.clear()
+    build(data, io.BytesIO(), template, incremental=incremental)
+    times = []
+    for i in range(edits):
+        exp = data["experiences"][i % len(data["experiences"])]
+        exp["bullets"] = list(exp["bullets"])
+        exp["bullets"][0] = f"Edited bullet, revision {i}"
+        t0 = time.perf_counter()
+        build(data, io.BytesIO(), template, incremental=incremental)
+        times.append((time.perf_counter() - t0) * 1000)
+    return times
+
+
+def main(edits=20):
+    print("template".ljust(10) + "format".ljust(8) + "full".rjust(10) + "incremental".rjust(14) + "speedup".rjust(9))
+    for template in ["sidebar", "band", "minimal"]:
+        for fmt in BUILDERS:
+            full = statistics.median(_cycle_times(template, fmt, edits, False))
+            inc = statistics.median(_cycle_times(template, fmt, edits, True))
+            print(template.ljust(10) + fmt.ljust(8) + f"{full:8.2f}ms{inc:12.2f}ms{full / inc:8.1f}x")
+    print(f"fragment cache: {generator.fragment_cache.stats()}")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 20)
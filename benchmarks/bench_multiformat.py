@@ -0,0 +1,49 @@
+"""One /generate for several documents vs one request per document.
+
+    python -m benchmarks.bench_multiformat [iterations]
+    CV_RENDER_WORKERS=2 python -m benchmarks.bench_multiformat
+
+Every iteration edits the CV first, so nothing comes from the render cache.
+With CV_RENDER_WORKERS the documents of a combined request render in
+parallel.
+"""
+import statistics
+import sys
+import time
+
+from app import app, render_executor, warmup
+from benchmarks.sample import sample_cv
+
+CASES = {
+    "docx+pdf": (["docx", "pdf"], ["sidebar"]),
+    "3 templates x 2": (["docx", "pdf"], ["sidebar", "band", "minimal"]),
+}
+
+
+def _time(client, data, requests, n):
+    times = []
+    for i in range(n):
+        data["summary"] = f"Revision {i} of {id(requests)}"
+        t0 = time.perf_counter()
+        for fmt, template in requests:
+            rv = client.post("/generate", json=dict(data, output_format=fmt, template=template))
+            assert rv.status_code == 200, rv.status_code
+        times.append((time.perf_counter() - t0) * 1000)
+    return statistics.median(times)
+
+
+def main(n=20):
+    warmup.wait()
+    client = app.test_client()
+    data = sample_cv(experiences=8)
+    print(f"render workers: {render_executor.workers}")
+    print("case".ljust(18) + "separate".rjust(12) + "combined".rjust(12) + "speedup".rjust(9))
+    for label, (formats, templates) in CASES.items():
+        separate = _time(client, data, [(f, t) for t in templates for f in formats], n)
+        combined = _time(client, data, [(",".join(formats), ",".join(templates))], n)
+        print(label.ljust(18) + f"{separate:10.1f}ms{combined:10.1f}ms{separate / combined:8.2f}x")
+    render_executor.shutdown()
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 20)
@@ -0,0 +1,142 @@
+"""PDF pagination: greedy vs keep-with-next, in page breaks and in render time.
+
+    python -m benchmarks.bench_pagination [iterations]
+
+For the seeded typical and huge CVs and a long academic one, in every
+template, renders the PDF with pages broken greedily (PDF_KEEP_WITH_NEXT
+off, as before) and with _paginate keeping titles and entry headers with
+what follows them. Prints the pages and how many kept pairs (a title or
+header and the paragraph after it, an entry's last two bullets) a page
+break splits each way. Then the fastest render times both ways, cold
+(every section wrapped) and incremental (fragments cached, so placing them
+is most of the work), and how long planning the breaks alone takes over
+the main column's measured paragraphs. The heights come from the one wrap
+every paragraph needs anyway, so keep-with-next only adds arithmetic.
+
+Exits non-zero if keep-with-next leaves a pair split that fits on a page,
+or if what it adds to planning is more than BUDGET of an incremental render
+(whole render times on a busy machine vary by more than that).
+"""
+import io
+import sys
+import time
+
+from benchmarks.corpus import corpus
+from benchmarks.sample import academic_cv
+from utils import generator
+from utils.generator import build_pdf
+from utils.schema import TEMPLATES
+
+BUDGET = 0.05
+
+
+def _cvs():
+    cvs = corpus()
+    return {"typical": cvs["typical"], "huge": cvs["huge"], "academic": academic_cv(publications=40)}
+
+
+def _breaks(data, template, keep):
+    # (pages, kept pairs split by a page break), from the plan _paginate makes
+    paginate = generator._paginate
+    stats = {"pages": 1, "split": 0}
+
+    def recording(ops, y_ref, top, bottom, keep):
+        keeps = {}
+
+        def tap():
+            for op in ops:
+                keeps[id(op[0])] = op[3]
+                yield op
+
+        held = False
+        for p, y, new_page in paginate(tap(), y_ref, top, bottom, keep):
+            stats["pages"] += new_page
+            stats["split"] += new_page and held
+            held = keeps[id(p)]
+            yield p, y, new_page
+
+    generator._paginate, generator.PDF_KEEP_WITH_NEXT = recording, keep
+    try:
+        build_pdf(data, io.BytesIO(), template, incremental=False, streaming=False)
+    finally:
+        generator._paginate, generator.PDF_KEEP_WITH_NEXT = paginate, True
+    return stats["pages"], stats["split"]
+
+
+def _render_ms(data, template, keep, incremental, n):
+    # fastest of n, greedy and keep-with-next runs taken in turns so both see the same machine
+    generator.PDF_KEEP_WITH_NEXT = keep
+    try:
+        times = []
+        for _ in range(n):
+            if not incremental:
+                generator.fragment_cache.clear()
+            t0 = time.perf_counter()
+            build_pdf(data, io.BytesIO(), template, incremental=incremental, streaming=False)
+            times.append((time.perf_counter() - t0) * 1000)
+        return min(times)
+    finally:
+        generator.PDF_KEEP_WITH_NEXT = True
+
+
+def _plan_ms(data, template, n):
+    # _paginate alone over the measured ops of the main column: (ops, greedy ms, keep-with-next ms)
+    layout = generator.build_layout(data)
+    key = template if template in ("sidebar", "band") else "minimal"
+    styles = generator._pdf_styles(key, "#b87333", generator.pdf_family(layout, "auto"))
+    width = generator.LETTER[0] - 2 * generator.PDF_MARGIN - (styles.sidebar_w if key == "sidebar" else 0)
+    ops = [op for k, title in generator.PDF_SECTIONS[key] if layout.section(k)
+           for op in generator._pdf_section_ops(styles, layout.section(k), title, width,
+                                                generator.PDF_ENTRY_GAP[key], key, generator.LETTER[1])]
+    top, bottom = generator.LETTER[1] - generator.PDF_MARGIN, generator.PDF_MARGIN
+    times = {False: [], True: []}
+    for _ in range(n):
+        for keep in times:
+            t0 = time.perf_counter()
+            for _ in generator._paginate(ops, [top], top, bottom, keep):
+                pass
+            times[keep].append((time.perf_counter() - t0) * 1000)
+    return len(ops), min(times[False]), min(times[True])
+
+
+def main(n=7):
+    cvs = _cvs()
+    failed = []
+    print("cv/template".ljust(20) + "pages".rjust(7) + "split".rjust(7) + "pages".rjust(9) + "split".rjust(7))
+    print("".ljust(20) + "greedy".rjust(14) + "keep-with-next".rjust(16))
+    for label, data in cvs.items():
+        for template in TEMPLATES:
+            greedy = _breaks(data, template, False)
+            kept = _breaks(data, template, True)
+            if kept[1]:
+                failed.append(f"{label}/{template}: {kept[1]} pairs split")
+            print(f"{label}/{template}".ljust(20) + f"{greedy[0]:7d}{greedy[1]:7d}{kept[0]:9d}{kept[1]:7d}")
+    print()
+    print("cv/template".ljust(20) + "cold".rjust(16) + "incremental".rjust(18) + "plan".rjust(16) + "of render".rjust(11))
+    print("".ljust(20) + ("greedy".rjust(9) + "keep".rjust(8)) * 2 + "greedy".rjust(9) + "keep".rjust(7))
+    for label, data in cvs.items():
+        for template in TEMPLATES:
+            row = []
+            for incremental in (False, True):
+                build_pdf(data, io.BytesIO(), template, incremental=incremental, streaming=False)
+                greedy, kept = [], []
+                for _ in range(3):
+                    greedy.append(_render_ms(data, template, False, incremental, n))
+                    kept.append(_render_ms(data, template, True, incremental, n))
+                row += [min(greedy), min(kept)]
+            ops, plan_greedy, plan_kept = _plan_ms(data, template, 10 * n)
+            # what keep-with-next adds to planning, against the cheapest render (fragments cached)
+            overhead = (plan_kept - plan_greedy) / row[3]
+            if overhead > BUDGET:
+                failed.append(f"{label}/{template}: planning adds {overhead:.1%}")
+            print(f"{label}/{template}".ljust(20) + "".join(f"{ms:7.1f}ms" if i % 2 == 0 else f"{ms:6.1f}ms"
+                                                           for i, ms in enumerate(row))
+                  + f"{plan_greedy:7.2f}ms{plan_kept:5.2f}ms{overhead:+9.1%}")
+    if failed:
+        print("over budget: " + "; ".join(failed))
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(int(sys.argv[1]) if len(sys.argv) > 1 else 7))
@@ -0,0 +1,89 @@
+"""Request parsing: the schema parser vs the field-by-field code it replaced.
+
+    python -m benchmarks.bench_parse [iterations]
+
+Times everything from the raw request body to the data dict the renderers
+take, including Werkzeug's form decoding: the old form parser, the schema
+parser on the same form, and the schema parser on the JSON body the page
+now posts.
+"""
+import json
+import statistics
+import sys
+import time
+
+from flask import request
+
+from app import app, warmup
+from benchmarks.sample import academic_cv, form_fields, sample_cv
+from utils.schema import parse_form, parse_json
+
+
+def legacy_form_data(form):
+    # what app._form_data did: one lookup per field and five guarded json.loads calls
+    def loads(k):
+        raw = form.get(k, "[]")
+        try:
+            return json.loads(raw) if raw else []
+        except Exception:
+            return []
+
+    data = {k: form.get(k, "").strip() for k in [
+        "name", "job_title", "phone", "email", "location", "linkedin", "github", "website", "summary", "references",
+    ]}
+    data["skills"] = [s.strip() for s in form.get("skills", "").strip().split("\n") if s.strip()]
+    data["languages"] = [s.strip() for s in form.get("languages", "").strip().split("\n") if s.strip()]
+    for k in ["experiences", "education", "projects", "certifications", "extras"]:
+        data[k] = loads(f"{k}_json")
+    output_format = form.get("output_format", "docx").lower()
+    if output_format != "pdf":
+        output_format = "docx"
+    return data, output_format, form.get("template", "sidebar"), form.get("accent", "#b87333")
+
+
+def _legacy():
+    return legacy_form_data(request.form)
+
+
+def _schema_form():
+    cv, output_format, template, accent, _ = parse_form(request.form)
+    return cv.to_dict(), output_format, template, accent
+
+
+def _schema_json():
+    cv, output_format, template, accent, _ = parse_json(request.get_json())
+    return cv.to_dict(), output_format, template, accent
+
+
+def _parsed(parse, **body):
+    with app.test_request_context("/generate", method="POST", **body):
+        return parse()
+
+
+def _time(parse, n, **body):
+    times = []
+    for _ in range(n):
+        with app.test_request_context("/generate", method="POST", **body):
+            t0 = time.perf_counter()
+            parse()
+            times.append((time.perf_counter() - t0) * 1e6)
+    return statistics.median(times)
+
+
+def main(n=2000):
+    warmup.wait()  # don't measure alongside the startup warm-up
+    cases = {"typical": sample_cv(), "long": academic_cv(300, 20)}
+    print("payload".ljust(10) + "legacy form".rjust(14) + "schema form".rjust(14) + "schema json".rjust(14))
+    for label, data in cases.items():
+        fields = form_fields(data, "pdf", "band", "#225588")
+        body = dict(data, output_format="pdf", template="band", accent="#225588")
+        legacy = _time(_legacy, n, data=fields)
+        form = _time(_schema_form, n, data=fields)
+        as_json = _time(_schema_json, n, json=body)
+        assert _parsed(_schema_form, data=fields) == _parsed(_schema_json, json=body)
+        print(label.ljust(10) + "".join(f"{t:12.1f}us" for t in (legacy, form, as_json))
+              + f"   (json {as_json / legacy:.2f}x legacy)")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 2000)
@@ -0,0 +1,62 @@
+"""Per-section PDF layout time for each template at several CV sizes.
+
+    python -m benchmarks.bench_pdf_sections [repeats]
+
+Each section is timed by rendering a CV that contains only the header plus
+that section, minus the time for the header alone.
+"""
+import io
+import sys
+import time
+
+from benchmarks.sample import sample_cv
+from utils.generator import build_pdf
+
+SIZES = {"small": 2, "medium": 10, "large": 40}
+SECTIONS = ["summary", "skills", "experiences", "education", "projects", "certifications", "extras"]
+
+
+def _header_only():
+    data = sample_cv(experiences=0, projects=0)
+    for k in SECTIONS + ["languages", "references"]:
+        data[k] = "" if k in ("summary", "references") else []
+    return data
+
+
+def _with_section(section, n):
+    data = _header_only()
+    full = sample_cv(experiences=n, bullets=4, projects=n)
+    if section == "summary":
+        data["summary"] = " ".join([full["summary"]] * n)
+    elif section in ("experiences", "projects"):
+        data[section] = full[section]
+    elif section == "education":
+        data[section] = full["education"] * n
+    else:
+        data[section] = [f"{section} item {i} with a realistic amount of text" for i in range(n)]
+    return data
+
+
+def _best(data, template, repeats):
+    best = None
+    for _ in range(repeats):
+        t0 = time.perf_counter()
+        build_pdf(data, io.BytesIO(), template)
+        dt = time.perf_counter() - t0
+        best = dt if best is None else min(best, dt)
+    return best * 1000
+
+
+def main(repeats=7):
+    header = _header_only()
+    for template in ["sidebar", "band", "minimal"]:
+        base = _best(header, template, repeats)
+        print(f"{template}: header {base:.2f}ms")
+        print("  " + "section".ljust(16) + "".join(s.rjust(10) for s in SIZES))
+        for section in SECTIONS:
+            row = [_best(_with_section(section, n), template, repeats) - base for n in SIZES.values()]
+            print("  " + section.ljust(16) + "".join(f"{ms:8.2f}ms" for ms in row))
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 7)
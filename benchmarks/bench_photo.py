@@ -0,0 +1,109 @@
+"""Embedding a phone photo: as uploaded vs prepared once by utils.images.
+
+    python -m benchmarks.bench_photo [iterations]
+
+Makes a 12 MP JPEG (4032×3024, like a phone's) and renders the sidebar
+template with it three ways: ReportLab's drawImage() on the upload (it
+decodes the whole image on every render to name it), the upload's bytes
+embedded as they are, and the photo prepare_photo() made once, at the
+sidebar's print size. Prints document sizes, render times and the one-off
+cost of preparing, and how much each of decoding the upload in full and
+preparing it raises peak memory (Linux only).
+"""
+import hashlib
+import io
+import statistics
+import sys
+import time
+
+from reportlab.lib.utils import ImageReader
+
+from benchmarks.sample import sample_cv
+from utils import generator
+from utils.generator import build_docx, build_pdf
+from utils.images import Photo, prepare_photo
+from utils.layout import build_layout
+
+
+def phone_photo(size=(4032, 3024)):
+    from PIL import Image
+
+    # noise over a gradient compresses about as badly as a real photo
+    gradient = Image.linear_gradient("L").resize(size)
+    noise = Image.effect_noise(size, 40)
+    im = Image.merge("RGB", (gradient, noise, Image.blend(gradient, noise, 0.5)))
+    buf = io.BytesIO()
+    im.save(buf, "JPEG", quality=92)
+    return buf.getvalue()
+
+
+def _draw_image(c, photo, x, y, w, h):
+    c.drawImage(ImageReader(io.BytesIO(photo.data)), x, y, w, h)
+
+
+def _time(fn, n):
+    times = []
+    for _ in range(n):
+        t0 = time.perf_counter()
+        fn()
+        times.append((time.perf_counter() - t0) * 1000)
+    return statistics.median(times)
+
+
+def _render(build, layout):
+    buf = io.BytesIO()
+    build(layout, buf, "sidebar")
+    return buf.getvalue()
+
+
+def _status_kib(field):
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith(field + ":"):
+                return int(line.split()[1])
+
+
+def _peak_mib(fn):
+    # how far fn raises the process's peak RSS; Pillow's buffers aren't visible to
+    # tracemalloc. Writing 5 to clear_refs resets the peak (Linux only).
+    with open("/proc/self/clear_refs", "w") as f:
+        f.write("5")
+    before = _status_kib("VmRSS")
+    fn()
+    return (_status_kib("VmHWM") - before) / 1024
+
+
+def main(n=10):
+    from PIL import Image
+
+    raw = phone_photo()
+    print(f"upload: 4032x3024 JPEG, {len(raw) / 1024:.0f} KiB")
+    t0 = time.perf_counter()
+    prepared = prepare_photo(raw)
+    print(f"prepare once: {(time.perf_counter() - t0) * 1000:.0f}ms -> {prepared.width}x{prepared.height}, "
+          f"{len(prepared.data) / 1024:.0f} KiB")
+    print(f"peak memory, decoding the upload in full: +{_peak_mib(lambda: Image.open(io.BytesIO(raw)).load()):.0f} MiB")
+    print(f"peak memory, prepare_photo(): +{_peak_mib(lambda: prepare_photo(raw)):.0f} MiB")
+    upload = Photo(hashlib.sha256(raw).hexdigest(), raw, "image/jpeg", 4032, 3024)
+    cases = [
+        ("upload, drawImage()", upload, True),
+        ("upload as is", upload, False),
+        ("prepared", prepared, False),
+    ]
+    print("photo".ljust(22) + "pdf".rjust(10) + "pdf ms".rjust(9) + "docx".rjust(10) + "docx ms".rjust(9))
+    draw_photo = generator._draw_photo
+    try:
+        for label, photo, draw_image in cases:
+            generator._draw_photo = _draw_image if draw_image else draw_photo
+            layout = build_layout(dict(sample_cv(), photo=photo))
+            pdf = _render(build_pdf, layout)
+            docx = _render(build_docx, layout)
+            pdf_ms = _time(lambda: _render(build_pdf, layout), n)
+            docx_ms = _time(lambda: _render(build_docx, layout), n)
+            print(label.ljust(22) + f"{len(pdf) / 1024:8.0f}KB{pdf_ms:7.1f}ms{len(docx) / 1024:8.0f}KB{docx_ms:7.1f}ms")
+    finally:
+        generator._draw_photo = draw_photo
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 10)
@@ -0,0 +1,56 @@
+"""Latency of /preview while a user edits a typical CV.
+
+    python -m benchmarks.bench_preview [edits] [budget_ms]
+
+Each request changes the summary, the way a debounced keystroke would, so
+every call misses the render cache. Exits non-zero if the p95 for any
+template/format is over the budget (100 ms by default).
+"""
+import statistics
+import sys
+import time
+
+from app import app, warmup
+from benchmarks.sample import sample_cv, form_fields
+
+
+def _percentile(samples, pct):
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * pct / 100))]
+
+
+def run(template, fmt, edits):
+    client = app.test_client()
+    data = sample_cv()
+    summary = data["summary"]
+    times = []
+    for i in range(edits + 1):
+        data["summary"] = f"{summary} {'x' * i}"
+        t0 = time.perf_counter()
+        rv = client.post(f"/preview?format={fmt}", data=form_fields(data, "pdf", template, "#b87333"))
+        dt = (time.perf_counter() - t0) * 1000
+        assert rv.status_code == 200, rv.status_code
+        if i:
+            times.append(dt)  # the first request pays for imports and style setup
+    return times
+
+
+def main(edits=50, budget_ms=100.0):
+    warmup.wait()  # don't measure alongside the startup warm-up
+    failed = False
+    print("template".ljust(10) + "format".ljust(8) + "p50".rjust(10) + "p95".rjust(10) + "max".rjust(10))
+    for template in ["sidebar", "band", "minimal"]:
+        for fmt in ["svg", "png"]:
+            times = run(template, fmt, edits)
+            p95 = _percentile(times, 95)
+            over = p95 > budget_ms
+            failed = failed or over
+            print(template.ljust(10) + fmt.ljust(8) + f"{statistics.median(times):8.2f}ms{p95:8.2f}ms{max(times):8.2f}ms"
+                  + ("  OVER BUDGET" if over else ""))
+    print(f"budget: p95 <= {budget_ms:g}ms")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    sys.exit(main(int(args[0]) if args else 50, float(args[1]) if len(args) > 1 else 100.0))
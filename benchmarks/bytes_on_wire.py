@@ -0,0 +1,143 @@
+"""Bytes the server sends for a typical page load and export, per encoding.
+
+    python -m benchmarks.bytes_on_wire
+
+Plays two visits of a browser through the Flask test client, with a cache
+that keeps what Cache-Control allows and revalidates the rest with
+If-None-Match. The first visit loads the page and the static files it
+links to (the icon among them), saves the typical CV from benchmarks.corpus as a draft, previews
+it and exports it as PDF and DOCX. The second comes back to the same page,
+patches the draft's summary, previews it and exports the PDF again.
+Each response is counted as its status line, headers and body.
+
+The visits are played once without Accept-Encoding, then once per encoding
+the server can send. Exits non-zero if a compressible response at least
+MIN_BYTES long went out unencoded when it could have been, a DOCX was
+encoded, a versioned static file was fetched again on the second visit or
+gzip saved less than BUDGET of the first visit.
+"""
+import gzip
+import os
+import re
+import sys
+import time
+
+os.environ["CV_RENDER_WORKERS"] = "0"
+os.environ.setdefault("CV_WARMUP", "0")
+
+import app as cvapp
+from benchmarks.corpus import corpus
+from utils.compress import COMPRESSIBLE, ENCODINGS, MIN_BYTES, brotli
+from utils.ratelimit import RateLimiter
+
+# gzip must take at least this fraction off the first visit
+BUDGET = 0.3
+
+
+def wire_bytes(rv):
+    head = f"HTTP/1.1 {rv.status}\r\n" + "".join(f"{k}: {v}\r\n" for k, v in rv.headers.items()) + "\r\n"
+    return len(head.encode("latin-1")) + len(rv.get_data())
+
+
+def decoded(rv):
+    body = rv.get_data()
+    encoding = rv.headers.get("Content-Encoding")
+    return brotli.decompress(body) if encoding == "br" else gzip.decompress(body) if encoding == "gzip" else body
+
+
+class Browser:
+    """A test client with an HTTP cache, logging (request, status, mimetype, encoding, bytes) per response."""
+
+    def __init__(self, accept_encoding=None):
+        self.client = cvapp.app.test_client()
+        self.headers = {"Accept-Encoding": accept_encoding} if accept_encoding else {}
+        self.cache = {}
+        self.log = []
+
+    def request(self, method, url, label=None, **kwargs):
+        headers = dict(self.headers, **kwargs.pop("headers", {}))
+        cached = self.cache.get(url) if method == "GET" else None
+        if cached is not None:
+            etag, expires = cached
+            if expires > time.time():
+                self.log.append((label or url, "cache", "", "", 0))
+                return None
+            headers["If-None-Match"] = etag
+        rv = self.client.open(url, method=method, headers=headers, **kwargs)
+        self.log.append((label or url, rv.status_code, rv.mimetype, rv.headers.get("Content-Encoding", ""),
+                         wire_bytes(rv)))
+        if method == "GET" and rv.headers.get("ETag"):
+            age = re.search(r"max-age=(\d+)", rv.headers.get("Cache-Control", ""))
+            self.cache[url] = (rv.headers["ETag"], time.time() + (int(age.group(1)) if age else 0))
+        return rv
+
+    def load_page(self):
+        rv = self.request("GET", "/")
+        for url in dict.fromkeys(re.findall(r'(?:href|src)="(/static/[^"]+)"', decoded(rv).decode("utf-8"))):
+            self.request("GET", url, url.split("?")[0])
+
+    def visits(self, cv):
+        self.load_page()
+        draft = self.request("POST", "/drafts", json=cv).get_json()["id"]
+        self.request("POST", "/preview?format=svg", "/preview (svg)", json=cv)
+        for fmt in ("pdf", "docx"):
+            self.request("POST", f"/drafts/{draft}/generate", f"export {fmt}", json={"output_format": fmt})
+        first = len(self.log)
+        self.load_page()
+        cv = dict(cv, summary=cv["summary"] + " Now also on call.")
+        self.request("PATCH", f"/drafts/{draft}", "PATCH draft", json=[
+            {"op": "replace", "path": "/summary", "value": cv["summary"]}])
+        self.request("POST", "/preview?format=svg", "/preview (svg)", json=cv)
+        self.request("POST", f"/drafts/{draft}/generate", "export pdf", json={"output_format": "pdf"})
+        return self.log[:first], self.log[first:]
+
+
+def _check(encoding, run, identity):
+    # what an encoded run got wrong, against the same responses unencoded
+    failed = []
+    for (label, status, mimetype, encoded, _), plain in zip(run[0] + run[1], identity[0] + identity[1]):
+        if encoded and mimetype not in COMPRESSIBLE:
+            failed.append(f"{encoding}: {label} ({mimetype}) encoded")
+        elif status == 200 and not encoded and mimetype in COMPRESSIBLE and plain[-1] >= MIN_BYTES:
+            failed.append(f"{encoding}: {label} not encoded")
+    for label, status, *_ in run[1]:
+        if label.startswith("/static/") and status != "cache":
+            failed.append(f"{encoding}: {label} fetched again")
+    return failed
+
+
+def main():
+    cvapp.rate_limiter = RateLimiter(0)
+    cv = corpus()["typical"]
+    runs = {}
+    for encoding in (None,) + ENCODINGS:
+        runs[encoding or "identity"] = Browser(encoding).visits(cv)
+
+    failed = []
+    names = list(runs)
+    print("request".ljust(32) + "".join(name.rjust(12) for name in names))
+    for visit, title in ((0, "first visit"), (1, "second visit")):
+        print(f"-- {title}")
+        rows = zip(*(runs[name][visit] for name in names))
+        for row in rows:
+            cells = ["cached" if status == "cache" else f"{size}{'*' if enc else ''}" for _, status, _, enc, size in row]
+            print(row[0][0].ljust(32) + "".join(cell.rjust(12) for cell in cells))
+        totals = [sum(size for *_, size in runs[name][visit]) for name in names]
+        print("total".ljust(32) + "".join(str(t).rjust(12) for t in totals))
+    print("(* encoded)")
+
+    identity = runs["identity"]
+    for encoding in ENCODINGS:
+        failed += _check(encoding, runs[encoding], identity)
+    saved = 1 - sum(s for *_, s in runs["gzip"][0]) / sum(s for *_, s in identity[0])
+    print(f"gzip saves {saved:.0%} of the first visit")
+    if saved < BUDGET:
+        failed.append(f"gzip saves {saved:.0%}, under {BUDGET:.0%}")
+    if failed:
+        print("failed: " + "; ".join(failed))
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
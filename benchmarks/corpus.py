@@ -0,0 +1,86 @@
+"""Seeded synthetic CVs, from a one-liner to the schema's limits.
+
+    from benchmarks.corpus import corpus
+    cvs = corpus(seed=0)   # {"tiny": {...}, "typical": {...}, "huge": {...}, "unicode": {...}}
+
+The same seed always gives the same payloads, so sizes and timings of runs
+on different days (or machines) are comparable. Every CV passes
+utils.schema, so it can go through /generate as well as build_docx/build_pdf.
+"""
+import random
+
+_WORDS = (
+    "built led designed migrated reduced improved automated scaled shipped maintained mentored owned "
+    "service pipeline platform billing search checkout cluster database cache queue api dashboard "
+    "latency cost throughput reliability onboarding coverage deploys incidents revenue users teams "
+    "across with for by into from the a of and to in on over under while using"
+).split()
+_UNICODE_WORDS = (
+    "разработала внедрила платформу биллинга задержку команду сервис данных "
+    "σχεδίασα βελτίωσα υπηρεσία καθυστέρηση ομάδα δεδομένων "
+    "zaprojektowałam usługę opóźnienie zespół łącze "
+    "geliştirdim hizmet gecikme ekip veri "
+    "développé équipe données réseau façade"
+).split()
+_NAMES = ("Jane Doe", "Ana Silva", "Tomás Novák", "Priya Raman", "Lukas Meier", "Chen Wei")
+_UNICODE_NAMES = ("Анна Ковалёва", "Γιώργος Παπαδόπουλος", "Zofia Łukasiewicz", "Şebnem Yılmaz")
+
+
+def _sentence(rng, words, n):
+    text = " ".join(rng.choice(words) for _ in range(n))
+    return text[0].upper() + text[1:]
+
+
+def synthetic_cv(rng, experiences=4, bullets=4, projects=2, summary_words=40, extras=1, words=_WORDS,
+                 names=_NAMES):
+    """One CV payload drawn from rng (a random.Random)."""
+    return {
+        "name": rng.choice(names),
+        "job_title": _sentence(rng, words, 3),
+        "phone": f"+1 555 {rng.randrange(10000):04d}",
+        "email": f"person{rng.randrange(1000)}@example.com",
+        "location": rng.choice(("Berlin, Germany", "Lisbon, Portugal", "Remote", "Warszawa, Polska")),
+        "linkedin": "linkedin.com/in/someone",
+        "github": "github.com/someone",
+        "website": "someone.dev",
+        "summary": _sentence(rng, words, summary_words) + ".",
+        "skills": [_sentence(rng, words, rng.randint(1, 3)) for _ in range(rng.randint(4, 10))],
+        "languages": ["English", rng.choice(("German", "Português", "Polski", "Ελληνικά"))],
+        "references": "Available on request",
+        "experiences": [
+            {
+                "title": _sentence(rng, words, 2),
+                "company": _sentence(rng, words, 2),
+                "location": rng.choice(("Remote", "Berlin", "London", "Kraków")),
+                "dates": f"{2000 + i} – {2001 + i}",
+                "bullets": [_sentence(rng, words, rng.randint(8, 24)) for _ in range(bullets)],
+            }
+            for i in range(experiences)
+        ],
+        "education": [
+            {"degree": "BSc " + _sentence(rng, words, 2), "institution": _sentence(rng, words, 2),
+             "location": "Berlin", "dates": "1996 – 2000"},
+        ],
+        "projects": [
+            {"name": _sentence(rng, words, 2), "tech": "Python, PostgreSQL", "link": f"https://example.com/{i}",
+             "bullets": [_sentence(rng, words, rng.randint(6, 14)) for _ in range(2)]}
+            for i in range(projects)
+        ],
+        "certifications": [_sentence(rng, words, 4) for _ in range(2)],
+        "extras": [_sentence(rng, words, rng.randint(6, 20)) for _ in range(extras)],
+    }
+
+
+# name -> synthetic_cv() arguments
+SHAPES = {
+    "tiny": dict(experiences=1, bullets=1, projects=0, summary_words=8, extras=0),
+    "typical": dict(),
+    # long everywhere: many entries and bullets, a summary of a few thousand characters
+    "huge": dict(experiences=60, bullets=8, projects=20, summary_words=400, extras=40),
+    "unicode": dict(experiences=6, words=_UNICODE_WORDS + _WORDS, names=_UNICODE_NAMES),
+}
+
+
+def corpus(seed=0, shapes=SHAPES):
+    """{name: payload} for every shape; each shape draws from its own stream of the seed."""
+    return {name: synthetic_cv(random.Random(f"{seed}/{name}"), **kwargs) for name, kwargs in shapes.items()}
@@ -0,0 +1,164 @@
+"""Slow-client capacity: the `python app.py` server vs the ASGI entry point under uvicorn.
+
+    python -m benchmarks.load_connections [--clients 50,200,500] [--trickle 2.0]
+
+For each server and client count it starts a fresh server, opens that many
+connections that each upload a /generate body in small pieces over
+--trickle seconds and then read the document back in small pieces, and
+meanwhile times ordinary /generate requests from a separate probe. Reported
+per run: slow requests completed, probe latency while the slow clients are
+connected, and the server's peak thread count and RSS. Needs uvicorn for the
+asgi rows.
+"""
+import argparse
+import asyncio
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import urllib.request
+
+from benchmarks.sample import sample_cv
+
+SERVERS = {
+    "app.run": lambda port: [sys.executable, "app.py"],
+    "asgi": lambda port: [sys.executable, "-m", "uvicorn", "asgi:app", "--port", str(port), "--log-level", "warning"],
+}
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _proc_status(pid):
+    # (threads, rss in MiB) from /proc, or (0, 0) where that isn't available
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            fields = dict(line.split(":", 1) for line in f)
+        return int(fields["Threads"]), int(fields["VmRSS"].split()[0]) / 1024
+    except OSError:
+        return 0, 0.0
+
+
+def _start(name, port):
+    env = dict(os.environ, PORT=str(port), CV_RENDER_WORKERS="0")
+    proc = subprocess.Popen(SERVERS[name](port), env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        try:
+            with urllib.request.urlopen(f"http://127.0.0.1:{port}/healthz") as rv:
+                if rv.status == 200:
+                    return proc
+        except OSError:
+            time.sleep(0.1)
+    proc.kill()
+    raise RuntimeError(f"{name} server did not become ready")
+
+
+def _request(port, body):
+    head = (f"POST /generate HTTP/1.1\r\nHost: 127.0.0.1:{port}\r\nContent-Type: application/json\r\n"
+            f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n")
+    return head.encode(), body
+
+
+async def _slow_client(port, body, trickle, pieces=20):
+    head, body = _request(port, body)
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    try:
+        writer.write(head)
+        step = -(-len(body) // pieces)
+        for i in range(0, len(body), step):
+            writer.write(body[i:i + step])
+            await writer.drain()
+            await asyncio.sleep(trickle / pieces)
+        status = await reader.readline()
+        total = 0
+        while True:
+            chunk = await reader.read(4096)
+            if not chunk:
+                break
+            total += len(chunk)
+            await asyncio.sleep(0.005)
+        return status.startswith(b"HTTP/1.1 200") and total > 0
+    except OSError:
+        return False
+    finally:
+        writer.close()
+
+
+async def _probe(port, stop, latencies):
+    data = sample_cv()
+    i = 0
+    while not stop.is_set():
+        i += 1
+        head, body = _request(port, json.dumps(dict(data, name=f"Probe {i}", output_format="pdf")).encode())
+        t0 = time.perf_counter()
+        try:
+            reader, writer = await asyncio.open_connection("127.0.0.1", port)
+            writer.write(head + body)
+            await reader.read()
+            writer.close()
+            latencies.append((time.perf_counter() - t0) * 1000)
+        except OSError:
+            pass
+        await asyncio.sleep(0.05)
+
+
+async def _watch(pid, stop, peaks):
+    while not stop.is_set():
+        threads, rss = _proc_status(pid)
+        peaks[0] = max(peaks[0], threads)
+        peaks[1] = max(peaks[1], rss)
+        await asyncio.sleep(0.05)
+
+
+async def _load(port, pid, clients, trickle):
+    # every slow client posts the same CV, so after the first they are render-cache hits
+    # and the run measures connection handling rather than rendering
+    body = json.dumps(dict(sample_cv(), output_format="pdf")).encode()
+    stop = asyncio.Event()
+    latencies, peaks = [], [0, 0.0]
+    side = [asyncio.create_task(_probe(port, stop, latencies)), asyncio.create_task(_watch(pid, stop, peaks))]
+    t0 = time.perf_counter()
+    results = await asyncio.gather(*[_slow_client(port, body, trickle) for _ in range(clients)], return_exceptions=True)
+    elapsed = time.perf_counter() - t0
+    stop.set()
+    await asyncio.gather(*side)
+    ok = sum(1 for r in results if r is True)
+    return ok, elapsed, latencies, peaks
+
+
+def run(name, clients, trickle):
+    port = _free_port()
+    proc = _start(name, port)
+    try:
+        return asyncio.run(_load(port, proc.pid, clients, trickle))
+    finally:
+        proc.terminate()
+        proc.wait(10)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--clients", default="50,200,500")
+    parser.add_argument("--trickle", type=float, default=2.0, help="seconds each slow client takes to upload")
+    parser.add_argument("--servers", default=",".join(SERVERS))
+    args = parser.parse_args()
+    print("server".ljust(9) + "clients".rjust(8) + "ok".rjust(6) + "wall".rjust(8) + "probe p50".rjust(11)
+          + "probe p95".rjust(11) + "threads".rjust(9) + "rss".rjust(9))
+    for clients in [int(c) for c in args.clients.split(",")]:
+        for name in args.servers.split(","):
+            ok, elapsed, lat, (threads, rss) = run(name, clients, args.trickle)
+            lat.sort()
+            p50 = statistics.median(lat) if lat else float("nan")
+            p95 = lat[min(len(lat) - 1, int(len(lat) * 0.95))] if lat else float("nan")
+            print(name.ljust(9) + f"{clients:8d}{ok:6d}{elapsed:7.1f}s{p50:9.1f}ms{p95:9.1f}ms{threads:9d}{rss:7.1f}MB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""Throughput of the rendering executor at different worker counts.
+
+    python -m benchmarks.load_test [--jobs 64] [--concurrency 16] [--workers 0,1,2,4]
+    python -m benchmarks.load_test --url http://127.0.0.1:5000 [--jobs 64] [--concurrency 16]
+
+The first form drives RenderExecutor directly; the second posts to a running
+server's /generate (start it with CV_RENDER_WORKERS=N to compare).
+"""
+import argparse
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.sample import sample_cv, form_fields
+from utils.executor import RenderExecutor, RenderBusy
+
+
+def _drive(call, jobs, concurrency):
+    shed = 0
+    lock = threading.Lock()
+    latencies = []
+
+    def one(i):
+        nonlocal shed
+        fmt = "pdf" if i % 2 else "docx"
+        t0 = time.perf_counter()
+        ok = call(fmt)
+        with lock:
+            if ok:
+                latencies.append(time.perf_counter() - t0)
+            else:
+                shed += 1
+
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as pool:
+        list(pool.map(one, range(jobs)))
+    elapsed = time.perf_counter() - t0
+    latencies.sort()
+    p95 = latencies[max(int(len(latencies) * 0.95) - 1, 0)] * 1000 if latencies else 0
+    return len(latencies) / elapsed, p95, shed
+
+
+def run_executor(workers, jobs, concurrency):
+    data = sample_cv(experiences=8)
+    ex = RenderExecutor(workers=workers, max_pending=concurrency)
+    ex.warm()
+
+    def call(fmt):
+        try:
+            ex.render(data, fmt)
+            return True
+        except RenderBusy:
+            return False
+
+    try:
+        return _drive(call, jobs, concurrency)
+    finally:
+        ex.shutdown()
+
+
+def run_http(url, jobs, concurrency):
+    data = sample_cv(experiences=8)
+
+    def call(fmt):
+        body = urllib.parse.urlencode(form_fields(data, fmt)).encode()
+        try:
+            with urllib.request.urlopen(url.rstrip("/") + "/generate", data=body) as r:
+                r.read()
+            return True
+        except urllib.error.HTTPError as e:
+            if e.code == 503:
+                return False
+            raise
+
+    return _drive(call, jobs, concurrency)
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--jobs", type=int, default=64)
+    ap.add_argument("--concurrency", type=int, default=16)
+    ap.add_argument("--workers", default="0,1,2,4")
+    ap.add_argument("--url")
+    args = ap.parse_args()
+    if args.url:
+        rps, p95, shed = run_http(args.url, args.jobs, args.concurrency)
+        print(f"{args.url}: {rps:6.1f} docs/s  p95={p95:7.1f}ms  shed={shed}")
+        return
+    for w in [int(x) for x in args.workers.split(",")]:
+        rps, p95, shed = run_executor(w, args.jobs, args.concurrency)
+        label = "inline" if w == 0 else f"{w} procs"
+        print(f"{label:>8}: {rps:6.1f} docs/s  p95={p95:7.1f}ms  shed={shed}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""One client hammering /generate with huge CVs while others edit normal ones.
+
+    python -m benchmarks.noisy_neighbour [seconds per phase]
+    CV_RENDER_WORKERS=2 python -m benchmarks.noisy_neighbour
+
+Runs the app in-process with requests from separate client addresses: a
+noisy client keeps several huge renders in flight back to back, and a few
+quiet clients each send an ordinary edit every 200 ms. Phases: quiet clients
+alone (the baseline), then with the noisy client and no admission control,
+with the fair scheduler only, and with the scheduler and the per-client rate
+limit. For each it prints the quiet clients' p50/p99 latency and how many of
+their requests failed, and what the noisy client got through.
+
+Exits non-zero unless, with admission control on, every quiet request
+succeeds and their p99 stays within the baseline p99 plus two heavy renders
+(a render in progress is never interrupted, so one can be ahead of them).
+"""
+import statistics
+import sys
+import threading
+import time
+
+import app as cvapp
+from benchmarks.sample import sample_cv
+from utils.ratelimit import RateLimiter
+from utils.scheduler import FairScheduler
+
+NOISY_THREADS = 4
+QUIET_CLIENTS = 3
+QUIET_INTERVAL = 0.2
+
+
+def _heavy():
+    return dict(sample_cv(experiences=100, bullets=8), output_format="pdf")
+
+
+def _client_loop(addr, make, stop, results, pause=0.0):
+    client = cvapp.app.test_client()
+    i = 0
+    while not stop.is_set():
+        i += 1
+        data = make()
+        # a fresh summary each time so nothing comes from the render cache
+        data["summary"] = f"{addr} revision {i}"
+        t0 = time.perf_counter()
+        rv = client.post("/generate", json=data, environ_base={"REMOTE_ADDR": addr})
+        results.append((rv.status_code, time.perf_counter() - t0))
+        if rv.status_code == 429:
+            time.sleep(float(rv.headers.get("Retry-After", 1)))
+        elif pause:
+            time.sleep(pause)
+
+
+def _phase(seconds, noisy):
+    stop = threading.Event()
+    quiet = [[] for _ in range(QUIET_CLIENTS)]
+    loud = []
+    threads = [threading.Thread(target=_client_loop, args=(f"10.0.0.{i + 1}", lambda: dict(sample_cv(), output_format="pdf"),
+                                                           stop, quiet[i], QUIET_INTERVAL))
+               for i in range(QUIET_CLIENTS)]
+    if noisy:
+        threads += [threading.Thread(target=_client_loop, args=("10.0.0.99", _heavy, stop, loud))
+                    for _ in range(NOISY_THREADS)]
+    for t in threads:
+        t.start()
+    time.sleep(seconds)
+    stop.set()
+    for t in threads:
+        t.join()
+    return [r for rs in quiet for r in rs], loud
+
+
+def _p(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * q))] * 1000 if values else float("nan")
+
+
+def _configure(scheduled, limited):
+    cvapp.scheduler = FairScheduler(slots=cvapp._slots if scheduled else 10**6, max_waiting=64,
+                                    max_waiting_per_client=16, timeout=30)
+    cvapp.rate_limiter = RateLimiter(20.0 if limited else 0, burst=60)
+
+
+def main(seconds=8.0):
+    cvapp.warmup.wait()
+    client = cvapp.app.test_client()
+    heavy = []
+    for i in range(3):
+        t0 = time.perf_counter()
+        client.post("/generate", json=dict(_heavy(), summary=f"probe {i}"))
+        heavy.append(time.perf_counter() - t0)
+    heavy_ms = statistics.median(heavy) * 1000
+    print(f"one heavy render: {heavy_ms:.0f}ms")
+    phases = [
+        ("quiet clients alone", False, True, True),
+        ("noisy, no control", True, False, False),
+        ("noisy, fair queue", True, True, False),
+        ("noisy, queue + limit", True, True, True),
+    ]
+    print("phase".ljust(22) + "quiet ok".rjust(10) + "failed".rjust(8) + "p50".rjust(9) + "p99".rjust(9)
+          + "noisy ok".rjust(10) + "noisy 429".rjust(11))
+    rows = {}
+    for label, noisy, scheduled, limited in phases:
+        _configure(scheduled, limited)
+        quiet, loud = _phase(seconds, noisy)
+        ok = [t for status, t in quiet if status == 200]
+        rows[label] = (len(quiet) - len(ok), _p(ok, 0.99))
+        print(label.ljust(22) + f"{len(ok):10d}{len(quiet) - len(ok):8d}{_p(ok, 0.5):7.0f}ms{_p(ok, 0.99):7.0f}ms"
+              + f"{sum(1 for s, _ in loud if s == 200):10d}{sum(1 for s, _ in loud if s == 429):11d}")
+    budget = rows["quiet clients alone"][1] + 2 * heavy_ms
+    failed = []
+    for label in ("noisy, fair queue", "noisy, queue + limit"):
+        errors, p99 = rows[label]
+        if errors or p99 > budget:
+            failed.append(label)
+    print(f"quiet p99 budget with admission control: {budget:.0f}ms")
+    if failed:
+        print("over budget: " + ", ".join(failed))
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(float(sys.argv[1]) if len(sys.argv) > 1 else 8.0))
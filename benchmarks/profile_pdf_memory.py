@@ -0,0 +1,76 @@
+"""Peak memory of build_pdf for 1-, 10- and 50-page CVs, buffered vs streaming.
+
+    python -m benchmarks.profile_pdf_memory
+
+Memory is measured with tracemalloc around a single build_pdf call writing to
+a sink that discards the bytes (like a socket or file would), after a warm-up
+render so per-process caches aren't counted. Exits non-zero unless the
+streaming peak for 50 pages stays within 1.5x of the 1-page peak.
+"""
+import io
+import re
+import sys
+import tracemalloc
+
+from benchmarks.sample import academic_cv
+from utils.generator import build_pdf
+
+PAGES = (1, 10, 50)
+MAX_GROWTH = 1.5
+
+
+class _Sink:
+    def __init__(self):
+        self.size = 0
+
+    def write(self, b):
+        self.size += len(b)
+        return len(b)
+
+
+def _pages(data):
+    buf = io.BytesIO()
+    build_pdf(data, buf, "band", incremental=False)
+    return len(re.findall(rb"/Type /Page\b(?!s)", buf.getvalue()))
+
+
+def cv_with_pages(n):
+    if n == 1:
+        return academic_cv(0, 0, experiences=1)
+    # publications per page is roughly constant, so estimate and then step to the exact count
+    per_page = 800 / max(1, _pages(academic_cv(800, 40)) - 2)
+    pubs = int((n - 2) * per_page)
+    while True:
+        data = academic_cv(pubs, pubs // 20)
+        got = _pages(data)
+        if got == n:
+            return data
+        pubs += max(1, int(per_page / 4)) * (1 if got < n else -1)
+
+
+def peak(data, streaming):
+    build_pdf(data, _Sink(), "band", incremental=False, streaming=streaming)
+    tracemalloc.start()
+    sink = _Sink()
+    build_pdf(data, sink, "band", incremental=False, streaming=streaming)
+    _, top = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return top, sink.size
+
+
+def main():
+    peaks = {}
+    print("pages".rjust(6) + "output".rjust(10) + "buffered".rjust(12) + "streaming".rjust(12))
+    for n in PAGES:
+        data = cv_with_pages(n)
+        buffered, size = peak(data, False)
+        streaming, _ = peak(data, True)
+        peaks[n] = streaming
+        print(f"{n:6d}{size / 1024:8.1f}KiB{buffered / 1024:9.1f}KiB{streaming / 1024:9.1f}KiB")
+    growth = peaks[PAGES[-1]] / peaks[PAGES[0]]
+    print(f"streaming peak {PAGES[-1]} pages / {PAGES[0]} page: {growth:.2f}x (limit {MAX_GROWTH}x)")
+    return 0 if growth <= MAX_GROWTH else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
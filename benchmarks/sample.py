@@ -0,0 +1,63 @@
+import json
+
+
+def sample_cv(experiences=4, bullets=4, projects=2):
+    return {
+        "name": "Jane Doe",
+        "job_title": "Senior Software Engineer",
+        "phone": "+1 555 0100",
+        "email": "jane.doe@example.com",
+        "location": "Berlin, Germany",
+        "linkedin": "linkedin.com/in/janedoe",
+        "github": "github.com/janedoe",
+        "website": "janedoe.dev",
+        "summary": "Engineer with a decade of experience building reliable web services, "
+                   "data pipelines and developer tooling for small and large teams.",
+        "skills": ["Python", "Flask", "PostgreSQL", "Docker", "AWS"],
+        "languages": ["English", "German"],
+        "references": "Available on request",
+        "experiences": [
+            {
+                "title": f"Engineer {i}",
+                "company": f"Company {i}",
+                "location": "Remote",
+                "dates": f"{2010 + i} – {2011 + i}",
+                "bullets": [f"Delivered improvement {j} that reduced latency and cost for the team" for j in range(bullets)],
+            }
+            for i in range(experiences)
+        ],
+        "education": [
+            {"degree": "BSc Computer Science", "institution": "TU Berlin", "location": "Berlin", "dates": "2006 – 2010"},
+        ],
+        "projects": [
+            {"name": f"Project {i}", "tech": "Python, React", "link": f"https://example.com/{i}",
+             "bullets": ["Built the first version", "Grew it to 10k users"]}
+            for i in range(projects)
+        ],
+        "certifications": ["AWS Certified Solutions Architect (2022)"],
+        "extras": ["Open source maintainer"],
+    }
+
+
+def academic_cv(publications=100, projects=10, experiences=6):
+    # long CV: most of the length is publications in extras plus many projects
+    data = sample_cv(experiences=experiences, bullets=4, projects=projects)
+    data["extras"] = [
+        f"[{i + 1}] J. Doe, A. Smith and B. Lee. A study of cache-efficient layout for document "
+        f"rendering, part {i + 1}. Journal of Systems Engineering, {1995 + i % 30}."
+        for i in range(publications)
+    ]
+    return data
+
+
+def form_fields(data, output_format="docx", template="sidebar", accent="#b87333"):
+    fields = {k: data.get(k, "") for k in ["name", "job_title", "phone", "email", "location", "linkedin",
+                                           "github", "website", "summary", "references"]}
+    fields["skills"] = "\n".join(data.get("skills", []))
+    fields["languages"] = "\n".join(data.get("languages", []))
+    for k in ["experiences", "education", "projects", "certifications", "extras"]:
+        fields[f"{k}_json"] = json.dumps(data.get(k, []))
+    fields["output_format"] = output_format
+    fields["template"] = template
+    fields["accent"] = accent
+    return fields
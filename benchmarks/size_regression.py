@@ -0,0 +1,97 @@
+"""Output size per template, format and optimize mode, checked against a baseline.
+
+    python -m benchmarks.size_regression            # compare with sizes.json
+    python -m benchmarks.size_regression --update   # record the current sizes
+
+Renders a few representative CVs (short, typical, long, non-Latin) with
+ReportLab's invariant mode so the bytes don't depend on the clock, prints
+each size next to the baseline in benchmarks/sizes.json and exits non-zero
+if any grew by more than TOLERANCE. Sizes of the non-Latin CV depend on the
+TrueType font found, so they are only compared when it matches the one the
+baseline was recorded with.
+"""
+import io
+import json
+import os
+import sys
+
+from reportlab import rl_config
+
+from benchmarks.sample import academic_cv, sample_cv
+from utils import fonts
+from utils.generator import build_docx, build_pdf
+
+BASELINE = os.path.join(os.path.dirname(__file__), "sizes.json")
+TOLERANCE = 0.02
+TEMPLATES = ("sidebar", "band", "minimal")
+BUILDERS = {"pdf": build_pdf, "docx": build_docx}
+
+
+def _non_latin():
+    data = sample_cv()
+    data["name"] = "Анна Ковалёва"
+    data["job_title"] = "Μηχανικός λογισμικού"
+    data["experiences"][0]["company"] = "ООО «Ромашка»"
+    return data
+
+
+CVS = {
+    "short": lambda: sample_cv(experiences=1, bullets=2, projects=0),
+    "typical": sample_cv,
+    "long": lambda: academic_cv(publications=40),
+    "non-latin": _non_latin,
+}
+
+
+def measure():
+    rl_config.invariant = 1
+    sizes = {}
+    for label, make in CVS.items():
+        data = make()
+        for template in TEMPLATES:
+            for fmt, build in BUILDERS.items():
+                for mode in ("speed", "size"):
+                    buf = io.BytesIO()
+                    build(data, buf, template, optimize=mode)
+                    sizes[f"{label}/{template}/{fmt}/{mode}"] = len(buf.getvalue())
+    return sizes
+
+
+def _font():
+    return sorted(os.path.basename(f) for f in fonts.unicode_family().files.values())
+
+
+def main(update=False):
+    sizes = measure()
+    if update:
+        with open(BASELINE, "w") as f:
+            json.dump({"font": _font(), "sizes": sizes}, f, indent=1, sort_keys=True)
+            f.write("\n")
+        print(f"wrote {len(sizes)} sizes to {BASELINE}")
+        return 0
+    with open(BASELINE) as f:
+        baseline = json.load(f)
+    same_font = baseline["font"] == _font()
+    failed = []
+    print("document".ljust(34) + "bytes".rjust(9) + "baseline".rjust(10) + "change".rjust(9))
+    for key, size in sizes.items():
+        base = baseline["sizes"].get(key)
+        if base is None or (key.startswith("non-latin/") and not same_font):
+            print(key.ljust(34) + f"{size:9d}" + "-".rjust(10))
+            continue
+        change = size / base - 1
+        flag = ""
+        if change > TOLERANCE:
+            failed.append(key)
+            flag = "  FAIL"
+        print(key.ljust(34) + f"{size:9d}{base:10d}{change:+8.1%}{flag}")
+    if not same_font:
+        print(f"non-latin rows not compared: baseline font {baseline['font']}, here {_font()}")
+    if failed:
+        print(f"{len(failed)} documents grew more than {TOLERANCE:.0%}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(update="--update" in sys.argv[1:]))
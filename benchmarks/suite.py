@@ -0,0 +1,215 @@
+"""Time, allocations and size of every template × format, checked against a baseline.
+
+    python -m benchmarks.suite                  # compare with baseline.json
+    python -m benchmarks.suite --update         # record a new baseline
+    python -m benchmarks.suite --only 'huge/*' --repeat 9
+
+Renders the seeded CVs from benchmarks.corpus (tiny, typical, huge and
+Unicode) in every template and format two ways: build_docx/build_pdf on the
+payload, and POST /generate through the Flask test client (parsing,
+admission control and the response included). Every render starts cold: no
+fragments are reused and the render cache keeps nothing. Each case records
+its wall time, the peak memory tracemalloc sees during one run, and the
+document's size, with ReportLab's invariant mode so the bytes don't depend
+on the clock.
+
+Times are the fastest of at least --repeat runs after a warm-up one (more
+for quick cases), in units of a pure-Python calibration loop timed between
+those runs: on a shared machine a case is slowed down by whatever else is
+running, and the loop next to it is slowed down the same. They are printed
+as milliseconds at the machine's quickest calibration, so a baseline
+recorded elsewhere or on a busier day is still comparable. A case fails if
+its time grew by more than --time-tolerance (and by more than
+MIN_DELTA_MS), its allocations by more than --alloc-tolerance or its size
+by more than --size-tolerance; the exit status is 1 if any did. Allocations
+and sizes of the Unicode CV depend on the TrueType font found, so its rows
+are only compared when the font matches the baseline's, and the run says so
+when the only font found is ReportLab's Latin-only Vera.
+"""
+import argparse
+import fnmatch
+import io
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+# one render at a time in this process, with nothing rendered up front
+os.environ["CV_RENDER_WORKERS"] = "0"
+os.environ.setdefault("CV_WARMUP", "0")
+
+from reportlab import rl_config
+
+import app as cvapp
+from benchmarks.corpus import corpus
+from utils import fonts
+from utils.cache import RenderCache
+from utils.generator import build_docx, build_pdf, fragment_cache
+from utils.ratelimit import RateLimiter
+from utils.schema import TEMPLATES
+
+BASELINE = os.path.join(os.path.dirname(__file__), "baseline.json")
+BUILDERS = {"docx": build_docx, "pdf": build_pdf}
+TIME_TOLERANCE = 0.25
+ALLOC_TOLERANCE = 0.10
+SIZE_TOLERANCE = 0.02
+# differences this small are timer and scheduler noise, whatever the ratio
+MIN_DELTA_MS = 2.0
+MIN_SECONDS = 1.0
+MAX_REPEAT = 200
+
+
+def _loop():
+    # a fixed amount of interpreter work: dict, string and arithmetic churn
+    d = {}
+    for i in range(50_000):
+        d[i % 1000] = str(i * 7 % 13) + "x"
+    return d
+
+
+def _ms(fn):
+    t0 = time.perf_counter()
+    fn()
+    return (time.perf_counter() - t0) * 1000
+
+
+def calibrate(n=20):
+    """ms for the calibration loop with the machine at its least busy."""
+    return min(_ms(_loop) for _ in range(n))
+
+
+def _build(fmt, data, template):
+    def run():
+        fragment_cache.clear()
+        buf = io.BytesIO()
+        BUILDERS[fmt](data, buf, template, incremental=False)
+        return buf.getvalue()
+    return run
+
+
+def _generate(client, fmt, data, template):
+    payload = dict(data, output_format=fmt, template=template)
+
+    def run():
+        fragment_cache.clear()
+        rv = client.post("/generate", json=payload)
+        if rv.status_code != 200:
+            raise RuntimeError(f"/generate answered {rv.status_code}: {rv.get_data(as_text=True)[:200]}")
+        return rv.get_data()
+    return run
+
+
+def cases(only=None):
+    """(name, run) for every CV × template × format × path, run() returning the document."""
+    client = cvapp.app.test_client()
+    for label, data in corpus().items():
+        for template in TEMPLATES:
+            for fmt in BUILDERS:
+                for path, make in (("build", _build), ("generate", lambda *a: _generate(client, *a))):
+                    name = f"{label}/{template}/{fmt}/{path}"
+                    if not only or any(fnmatch.fnmatch(name, p) for p in only):
+                        yield name, make(fmt, data, template)
+
+
+def measure(run, repeat):
+    """Time (in calibration loops), tracemalloc peak and output size of run."""
+    body = run()
+    ratios, spent = [], 0.0
+    # quick cases run until MIN_SECONDS have gone by, or a fastest run is mostly luck
+    while len(ratios) < repeat or (spent < MIN_SECONDS * 1000 and len(ratios) < MAX_REPEAT):
+        loop_ms = _ms(_loop)
+        run_ms = _ms(run)
+        ratios.append(run_ms / min(loop_ms, _ms(_loop)))
+        spent += run_ms
+    tracemalloc.start()
+    try:
+        run()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {"loops": round(min(ratios), 4), "alloc_kib": round(peak / 1024, 1), "bytes": len(body)}
+
+
+def _font():
+    return sorted(os.path.basename(f) for f in fonts.unicode_family().files.values())
+
+
+def _compare(result, base, calibration, args):
+    # the metrics of result that regressed past their tolerance
+    failed = []
+    if (result["loops"] > base["loops"] * (1 + args.time_tolerance)
+            and (result["loops"] - base["loops"]) * calibration > MIN_DELTA_MS):
+        failed.append("time")
+    if result["alloc_kib"] > base["alloc_kib"] * (1 + args.alloc_tolerance):
+        failed.append("alloc")
+    if result["bytes"] > base["bytes"] * (1 + args.size_tolerance):
+        failed.append("size")
+    return failed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark every template and format against a baseline.")
+    parser.add_argument("--update", action="store_true", help="record the results as the new baseline")
+    parser.add_argument("--baseline", default=BASELINE, help="baseline JSON file (default: benchmarks/baseline.json)")
+    parser.add_argument("--repeat", type=int, default=5, help="least timed runs per case (default: 5)")
+    parser.add_argument("--only", action="append", metavar="PATTERN",
+                        help="only cases matching this glob, e.g. 'huge/*/pdf/*' (repeatable)")
+    parser.add_argument("--time-tolerance", type=float, default=TIME_TOLERANCE)
+    parser.add_argument("--alloc-tolerance", type=float, default=ALLOC_TOLERANCE)
+    parser.add_argument("--size-tolerance", type=float, default=SIZE_TOLERANCE)
+    args = parser.parse_args(argv)
+
+    rl_config.invariant = 1
+    cvapp.render_cache = RenderCache(max_entries=0)
+    cvapp.rate_limiter = RateLimiter(0)
+    previous = None
+    if os.path.exists(args.baseline) or not args.update:
+        with open(args.baseline) as f:
+            previous = json.load(f)
+    baseline = None if args.update else previous
+    same_font = baseline is None or baseline["font"] == _font()
+    calibration = calibrate()
+    print(f"calibration loop: {calibration:.2f}ms")
+    if fonts.unicode_family().latin_only:
+        print(f"font: {', '.join(_font())} is Latin only, so the unicode CV is drawn with missing glyphs "
+              "and its rows don't measure real text; install DejaVu Sans or set CV_PDF_FONT")
+    print("case".ljust(34) + "ms".rjust(9) + "base".rjust(9) + "KiB".rjust(9) + "base".rjust(9)
+          + "bytes".rjust(9) + "base".rjust(9))
+
+    results, failed = {}, []
+    for name, run in cases(args.only):
+        result = results[name] = measure(run, args.repeat)
+        base = baseline["results"].get(name) if baseline else None
+        if base is not None and name.startswith("unicode/") and not same_font:
+            # the time is still comparable; what's drawn and embedded isn't
+            base = dict(base, alloc_kib=float("inf"), bytes=float("inf"))
+        line = name.ljust(34) + f"{result['loops'] * calibration:9.1f}"
+        if base is None:
+            print(line + "-".rjust(9) + f"{result['alloc_kib']:9.0f}" + "-".rjust(9) + f"{result['bytes']:9d}" + "-".rjust(9))
+            continue
+        regressed = _compare(result, base, calibration, args)
+        if regressed:
+            failed.append(f"{name} ({', '.join(regressed)})")
+        print(line + f"{base['loops'] * calibration:9.1f}{result['alloc_kib']:9.0f}{base['alloc_kib']:9.0f}"
+              + f"{result['bytes']:9d}{base['bytes']:9.0f}" + ("  FAIL " + ",".join(regressed) if regressed else ""))
+
+    if args.update:
+        if args.only and previous:
+            # a partial run only replaces the cases it ran
+            results = {**previous["results"], **results}
+        with open(args.baseline, "w") as f:
+            json.dump({"font": _font(), "results": results}, f, indent=1, sort_keys=True)
+            f.write("\n")
+        print(f"wrote {len(results)} cases to {args.baseline}")
+        return 0
+    if not same_font:
+        print(f"unicode allocations and sizes not compared: baseline font {baseline['font']}, here {_font()}")
+    if failed:
+        print(f"{len(failed)} cases regressed: " + "; ".join(failed))
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,227 @@
+"""Render stored CVs to files in bulk, without the web app.
+
+    python bulk.py cvs/ -o out/
+    python bulk.py cvs.ndjson more/ -o out/ --jobs 8 --format docx,pdf --template sidebar,band
+
+Inputs are directories of .json files (one CV payload each, named after
+the file) and NDJSON files (.ndjson/.jsonl, one payload per line, named
+like /generate/batch names them). Payloads are validated as /generate
+validates them and may set their own output_format, template and accent;
+--format, --template and --accent are the defaults for those that don't.
+Each CV is laid out once and written in every template × format it asks
+for, by --jobs worker processes.
+
+The output directory keeps a manifest of each CV's render key from the
+last run. A CV whose key (its content and options, the optimize mode
+among them) is unchanged and whose files are all still there is skipped; --force renders
+everything again. A summary of throughput and per-CV latency percentiles
+is printed at the end, and the exit status is 1 if any CV failed.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+
+from werkzeug.utils import secure_filename
+
+from utils.cache import render_key
+from utils.generator import build_docx, build_pdf, render
+from utils.layout import build_layout
+from utils.optimize import OPTIMIZE
+from utils.schema import OPTIMIZE_MODES
+from utils.schema import OUTPUT_FORMATS, TEMPLATES, SchemaError, parse_json
+from utils.warmup import render_steps
+
+MANIFEST = ".bulk-manifest.json"
+NDJSON_SUFFIXES = (".ndjson", ".jsonl")
+BUILDERS = {"docx": build_docx, "pdf": build_pdf}
+
+
+def iter_payloads(paths):
+    """(name, source, payload or error message) for every CV in paths, read lazily."""
+    for path in paths:
+        if os.path.isdir(path):
+            for entry in sorted(os.listdir(path)):
+                if not entry.endswith(".json"):
+                    continue
+                source = os.path.join(path, entry)
+                try:
+                    with open(source, encoding="utf-8") as f:
+                        item = json.load(f)
+                except ValueError as e:
+                    item = f"invalid JSON: {e}"
+                yield os.path.splitext(entry)[0], source, item
+        elif path.endswith(NDJSON_SUFFIXES):
+            with open(path, encoding="utf-8") as f:
+                i = 0
+                for n, line in enumerate(f, 1):
+                    line = line.strip()
+                    if not line:
+                        continue
+                    try:
+                        item = json.loads(line)
+                    except ValueError as e:
+                        item = f"invalid JSON: {e}"
+                    name = item.get("filename") or item.get("name") if isinstance(item, dict) else None
+                    yield f"{i:05d}-{name or 'cv'}", f"{path}:{n}", item
+                    i += 1
+        else:
+            raise SystemExit(f"{path}: expected a directory or an .ndjson/.jsonl file")
+
+
+def _outputs(stem, formats, templates):
+    return [(f"{stem}-{template}.{fmt}" if len(templates) > 1 else f"{stem}.{fmt}", template, fmt)
+            for template in templates
+            for fmt in formats]
+
+
+def render_cv(data, outputs, accent, out_dir, optimize):
+    """Write one CV's documents; returns the seconds it took. Runs in the worker processes."""
+    t0 = time.perf_counter()
+    layout = build_layout(data)
+    for filename, template, fmt in outputs:
+        path = os.path.join(out_dir, filename)
+        BUILDERS[fmt](layout, path + ".tmp", template, accent, optimize=optimize)
+        os.replace(path + ".tmp", path)
+    return time.perf_counter() - t0
+
+
+def _warm():
+    for _, step in render_steps(render):
+        step()
+
+
+def _load_manifest(out_dir):
+    try:
+        with open(os.path.join(out_dir, MANIFEST), encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return {}
+
+
+def _save_manifest(out_dir, manifest):
+    path = os.path.join(out_dir, MANIFEST)
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(manifest, f, sort_keys=True)
+    os.replace(path + ".tmp", path)
+
+
+class _Inline:
+    # the executor interface for --jobs 0: render in this process
+    def submit(self, fn, *args):
+        future = Future()
+        try:
+            future.set_result(fn(*args))
+        except Exception as e:
+            future.set_exception(e)
+        return future
+
+    def shutdown(self, cancel_futures=False):
+        pass
+
+
+def _p(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * q))] * 1000 if values else float("nan")
+
+
+def run(paths, out_dir, jobs=None, defaults=None, optimize=None, force=False, log=sys.stderr):
+    """Render every CV in paths into out_dir; returns the summary as a dict."""
+    optimize = optimize or OPTIMIZE
+    if jobs is None:
+        jobs = os.cpu_count() or 1
+    os.makedirs(out_dir, exist_ok=True)
+    previous = {} if force else _load_manifest(out_dir)
+    manifest = {}
+    counts = {"rendered": 0, "skipped": 0, "failed": 0, "documents": 0}
+    latencies = []
+    pool = ProcessPoolExecutor(jobs, initializer=_warm) if jobs else _Inline()
+    pending = {}
+
+    def collect(done):
+        for future in done:
+            source, stem, key, n = pending.pop(future)
+            try:
+                latencies.append(future.result())
+            except Exception as e:
+                counts["failed"] += 1
+                print(f"{source}: {e}", file=log)
+                continue
+            counts["rendered"] += 1
+            counts["documents"] += n
+            manifest[stem] = key
+
+    t0 = time.perf_counter()
+    try:
+        for stem, source, item in iter_payloads(paths):
+            stem = secure_filename(stem) or "cv"
+            try:
+                if not isinstance(item, dict):
+                    raise SchemaError([{"field": "", "message": item if isinstance(item, str) else "expected a JSON object"}])
+                cv, formats, templates, accent, mode = parse_json({**(defaults or {}), **item}, multiple=True)
+            except SchemaError as e:
+                counts["failed"] += 1
+                print(f"{source}: {e}", file=log)
+                continue
+            data = cv.to_dict()
+            # a CV's own "optimize" wins over --optimize
+            mode = mode or optimize
+            key = render_key(data, ",".join(templates), accent, ",".join(formats), mode)
+            outputs = _outputs(stem, formats, templates)
+            if previous.get(stem) == key and all(os.path.exists(os.path.join(out_dir, f)) for f, _, _ in outputs):
+                counts["skipped"] += 1
+                manifest[stem] = key
+                continue
+            # a bounded number in flight, so a huge NDJSON file isn't read into memory up front
+            while len(pending) >= max(1, jobs) * 4:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                collect(done)
+            pending[pool.submit(render_cv, data, outputs, accent, out_dir, mode)] = (source, stem, key, len(outputs))
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            collect(done)
+    finally:
+        pool.shutdown(cancel_futures=True)
+        # CVs not seen this run keep their entries, so rendering a subset doesn't forget the rest
+        _save_manifest(out_dir, {**previous, **manifest})
+    elapsed = time.perf_counter() - t0
+    return dict(counts, seconds=elapsed, p50_ms=_p(latencies, 0.5), p90_ms=_p(latencies, 0.9),
+                p99_ms=_p(latencies, 0.99), max_ms=max(latencies, default=0) * 1000)
+
+
+def _summary(s):
+    rate = s["rendered"] / s["seconds"] if s["seconds"] else 0.0
+    lines = [
+        f"{s['rendered']} CVs rendered ({s['documents']} documents), {s['skipped']} unchanged, "
+        f"{s['failed']} failed in {s['seconds']:.1f}s",
+        f"throughput: {rate:.1f} CVs/s, {s['documents'] / s['seconds'] if s['seconds'] else 0.0:.1f} documents/s",
+    ]
+    if s["rendered"]:
+        lines.append(f"per CV: p50 {s['p50_ms']:.0f}ms  p90 {s['p90_ms']:.0f}ms  p99 {s['p99_ms']:.0f}ms  "
+                     f"max {s['max_ms']:.0f}ms")
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Render CV payloads from directories or NDJSON files.")
+    parser.add_argument("inputs", nargs="+", help="directories of .json files and/or .ndjson/.jsonl files")
+    parser.add_argument("-o", "--out", required=True, help="output directory")
+    parser.add_argument("-j", "--jobs", type=int, default=None,
+                        help="worker processes (default: one per CPU; 0 renders in this process)")
+    parser.add_argument("--format", help=f"default output format(s), comma-separated: {', '.join(OUTPUT_FORMATS)}")
+    parser.add_argument("--template", help=f"default template(s), comma-separated: {', '.join(TEMPLATES)}")
+    parser.add_argument("--accent", help="default accent colour (#rrggbb)")
+    parser.add_argument("--optimize", choices=OPTIMIZE_MODES, help=f"speed or size (default: {OPTIMIZE})")
+    parser.add_argument("--force", action="store_true", help="render every CV, even unchanged ones")
+    args = parser.parse_args(argv)
+    defaults = {k: v for k, v in (("output_format", args.format), ("template", args.template),
+                                  ("accent", args.accent)) if v}
+    summary = run(args.inputs, args.out, args.jobs, defaults, args.optimize, args.force)
+    print(_summary(summary))
+    return 1 if summary["failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,195 @@
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+
+from utils.optimize import OPTIMIZE
+
+
+# part of every render key: bump it when a change to the generators alters their output (pagination, styles,
+# fonts), so a CV_CACHE_DIR kept across an upgrade doesn't go on serving documents the old code rendered
+RENDER_VERSION = 2
+
+
+def render_key(data, template, accent, output_format, optimize=None):
+    # canonical JSON so dict ordering and whitespace in the payload don't matter; optimize=None is CV_OPTIMIZE,
+    # so the key names the mode the document is actually built in
+    payload = {
+        "version": RENDER_VERSION,
+        "data": data,
+        "template": template or "",
+        "accent": (accent or "").lower(),
+        "output_format": (output_format or "").lower(),
+        "optimize": optimize or OPTIMIZE,
+    }
+    raw = json.dumps(payload, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class RenderCache:
+    def __init__(self, max_entries=128, max_bytes=64 * 1024 * 1024, disk_dir=None, disk_max_bytes=256 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.disk_dir = disk_dir
+        self.disk_max_bytes = disk_max_bytes
+        self._lock = threading.Lock()
+        self._mem = OrderedDict()
+        self._mem_bytes = 0
+        self._disk = OrderedDict()
+        self._disk_bytes = 0
+        self._writing = set()
+        self.counters = {
+            "hits": 0,
+            "misses": 0,
+            "disk_hits": 0,
+            "evictions": 0,
+            "disk_evictions": 0,
+        }
+        if disk_dir:
+            os.makedirs(disk_dir, exist_ok=True)
+            self._load_disk_index()
+
+    def _load_disk_index(self):
+        entries = []
+        for name in os.listdir(self.disk_dir):
+            path = os.path.join(self.disk_dir, name)
+            if os.path.isfile(path) and not name.endswith(".tmp"):
+                st = os.stat(path)
+                entries.append((st.st_mtime, name, st.st_size))
+        for _, name, size in sorted(entries):
+            self._disk[name] = size
+            self._disk_bytes += size
+        self._remove(self._evict_disk())
+
+    def get(self, key):
+        with self._lock:
+            value = self._mem.get(key)
+            if value is not None:
+                self._mem.move_to_end(key)
+                self.counters["hits"] += 1
+                return value
+            on_disk = key in self._disk
+            if not on_disk:
+                self.counters["misses"] += 1
+                return None
+        # read without the lock, so a slow disk only holds up this lookup
+        try:
+            with open(os.path.join(self.disk_dir, key), "rb") as f:
+                value = f.read()
+        except OSError:
+            value = None
+        with self._lock:
+            if value is None:
+                if key in self._disk:
+                    self._disk_bytes -= self._disk.pop(key)
+                self.counters["misses"] += 1
+                return None
+            if key in self._disk:
+                self._disk.move_to_end(key)
+            self.counters["hits"] += 1
+            self.counters["disk_hits"] += 1
+            self._put_mem(key, value)
+            return value
+
+    def put(self, key, value):
+        with self._lock:
+            self._put_mem(key, value)
+            if not self.disk_dir or key in self._disk or key in self._writing or len(value) > self.disk_max_bytes:
+                return
+            self._writing.add(key)
+        path = os.path.join(self.disk_dir, key)
+        # a name of its own, so another process writing the same key doesn't share the temp file
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp, "wb") as f:
+                f.write(value)
+            os.replace(tmp, path)
+        except OSError:
+            with self._lock:
+                self._writing.discard(key)
+            return
+        with self._lock:
+            self._writing.discard(key)
+            self._disk[key] = len(value)
+            self._disk_bytes += len(value)
+            evicted = self._evict_disk()
+        self._remove(evicted)
+
+    def _put_mem(self, key, value):
+        if len(value) > self.max_bytes:
+            return
+        old = self._mem.pop(key, None)
+        if old is not None:
+            self._mem_bytes -= len(old)
+        self._mem[key] = value
+        self._mem_bytes += len(value)
+        while len(self._mem) > self.max_entries or self._mem_bytes > self.max_bytes:
+            _, evicted = self._mem.popitem(last=False)
+            self._mem_bytes -= len(evicted)
+            self.counters["evictions"] += 1
+
+    def _evict_disk(self):
+        # drops the oldest files from the index; returns their names for _remove, called without the lock
+        evicted = []
+        while self._disk and self._disk_bytes > self.disk_max_bytes:
+            name, size = self._disk.popitem(last=False)
+            self._disk_bytes -= size
+            self.counters["disk_evictions"] += 1
+            evicted.append(name)
+        return evicted
+
+    def _remove(self, names):
+        for name in names:
+            try:
+                os.remove(os.path.join(self.disk_dir, name))
+            except OSError:
+                pass
+
+    def stats(self):
+        with self._lock:
+            out = dict(self.counters)
+            out.update(
+                entries=len(self._mem),
+                bytes=self._mem_bytes,
+                disk_entries=len(self._disk),
+                disk_bytes=self._disk_bytes,
+            )
+            return out
+
+
+class FragmentCache:
+    # small in-process LRU for laid-out section fragments; values are opaque to the cache
+    def __init__(self, max_entries=512):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self.counters = {"hits": 0, "misses": 0, "evictions": 0}
+
+    def get(self, key):
+        with self._lock:
+            value = self._entries.get(key)
+            if value is None:
+                self.counters["misses"] += 1
+                return None
+            self._entries.move_to_end(key)
+            self.counters["hits"] += 1
+            return value
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.counters["evictions"] += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            out = dict(self.counters)
+            out["entries"] = len(self._entries)
+            return out
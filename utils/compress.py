@@ -0,0 +1,103 @@
+"""Content-Encoding for responses: gzip, or brotli when it's installed.
+
+Only types that shrink are encoded: HTML, CSS, JSON, SVG, scripts and PDF
+(whose page streams ReportLab already deflates, but whose fonts, xref and
+object headers don't). DOCX and ZIP are zip archives and PNG/JPEG
+compressed images, so they go out as they are. So do bodies too small to be
+worth a frame, streamed ones (the batch ZIP) and anything answering a Range
+request: ranges count bytes of the unencoded document, which is what
+send_file cuts them from.
+
+An encoded response's ETag becomes weak, since its bytes differ from the
+unencoded ones; conditional GETs compare weakly, so either still matches.
+Encodings of responses with a strong ETag (rendered documents, static
+files) are kept by that ETag, so each document is compressed once however
+often it is downloaded.
+"""
+import gzip
+import os
+import threading
+
+try:
+    import brotli
+except ImportError:  # optional; gzip alone without it
+    brotli = None
+
+from utils.cache import RenderCache
+
+COMPRESSIBLE = frozenset({
+    "text/html", "text/css", "text/plain", "text/csv", "text/javascript", "application/javascript",
+    "application/json", "image/svg+xml", "application/pdf",
+})
+# below this the gzip frame and a round of CPU cost more than they save
+MIN_BYTES = 1024
+GZIP_LEVEL = 6
+# brotli's best ratios take ~50x gzip's time; 5 beats gzip -6 at about its speed
+BROTLI_QUALITY = 5
+ENCODINGS = ("br", "gzip") if brotli else ("gzip",)
+
+
+def compress(body, encoding):
+    if encoding == "br":
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    return gzip.compress(body, GZIP_LEVEL, mtime=0)
+
+
+class Compressor:
+    def __init__(self, max_entries=256, max_bytes=16 * 1024 * 1024, min_bytes=MIN_BYTES):
+        self.min_bytes = min_bytes
+        self.cache = RenderCache(max_entries=max_entries, max_bytes=max_bytes)
+        self._lock = threading.Lock()
+        self.counters = {"responses": 0, "bytes_in": 0, "bytes_out": 0}
+
+    def encode(self, body, encoding, etag=None):
+        """body compressed with encoding, from the cache if etag (a strong one) has been seen."""
+        key = f"{etag}/{encoding}" if etag else None
+        data = self.cache.get(key) if key else None
+        if data is None:
+            data = compress(body, encoding)
+            if key:
+                self.cache.put(key, data)
+        return data
+
+    def apply(self, request, response):
+        """Encode response for request's Accept-Encoding, in place; returns response."""
+        if response.mimetype not in COMPRESSIBLE or "Content-Encoding" in response.headers:
+            return response
+        response.vary.add("Accept-Encoding")
+        if response.status_code != 200 or request.range is not None:
+            return response
+        if not (response.is_sequence or response.direct_passthrough):
+            return response  # generated as it's sent; left streaming
+        encoding = request.accept_encodings.best_match(ENCODINGS)
+        if encoding is None:
+            return response
+        response.direct_passthrough = False
+        body = response.get_data()
+        if len(body) < self.min_bytes:
+            return response
+        etag, weak = response.get_etag()
+        data = self.encode(body, encoding, None if weak else etag)
+        if len(data) >= len(body):
+            return response
+        response.set_data(data)
+        response.headers["Content-Encoding"] = encoding
+        if etag:
+            response.set_etag(etag, weak=True)
+        with self._lock:
+            self.counters["responses"] += 1
+            self.counters["bytes_in"] += len(body)
+            self.counters["bytes_out"] += len(data)
+        return response
+
+    def stats(self):
+        with self._lock:
+            out = dict(self.counters)
+        out["cache"] = self.cache.stats()
+        return out
+
+
+compressor = Compressor(
+    max_entries=int(os.environ.get("CV_COMPRESS_CACHE_ENTRIES", 256)),
+    max_bytes=int(os.environ.get("CV_COMPRESS_CACHE_BYTES", 16 * 1024 * 1024)),
+)
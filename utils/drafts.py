@@ -0,0 +1,269 @@
+"""CV drafts kept on the server, edited with JSON Patch and rendered by id.
+
+A draft is the JSON payload /generate takes, saved once with POST /drafts. After that the page sends only what changed, as an
+RFC 6902 JSON Patch, and exports name the draft instead of uploading the CV
+again. Every patch is checked against the schema before it is stored and
+bumps the draft's revision, which is its ETag: a PATCH with If-Match fails
+with 412 if the draft changed meanwhile.
+
+Drafts live in SQLite, as zlib-compressed compact JSON keyed by id, with an
+index on the update time for expiring those not touched for ttl seconds.
+Without a path the database is in memory and lost on restart; with one,
+every process opening the same file shares the drafts.
+"""
+import copy
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+import zlib
+
+from utils.schema import MAX_PAYLOAD_BYTES, PayloadTooLarge, SchemaError
+
+MAX_PATCH_OPS = 1000
+PATCH_OPS = ("add", "remove", "replace", "move", "copy", "test")
+
+
+class PatchError(SchemaError):
+    title = "invalid JSON patch"
+
+
+class PatchTestFailed(PatchError):
+    status = 409
+    title = "JSON patch test failed"
+
+
+class DraftConflict(Exception):
+    """The draft isn't at the revision the client expected."""
+
+    def __init__(self, draft):
+        super().__init__("draft has changed")
+        self.draft = draft
+
+
+def _error(path, message, cls=PatchError):
+    return cls([{"field": path, "message": message}])
+
+
+def _tokens(pointer):
+    # a JSON pointer ("/experiences/0/bullets/-") as its reference tokens
+    if not isinstance(pointer, str) or (pointer and not pointer.startswith("/")):
+        raise _error(str(pointer), "must be a JSON pointer")
+    return [t.replace("~1", "/").replace("~0", "~") for t in pointer.split("/")[1:]]
+
+
+def _index(target, token, pointer, append=False):
+    if append and token == "-":
+        return len(target)
+    if not token.isdigit() or (token != "0" and token.startswith("0")):
+        raise _error(pointer, "is not an array index")
+    i = int(token)
+    if i > len(target) or (i == len(target) and not append):
+        raise _error(pointer, "is past the end of the array")
+    return i
+
+
+def _resolve(doc, tokens, pointer):
+    for token in tokens:
+        if isinstance(doc, dict):
+            if token not in doc:
+                raise _error(pointer, "does not exist")
+            doc = doc[token]
+        elif isinstance(doc, list):
+            doc = doc[_index(doc, token, pointer)]
+        else:
+            raise _error(pointer, "does not exist")
+    return doc
+
+
+def _add(doc, tokens, value, pointer):
+    if not tokens:
+        return value
+    parent = _resolve(doc, tokens[:-1], pointer)
+    if isinstance(parent, dict):
+        parent[tokens[-1]] = value
+    elif isinstance(parent, list):
+        parent.insert(_index(parent, tokens[-1], pointer, append=True), value)
+    else:
+        raise _error(pointer, "does not exist")
+    return doc
+
+
+def _replace(doc, tokens, value, pointer):
+    if not tokens:
+        return value
+    parent = _resolve(doc, tokens[:-1], pointer)
+    _resolve(parent, tokens[-1:], pointer)
+    parent[tokens[-1] if isinstance(parent, dict) else int(tokens[-1])] = value
+    return doc
+
+
+def _remove(doc, tokens, pointer):
+    # (doc, the value removed)
+    if not tokens:
+        raise _error(pointer, "can't remove the whole document")
+    parent = _resolve(doc, tokens[:-1], pointer)
+    value = _resolve(parent, tokens[-1:], pointer)
+    if isinstance(parent, dict):
+        del parent[tokens[-1]]
+    else:
+        del parent[int(tokens[-1])]
+    return doc, value
+
+
+def apply_patch(doc, patch):
+    """doc with the JSON Patch operations in patch applied; doc itself is left alone."""
+    if not isinstance(patch, list):
+        raise _error("", "expected a JSON array of operations")
+    if len(patch) > MAX_PATCH_OPS:
+        raise _error("", f"has more than {MAX_PATCH_OPS} operations")
+    doc = copy.deepcopy(doc)
+    for i, op in enumerate(patch):
+        if not isinstance(op, dict) or op.get("op") not in PATCH_OPS:
+            raise _error(f"{i}", f"op must be one of: {', '.join(PATCH_OPS)}")
+        pointer = op.get("path")
+        tokens = _tokens(pointer)
+        kind = op["op"]
+        if kind in ("add", "replace", "test") and "value" not in op:
+            raise _error(pointer, f"{kind} needs a value")
+        if kind == "add":
+            doc = _add(doc, tokens, copy.deepcopy(op["value"]), pointer)
+        elif kind == "remove":
+            doc, _ = _remove(doc, tokens, pointer)
+        elif kind == "replace":
+            doc = _replace(doc, tokens, copy.deepcopy(op["value"]), pointer)
+        elif kind == "test":
+            if _resolve(doc, tokens, pointer) != op["value"]:
+                raise _error(pointer, "is not the value given", PatchTestFailed)
+        else:
+            source = op.get("from")
+            from_tokens = _tokens(source)
+            if kind == "move":
+                if tokens[:len(from_tokens)] == from_tokens and tokens != from_tokens:
+                    raise _error(pointer, "can't move a value into itself")
+                doc, value = _remove(doc, from_tokens, source)
+            else:
+                value = copy.deepcopy(_resolve(doc, from_tokens, source))
+            doc = _add(doc, tokens, value, pointer)
+    return doc
+
+
+def _encode(doc):
+    raw = json.dumps(doc, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+    if len(raw) > MAX_PAYLOAD_BYTES:
+        raise PayloadTooLarge(len(raw))
+    return zlib.compress(raw)
+
+
+class Draft:
+    __slots__ = ("id", "revision", "doc", "created", "updated")
+
+    def __init__(self, id, revision, doc, created, updated):
+        self.id = id
+        self.revision = revision
+        self.doc = doc
+        self.created = created
+        self.updated = updated
+
+    @property
+    def etag(self):
+        return str(self.revision)
+
+    def to_dict(self):
+        return {"id": self.id, "revision": self.revision, "created": self.created, "updated": self.updated}
+
+
+class DraftStore:
+    """Drafts in SQLite: a file shared between processes, or memory when path is None."""
+
+    def __init__(self, path=None, ttl=30 * 24 * 3600):
+        self.path = path
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._writes = 0
+        self.counters = {"created": 0, "updated": 0, "deleted": 0, "conflicts": 0}
+        self._db = sqlite3.connect(path or ":memory:", timeout=5, isolation_level=None, check_same_thread=False)
+        with self._lock:
+            if path:
+                self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("CREATE TABLE IF NOT EXISTS drafts (id TEXT PRIMARY KEY, revision INTEGER NOT NULL, "
+                             "data BLOB NOT NULL, created REAL NOT NULL, updated REAL NOT NULL)")
+            self._db.execute("CREATE INDEX IF NOT EXISTS drafts_updated ON drafts (updated)")
+            self._expire()
+
+    def _expire(self):
+        if self.ttl:
+            self._db.execute("DELETE FROM drafts WHERE updated < ?", (time.time() - self.ttl,))
+
+    def _row(self, draft_id):
+        row = self._db.execute("SELECT revision, data, created, updated FROM drafts WHERE id = ?", (draft_id,)).fetchone()
+        if row is None or (self.ttl and row[3] < time.time() - self.ttl):
+            return None
+        revision, data, created, updated = row
+        return Draft(draft_id, revision, json.loads(zlib.decompress(data)), created, updated)
+
+    def _wrote(self):
+        self._writes += 1
+        if self._writes % 1000 == 0:
+            self._expire()
+
+    def create(self, doc):
+        data = _encode(doc)
+        now = time.time()
+        draft = Draft(uuid.uuid4().hex, 1, doc, now, now)
+        with self._lock:
+            self._db.execute("INSERT INTO drafts (id, revision, data, created, updated) VALUES (?, ?, ?, ?, ?)",
+                             (draft.id, draft.revision, data, now, now))
+            self.counters["created"] += 1
+            self._wrote()
+        return draft
+
+    def get(self, draft_id):
+        with self._lock:
+            return self._row(draft_id)
+
+    def update(self, draft_id, fn, revision=None):
+        """Replace the draft's document with fn(document); None if there is no such draft.
+
+        Raises DraftConflict if revision is given and isn't the draft's.
+        """
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                draft = self._row(draft_id)
+                if draft is None:
+                    self._db.execute("ROLLBACK")
+                    return None
+                if revision is not None and revision != draft.revision:
+                    self.counters["conflicts"] += 1
+                    raise DraftConflict(draft)
+                doc = fn(draft.doc)
+                now = time.time()
+                self._db.execute("UPDATE drafts SET revision = ?, data = ?, updated = ? WHERE id = ?",
+                                 (draft.revision + 1, _encode(doc), now, draft_id))
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+            self.counters["updated"] += 1
+            self._wrote()
+        return Draft(draft_id, draft.revision + 1, doc, draft.created, now)
+
+    def delete(self, draft_id):
+        with self._lock:
+            deleted = self._db.execute("DELETE FROM drafts WHERE id = ?", (draft_id,)).rowcount
+            self.counters["deleted"] += deleted
+        return bool(deleted)
+
+    def stats(self):
+        with self._lock:
+            count, size = self._db.execute("SELECT count(*), coalesce(sum(length(data)), 0) FROM drafts").fetchone()
+        return dict(self.counters, drafts=count, bytes=size)
+
+
+draft_store = DraftStore(
+    os.environ.get("CV_DRAFTS_DB") or None,
+    ttl=float(os.environ.get("CV_DRAFT_TTL", 30 * 24 * 3600)),
+)
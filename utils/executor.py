@@ -0,0 +1,195 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeout
+from concurrent.futures.process import BrokenProcessPool
+
+from utils import metrics
+from utils.generator import render, render_timed
+from utils.images import attach_photo
+from utils.warmup import render_steps
+
+
+class RenderBusy(Exception):
+    def __init__(self, retry_after=1):
+        super().__init__("render queue is full")
+        self.retry_after = retry_after
+
+
+class RenderTimeout(Exception):
+    pass
+
+
+def _warm_worker():
+    # pay python-docx/ReportLab import and first-use costs before the first real job
+    for _, step in render_steps(render):
+        step()
+
+
+def _noop():
+    return None
+
+
+class RenderExecutor:
+    """Runs build_docx/build_pdf jobs, optionally in a pool of worker processes.
+
+    With workers=0 jobs render inline in the calling thread. Otherwise at most
+    max_pending jobs may be queued or running; further submissions raise
+    RenderBusy instead of piling up behind the pool. A CV's photo id is looked
+    up here, so workers get the prepared image without sharing the photo store.
+
+    A job that runs past timeout can't be interrupted, and a pool one of whose
+    workers died (out of memory, a crash in a C extension) fails every job
+    after it; either way the pool is replaced and its processes killed. Jobs
+    that fail because their pool broke are retried once on the new one.
+    """
+
+    def __init__(self, workers=0, max_pending=None, timeout=30, retry_after=1):
+        self.workers = workers
+        self.timeout = timeout
+        self.retry_after = retry_after
+        self._pool = None
+        self._slots = None
+        self._pool_lock = threading.Lock()
+        self.counters = {"restarts": 0, "timeouts": 0}
+        if workers > 0:
+            self._pool = self._new_pool()
+            self._slots = threading.BoundedSemaphore(max_pending or workers * 4)
+
+    def _new_pool(self):
+        return ProcessPoolExecutor(max_workers=self.workers, initializer=_warm_worker)
+
+    def _recycle(self, pool):
+        # swap in a fresh pool and kill pool's workers, unless another thread already has
+        with self._pool_lock:
+            if self._pool is not pool:
+                return
+            self._pool = self._new_pool()
+            self.counters["restarts"] += 1
+        # ProcessPoolExecutor has no way to stop a running job but killing its process
+        for process in list((pool._processes or {}).values()):
+            process.terminate()
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    def _timed_out(self, pools):
+        self.counters["timeouts"] += 1
+        for pool in set(pools):
+            self._recycle(pool)
+        return RenderTimeout(f"render did not finish within {self.timeout}s")
+
+    def warm(self):
+        if self._pool is not None:
+            for f in [self._pool.submit(_noop) for _ in range(self.workers)]:
+                f.result()
+
+    def _submit(self, fn, *args, block=False):
+        # (pool, future); the future holds one of the max_pending slots until it's done
+        if not self._slots.acquire(blocking=block):
+            raise RenderBusy(self.retry_after)
+        try:
+            pool = self._pool
+            try:
+                future = pool.submit(fn, *args)
+            except RuntimeError:
+                # broken, or shut down by another thread's _recycle since we looked
+                self._recycle(pool)
+                pool = self._pool
+                future = pool.submit(fn, *args)
+        except BaseException:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        return pool, future
+
+    def submit(self, fn, *args, block=False):
+        if self._pool is None:
+            raise RuntimeError("submit() needs a process pool; use run() for inline rendering")
+        return self._submit(fn, *args, block=block)[1]
+
+    def run(self, fn, *args, block=False):
+        if self._pool is None:
+            return fn(*args)
+        for attempt in range(2):
+            pool, future = self._submit(fn, *args, block=block)
+            try:
+                return future.result(timeout=self.timeout)
+            except FutureTimeout:
+                raise self._timed_out([pool])
+            except BrokenProcessPool:
+                self._recycle(pool)
+                if attempt:
+                    raise
+
+    def render(self, data, output_format="docx", template="sidebar", accent="#b87333", block=False, optimize=None):
+        if self._pool is not None:
+            data = attach_photo(data)
+        body, timings = self.run(render_timed, data, output_format, template, accent, optimize, block=block)
+        metrics.record(timings)
+        return body
+
+    def render_many(self, jobs, block=False):
+        """render() for several (data, output_format, template, accent[, optimize]) jobs at once.
+
+        With a pool they run in parallel on its workers. Only the first job can be
+        shed with RenderBusy; the rest wait for a slot, so one request's own jobs
+        never push it over max_pending. Without one they render one after another
+        in the calling thread.
+        """
+        if self._pool is None:
+            results = [render_timed(*job) for job in jobs]
+        else:
+            results = [None] * len(jobs)
+            todo = list(range(len(jobs)))
+            deadline = time.monotonic() + self.timeout
+            for attempt in range(2):
+                submitted, broken = [], []
+                try:
+                    for n, i in enumerate(todo):
+                        data, *rest = jobs[i]
+                        submitted.append((i, *self._submit(render_timed, attach_photo(data), *rest,
+                                                           block=block or attempt > 0 or n > 0)))
+                    for i, pool, f in submitted:
+                        try:
+                            results[i] = f.result(timeout=max(0.0, deadline - time.monotonic()))
+                        except BrokenProcessPool:
+                            self._recycle(pool)
+                            broken.append(i)
+                except FutureTimeout:
+                    raise self._timed_out([pool for _, pool, _ in submitted])
+                finally:
+                    for _, _, f in submitted:
+                        f.cancel()
+                if not broken:
+                    break
+                if attempt:
+                    raise BrokenProcessPool("a render worker died twice")
+                todo = broken
+        for _, timings in results:
+            metrics.record(timings)
+        return [body for body, _ in results]
+
+    async def render_async(self, data, output_format="docx", template="sidebar", accent="#b87333", optimize=None):
+        # render() for an event loop: the loop waits on the worker process (or, inline, a
+        # thread of the loop's default executor) instead of blocking
+        if self._pool is None:
+            loop = asyncio.get_running_loop()
+            body, timings = await loop.run_in_executor(None, render_timed, data, output_format, template, accent,
+                                                       optimize)
+        else:
+            for attempt in range(2):
+                pool, future = self._submit(render_timed, attach_photo(data), output_format, template, accent, optimize)
+                try:
+                    body, timings = await asyncio.wait_for(asyncio.wrap_future(future), self.timeout)
+                    break
+                except asyncio.TimeoutError:
+                    raise self._timed_out([pool])
+                except BrokenProcessPool:
+                    self._recycle(pool)
+                    if attempt:
+                        raise
+        metrics.record(timings)
+        return body
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(cancel_futures=True)
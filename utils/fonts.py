@@ -0,0 +1,120 @@
+"""Fonts for PDF output: base-14 Helvetica, or a TrueType family when the text needs it.
+
+Helvetica isn't embedded, which keeps PDFs small, but it only covers
+WinAnsi (roughly Western European Latin). A CV with text outside that is
+drawn with a TrueType family instead. Its files are parsed and registered
+with pdfmetrics once per process, the first time one is needed, and shared
+by every document after that. ReportLab embeds only the glyphs a document
+actually uses (as subsets of up to 256 glyphs), not the whole font.
+
+The family is the first pair of files found from CV_PDF_FONT /
+CV_PDF_FONT_BOLD, then common DejaVu / Arial locations, then the Vera
+fonts bundled with ReportLab. Those cover Latin only: with nothing else
+found, Cyrillic, Greek and other scripts come out as missing glyphs, so a
+warning is logged when they are registered.
+"""
+import logging
+import os
+import threading
+
+import reportlab
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont
+
+_RL_FONTS = os.path.join(os.path.dirname(reportlab.__file__), "fonts")
+
+TTF_CANDIDATES = [
+    ("/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf", "/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf"),
+    ("/usr/share/fonts/dejavu/DejaVuSans.ttf", "/usr/share/fonts/dejavu/DejaVuSans-Bold.ttf"),
+    ("/usr/share/fonts/TTF/DejaVuSans.ttf", "/usr/share/fonts/TTF/DejaVuSans-Bold.ttf"),
+    ("/Library/Fonts/Arial Unicode.ttf", "/Library/Fonts/Arial Unicode.ttf"),
+    ("C:/Windows/Fonts/arial.ttf", "C:/Windows/Fonts/arialbd.ttf"),
+    (os.path.join(_RL_FONTS, "Vera.ttf"), os.path.join(_RL_FONTS, "VeraBd.ttf")),
+]
+# the last resort above, always there but without glyphs beyond Latin
+LATIN_ONLY = TTF_CANDIDATES[-1]
+
+log = logging.getLogger(__name__)
+
+
+class FontFamily:
+    __slots__ = ("name", "regular", "bold", "files", "latin_only")
+
+    def __init__(self, name, regular, bold, files=None, latin_only=False):
+        self.name = name
+        self.regular = regular
+        self.bold = bold
+        # font name -> TrueType file, for embedded families
+        self.files = files or {}
+        self.latin_only = latin_only
+
+
+HELVETICA = FontFamily("helvetica", "Helvetica", "Helvetica-Bold")
+
+_lock = threading.Lock()
+_unicode = None
+
+
+def _ttf_files():
+    env = os.environ.get("CV_PDF_FONT")
+    if env:
+        return env, os.environ.get("CV_PDF_FONT_BOLD") or env
+    for regular, bold in TTF_CANDIDATES:
+        if os.path.exists(regular) and os.path.exists(bold):
+            return regular, bold
+    raise FileNotFoundError("no TrueType font found; set CV_PDF_FONT")
+
+
+def unicode_family():
+    """The TrueType family, registered with pdfmetrics on first use."""
+    global _unicode
+    if _unicode is None:
+        with _lock:
+            if _unicode is None:
+                regular, bold = _ttf_files()
+                latin_only = (regular, bold) == LATIN_ONLY
+                if latin_only:
+                    log.warning("only ReportLab's Latin-only Vera fonts were found: text in other scripts will "
+                                "be drawn as missing glyphs in PDFs; install DejaVu Sans or set CV_PDF_FONT")
+                # parsing the TTF is the expensive part; pdfmetrics keeps the result for the process
+                pdfmetrics.registerFont(TTFont("CVSans", regular))
+                pdfmetrics.registerFont(TTFont("CVSans-Bold", bold))
+                pdfmetrics.registerFontFamily("CVSans", normal="CVSans", bold="CVSans-Bold",
+                                              italic="CVSans", boldItalic="CVSans-Bold")
+                _unicode = FontFamily("unicode", "CVSans", "CVSans-Bold", {"CVSans": regular, "CVSans-Bold": bold},
+                                      latin_only)
+    return _unicode
+
+
+def _layout_text(layout):
+    yield layout.name
+    yield layout.job_title
+    yield layout.contact_line
+    for section in layout.sections.values():
+        yield section.text
+        yield from section.items
+        for entry in section.entries:
+            yield from (entry.head, entry.meta, entry.dates, entry.alt_head, entry.tech, entry.link)
+            yield from entry.bullets
+
+
+def needs_unicode(layout):
+    """True when some of the CV's text can't be drawn with base-14 Helvetica."""
+    try:
+        "\n".join(t for t in _layout_text(layout) if t).encode("cp1252")
+    except UnicodeEncodeError:
+        return True
+    return False
+
+
+def pdf_family(layout, mode="auto"):
+    if mode == "helvetica" or (mode == "auto" and not needs_unicode(layout)):
+        return HELVETICA
+    return unicode_family()
+
+
+def font_file(name):
+    """TrueType file behind a registered font name, or None for base-14 fonts."""
+    family = _unicode
+    return family.files.get(name) if family is not None else None
+
@@ -1,16 +1,28 @@
+import copy
+import io
+import zlib
+from functools import lru_cache
 from docx import Document
 from docx.shared import Pt, Inches, RGBColor
 from docx.enum.text import WD_ALIGN_PARAGRAPH
 from docx.oxml import OxmlElement
 from docx.oxml.ns import qn
+from docx.opc.part import XmlPart
 from reportlab.lib.pagesizes import LETTER
 from reportlab.pdfgen import canvas
 from reportlab.lib.units import inch
-from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase import pdfdoc, pdfmetrics, pdfutils
 from reportlab.lib.colors import HexColor
 from reportlab.platypus import Paragraph
 from reportlab.lib.styles import ParagraphStyle
 from reportlab.lib.enums import TA_JUSTIFY, TA_LEFT
+from utils.cache import FragmentCache
+from utils.fonts import HELVETICA, pdf_family
+from utils.images import PHOTO_INCHES
+from utils.layout import build_layout
+from utils.metrics import Lap, collect, timer
+from utils.optimize import OPTIMIZE, compact_pdf, repack_docx
+from utils.pdfstream import StreamingCanvas
 
 
 def _rgb_from_hex(hex_str):
@@ -42,598 +54,858 @@ def add_heading(document, text, accent=None):
     if accent:
         r.font.color.rgb = _rgb_from_hex(accent)
 
-def build_docx(data, output_path, template="sidebar", accent="#b87333"):
-    document = Document()
-    if template == "sidebar":
-        add_heading(document, "Curriculum Vitae (CV)", accent)
-        table = document.add_table(rows=1, cols=2)
-        table.autofit = False
-        left, right = table.rows[0].cells
-        left.width = Inches(2.2)
-        right.width = Inches(4.8)
-        def shade(cell, color_hex):
-            tcPr = cell._tc.get_or_add_tcPr()
-            shd = OxmlElement('w:shd')
-            shd.set(qn('w:fill'), color_hex.replace('#',''))
-            tcPr.append(shd)
-        shade(left, accent)
+def _shade(cell, color_hex):
+    tcPr = cell._tc.get_or_add_tcPr()
+    shd = OxmlElement('w:shd')
+    shd.set(qn('w:fill'), color_hex.replace('#',''))
+    tcPr.append(shd)
+
+_frozen_part_classes = {}
+
+def _freeze_part(part):
+    # skeleton parts other than document.xml are never modified, so serialize them once
+    if isinstance(part, XmlPart):
+        cls = part.__class__
+        if cls not in _frozen_part_classes:
+            _frozen_part_classes[cls] = type("Frozen" + cls.__name__, (cls,), {
+                "blob": property(lambda self: self._frozen_blob),
+            })
+        part._frozen_blob = part.blob
+        part.__class__ = _frozen_part_classes[cls]
+
+class _DocxSkeleton:
+    # the static part of a template (headings, tables, shading), built once per template/accent
+    def __init__(self, template, accent):
+        document = Document()
+        if template == "sidebar":
+            add_heading(document, "Curriculum Vitae (CV)", accent)
+            table = document.add_table(rows=1, cols=2)
+            table.autofit = False
+            left, right = table.rows[0].cells
+            left.width = Inches(2.2)
+            right.width = Inches(4.8)
+            _shade(left, accent)
+            rp = right.add_paragraph("Professional Profile")
+            rp.runs[0].bold = True
+            rp.runs[0].font.color.rgb = _rgb_from_hex(accent)
+        elif template == "band":
+            band = document.add_table(rows=1, cols=1)
+            band.autofit = True
+            _shade(band.rows[0].cells[0], accent)
+            add_heading(document, "Professional Profile", accent)
+        else:
+            add_heading(document, "Curriculum Vitae (CV)", accent)
+        self._part = document.part
+        self._shared = {}
+        for part in self._part.package.iter_parts():
+            if part is not self._part:
+                _freeze_part(part)
+                self._shared[id(part)] = part
+
+    def clone(self):
+        # deep-copies document.xml and the package wiring; frozen parts are shared, not copied
+        return copy.deepcopy(self._part, dict(self._shared)).document
+
+@lru_cache(maxsize=32)
+def _docx_skeleton(template, accent):
+    return _DocxSkeleton(template, accent)
+
+def _bold(paragraph):
+    if paragraph.runs:
+        paragraph.runs[0].bold = True
+    return paragraph
+
+def _sidebar_heading(container, text, accent):
+    h = _bold(container.add_paragraph(text))
+    h.runs[0].font.color.rgb = _rgb_from_hex(accent)
+
+def _band_heading(container, text, accent):
+    add_heading(container, text, accent)
+
+# section key -> heading per template; sections missing from a template's list aren't drawn there
+DOCX_SECTIONS = {
+    "sidebar": [
+        ("experiences", "Career Summary"),
+        ("education", "Education"),
+        ("projects", "Projects"),
+        ("certifications", "Certifications"),
+        ("extras", "Extras"),
+        ("references", "References"),
+    ],
+    "band": [
+        ("experiences", "Work Experience"),
+        ("education", "Education"),
+        ("projects", "Projects"),
+        ("certifications", "Certifications"),
+        ("extras", "Extras"),
+        ("languages", "Languages"),
+        ("references", "References"),
+    ],
+}
+DOCX_SECTIONS["minimal"] = [("summary", "Summary"), ("skills", "Skills")] + DOCX_SECTIONS["band"]
+
+def _docx_entry(container, key, entry, sidebar):
+    if key == "experiences":
+        if sidebar:
+            if entry.dates:
+                container.add_paragraph(entry.dates)
+            if entry.alt_head:
+                _bold(container.add_paragraph(entry.alt_head))
+        else:
+            _bold(container.add_paragraph(entry.head))
+            if entry.meta:
+                container.add_paragraph(entry.meta)
+        for b in entry.bullets:
+            container.add_paragraph(b, style="List Bullet")
+    elif key == "education":
+        _bold(container.add_paragraph(entry.head))
+        if entry.meta:
+            container.add_paragraph(entry.meta)
+    elif key == "projects":
+        _bold(container.add_paragraph(entry.head))
+        if entry.tech:
+            container.add_paragraph(entry.tech)
+        for b in entry.bullets:
+            container.add_paragraph(b, style="List Bullet")
+        if entry.link:
+            container.add_paragraph(entry.link)
+
+def _docx_section(document, container, section, title, heading, accent, sidebar, entry=_docx_entry):
+    key = section.key
+    heading(container, title, accent)
+    if section.entries:
+        for e in section.entries:
+            entry(container, key, e, sidebar)
+    elif key == "summary":
+        container.add_paragraph(section.text).alignment = WD_ALIGN_PARAGRAPH.JUSTIFY
+    elif key == "skills":
+        for s in section.items:
+            container.add_paragraph(s, style="List Bullet")
+    elif key == "languages":
+        container.add_paragraph(section.text)
+    elif key == "references":
+        # the sidebar template has always put the reference text below the table
+        rp = (document if sidebar else container).add_paragraph(section.text)
+        rp.alignment = WD_ALIGN_PARAGRAPH.JUSTIFY
+    else:
+        for item in section.items:
+            container.add_paragraph(item)
+
+# laid-out sections and entries keyed by template and content, so an edit only redoes what it touched
+fragment_cache = FragmentCache(1024)
+
+def _insert_block(parent, element):
+    # the body keeps its sectPr last, the way add_paragraph() does
+    sect_pr = parent.find(qn('w:sectPr'))
+    if sect_pr is not None:
+        sect_pr.addprevious(element)
+    else:
+        parent.append(element)
+
+def _docx_fragment(parents, key, build, *args):
+    # on a miss, build() adds its paragraphs as usual and copies of the new XML are kept;
+    # on a hit those copies are inserted again instead
+    fragment = fragment_cache.get(key)
+    if fragment is None:
+        before = [set(parent) for parent in parents]
+        build(*args)
+        fragment_cache.put(key, tuple(
+            tuple(copy.deepcopy(el) for el in parent if el not in seen)
+            for parent, seen in zip(parents, before)
+        ))
+        return
+    for parent, elements in zip(parents, fragment):
+        for el in elements:
+            _insert_block(parent, copy.deepcopy(el))
+
+# the square a photo is fitted into, in inches
+DOCX_PHOTO_BOX = {"sidebar": PHOTO_INCHES, "band": 1.0, "minimal": 1.0}
+
+def _docx_photo(container, photo, box, align=WD_ALIGN_PARAGRAPH.LEFT):
+    w, h = photo.fit(box, box)
+    p = container.add_paragraph()
+    p.alignment = align
+    p.add_run().add_picture(io.BytesIO(photo.data), width=Inches(w), height=Inches(h))
+
+def _docx_section_cached(document, container, section, title, heading, accent, sidebar, template_key):
+    body = document._body._element
+    parents = [body] if container is document else [container._element, body]
+
+    def entry(container, key, e, sidebar):
+        _docx_fragment(parents, ("docx", template_key, key, e), _docx_entry, container, key, e, sidebar)
+
+    _docx_fragment(parents, ("docx", template_key, accent, title, section),
+                   _docx_section, document, container, section, title, heading, accent, sidebar, entry)
+
+def build_docx(data, output, template="sidebar", accent="#b87333", incremental=True, optimize=None):
+    # output may be a filesystem path or any writable binary stream (e.g. BytesIO)
+    # data may be the raw CV dict or a Layout from build_layout()
+    # incremental=False lays every section out again instead of reusing cached fragments
+    # optimize="size" repacks the file smaller (see utils.optimize); None means CV_OPTIMIZE
+    lap = Lap("cv_section_seconds", template=template, format="docx")
+    lap("header")
+    layout = build_layout(data)
+    if template not in ("sidebar", "band"):
+        template_key = "minimal"
+    else:
+        template_key = template
+    document = _docx_skeleton(template_key, accent).clone()
+    sidebar = template_key == "sidebar"
+    if sidebar:
+        left, container = document.tables[0].rows[0].cells
+        heading = _sidebar_heading
+        if layout.photo:
+            _docx_photo(left, layout.photo, DOCX_PHOTO_BOX["sidebar"])
         lp = left.add_paragraph()
-        r = lp.add_run((data.get("name", "")).upper())
+        r = lp.add_run(layout.name)
         r.bold = True
         r.font.size = Pt(16)
-        if data.get("job_title"):
-            left.add_paragraph(data["job_title"]).alignment = WD_ALIGN_PARAGRAPH.LEFT
-        ph = left.add_paragraph("Contact Details")
-        ph.runs[0].bold = True
-        contact = []
-        for k in ["phone","email","location","linkedin","github","website"]:
-            v = data.get(k)
-            if v:
-                contact.append(v)
-        for ctext in contact:
+        if layout.job_title:
+            left.add_paragraph(layout.job_title).alignment = WD_ALIGN_PARAGRAPH.LEFT
+        _bold(left.add_paragraph("Contact Details"))
+        for ctext in layout.contacts:
             left.add_paragraph(ctext)
-        skills = data.get("skills", [])
+        lap("skills")
+        skills = layout.section("skills")
         if skills:
-            sh = left.add_paragraph("Core Skills")
-            sh.runs[0].bold = True
-            for s in skills:
+            _bold(left.add_paragraph("Core Skills"))
+            for s in skills.items:
                 left.add_paragraph(s, style="List Bullet")
-        languages = data.get("languages", [])
+        lap("languages")
+        languages = layout.section("languages")
         if languages:
-            lh = left.add_paragraph("Languages")
-            lh.runs[0].bold = True
-            left.add_paragraph(", ".join(languages))
-        rp = right.add_paragraph("Professional Profile")
-        rp.runs[0].bold = True
-        rp.runs[0].font.color.rgb = _rgb_from_hex(accent)
-        if data.get("summary"):
-            sp = right.add_paragraph(data["summary"]) 
-            sp.alignment = WD_ALIGN_PARAGRAPH.JUSTIFY
-        experiences = data.get("experiences", [])
-        if experiences:
-            eh = right.add_paragraph("Career Summary")
-            eh.runs[0].bold = True
-            eh.runs[0].font.color.rgb = _rgb_from_hex(accent)
-            for exp in experiences:
-                head = []
-                if exp.get("company"):
-                    head.append(exp["company"]) 
-                if exp.get("location"):
-                    head.append(exp["location"]) 
-                if exp.get("title"):
-                    head.append(exp["title"]) 
-                date = exp.get("dates") or ""
-                if date:
-                    right.add_paragraph(date)
-                if head:
-                    p = right.add_paragraph(" | ".join(head))
-                    p.runs[0].bold = True
-                for b in exp.get("bullets", []):
-                    right.add_paragraph(b, style="List Bullet")
-        education = data.get("education", [])
-        if education:
-            edh = right.add_paragraph("Education")
-            edh.runs[0].bold = True
-            edh.runs[0].font.color.rgb = _rgb_from_hex(accent)
-            for ed in education:
-                line = []
-                if ed.get("degree"):
-                    line.append(ed["degree"]) 
-                if ed.get("institution"):
-                    line.append(ed["institution"]) 
-                p = right.add_paragraph(" | ".join(line))
-                p.runs[0].bold = True
-                meta = []
-                if ed.get("location"):
-                    meta.append(ed["location"]) 
-                if ed.get("dates"):
-                    meta.append(ed["dates"]) 
-                if meta:
-                    right.add_paragraph(" | ".join(meta))
-        projects = data.get("projects", [])
-        if projects:
-            prh = right.add_paragraph("Projects")
-            prh.runs[0].bold = True
-            prh.runs[0].font.color.rgb = _rgb_from_hex(accent)
-            for pr in projects:
-                name = pr.get("name") or "Project"
-                rp = right.add_paragraph(name)
-                rp.runs[0].bold = True
-                if pr.get("tech"):
-                    right.add_paragraph(pr["tech"]) 
-                for b in pr.get("bullets", []):
-                    right.add_paragraph(b, style="List Bullet")
-                if pr.get("link"):
-                    right.add_paragraph(pr["link"]) 
-        certifications = data.get("certifications", [])
-        if certifications:
-            ch = right.add_paragraph("Certifications")
-            ch.runs[0].bold = True
-            ch.runs[0].font.color.rgb = _rgb_from_hex(accent)
-            for c in certifications:
-                right.add_paragraph(c)
-        extras = data.get("extras", [])
-        if extras:
-            xh = right.add_paragraph("Extras")
-            xh.runs[0].bold = True
-            xh.runs[0].font.color.rgb = _rgb_from_hex(accent)
-            for e in extras:
-                right.add_paragraph(e)
-        if data.get("references"):
-            rh = right.add_paragraph("References")
-            rh.runs[0].bold = True
-            rh.runs[0].font.color.rgb = _rgb_from_hex(accent)
-            rp = document.add_paragraph(data["references"]) 
-            rp.alignment = WD_ALIGN_PARAGRAPH.JUSTIFY
-    elif template == "band":
-        band = document.add_table(rows=1, cols=1)
-        band.autofit = True
-        cell = band.rows[0].cells[0]
-        tcPr = cell._tc.get_or_add_tcPr()
-        shd = OxmlElement('w:shd')
-        shd.set(qn('w:fill'), accent.replace('#',''))
-        tcPr.append(shd)
-        p = cell.add_paragraph()
-        r = p.add_run((data.get("name", "")).upper())
+            _bold(left.add_paragraph("Languages"))
+            left.add_paragraph(languages.text)
+        lap("summary")
+        summary = layout.section("summary")
+        if summary:
+            container.add_paragraph(summary.text).alignment = WD_ALIGN_PARAGRAPH.JUSTIFY
+    elif template_key == "band":
+        container = document
+        heading = _band_heading
+        cell = document.tables[0].rows[0].cells[0]
+        if layout.photo:
+            _docx_photo(cell, layout.photo, DOCX_PHOTO_BOX["band"], WD_ALIGN_PARAGRAPH.RIGHT)
+        r = cell.add_paragraph().add_run(layout.name)
         r.bold = True
         r.font.size = Pt(18)
         r.font.color.rgb = RGBColor(0xFF,0xFF,0xFF)
-        if data.get("job_title"):
-            pr = cell.add_paragraph()
-            rr = pr.add_run(data["job_title"]) 
+        if layout.job_title:
+            rr = cell.add_paragraph().add_run(layout.job_title)
             rr.font.color.rgb = RGBColor(0xFF,0xFF,0xFF)
-        contact = [v for k in ["phone","email","location","linkedin","github","website"] for v in ([data.get(k)] if data.get(k) else [])]
-        if contact:
-            pc = cell.add_paragraph(" | ".join(contact))
+        if layout.contacts:
+            pc = cell.add_paragraph(layout.contact_line)
             pc.runs[0].font.color.rgb = RGBColor(0xFF,0xFF,0xFF)
-        add_heading(document, "Professional Profile", accent)
-        if data.get("summary"):
-            pp = document.add_paragraph(data["summary"]) 
-            pp.alignment = WD_ALIGN_PARAGRAPH.JUSTIFY
-        experiences = data.get("experiences", [])
-        if experiences:
-            add_heading(document, "Work Experience", accent)
-            for exp in experiences:
-                head = " | ".join([x for x in [exp.get("title"), exp.get("company")] if x])
-                p = document.add_paragraph(head)
-                p.runs[0].bold = True
-                meta = " | ".join([x for x in [exp.get("location"), exp.get("dates")] if x])
-                if meta:
-                    document.add_paragraph(meta)
-                for b in exp.get("bullets", []):
-                    document.add_paragraph(b, style="List Bullet")
-        education = data.get("education", [])
-        if education:
-            add_heading(document, "Education", accent)
-            for ed in education:
-                head = " | ".join([x for x in [ed.get("degree"), ed.get("institution")] if x])
-                p = document.add_paragraph(head)
-                p.runs[0].bold = True
-                meta = " | ".join([x for x in [ed.get("location"), ed.get("dates")] if x])
-                if meta:
-                    document.add_paragraph(meta)
-        projects = data.get("projects", [])
-        if projects:
-            add_heading(document, "Projects", accent)
-            for pr in projects:
-                rp = document.add_paragraph(pr.get("name") or "Project")
-                rp.runs[0].bold = True
-                if pr.get("tech"):
-                    document.add_paragraph(pr["tech"]) 
-                for b in pr.get("bullets", []):
-                    document.add_paragraph(b, style="List Bullet")
-                if pr.get("link"):
-                    document.add_paragraph(pr["link"]) 
-        certifications = data.get("certifications", [])
-        if certifications:
-            add_heading(document, "Certifications", accent)
-            for c in certifications:
-                document.add_paragraph(c)
-        extras = data.get("extras", [])
-        if extras:
-            add_heading(document, "Extras", accent)
-            for e in extras:
-                document.add_paragraph(e)
-        languages = data.get("languages", [])
-        if languages:
-            add_heading(document, "Languages", accent)
-            document.add_paragraph(", ".join(languages))
-        if data.get("references"):
-            add_heading(document, "References", accent)
-            rp = document.add_paragraph(data["references"]) 
-            rp.alignment = WD_ALIGN_PARAGRAPH.JUSTIFY
+        lap("summary")
+        summary = layout.section("summary")
+        if summary:
+            container.add_paragraph(summary.text).alignment = WD_ALIGN_PARAGRAPH.JUSTIFY
     else:
-        add_heading(document, "Curriculum Vitae (CV)", accent)
-        namep = document.add_paragraph()
-        r = namep.add_run((data.get("name", "")).upper())
+        container = document
+        heading = _band_heading
+        if layout.photo:
+            _docx_photo(document, layout.photo, DOCX_PHOTO_BOX["minimal"], WD_ALIGN_PARAGRAPH.RIGHT)
+        r = document.add_paragraph().add_run(layout.name)
         r.bold = True
         r.font.size = Pt(18)
-        if data.get("job_title"):
-            document.add_paragraph(data["job_title"]) 
-        contacts = [data.get(k) for k in ["phone","email","location","linkedin","github","website"] if data.get(k)]
-        if contacts:
-            document.add_paragraph(" | ".join(contacts))
-        if data.get("summary"):
-            add_heading(document, "Summary", accent)
-            sp = document.add_paragraph(data["summary"]) 
-            sp.alignment = WD_ALIGN_PARAGRAPH.JUSTIFY
-        skills = data.get("skills", [])
-        if skills:
-            add_heading(document, "Skills", accent)
-            for s in skills:
-                document.add_paragraph(s, style="List Bullet")
-        experiences = data.get("experiences", [])
-        if experiences:
-            add_heading(document, "Work Experience", accent)
-            for exp in experiences:
-                head = " | ".join([x for x in [exp.get("title"), exp.get("company")] if x])
-                p = document.add_paragraph(head)
-                p.runs[0].bold = True
-                meta = " | ".join([x for x in [exp.get("location"), exp.get("dates")] if x])
-                if meta:
-                    document.add_paragraph(meta)
-                for b in exp.get("bullets", []):
-                    document.add_paragraph(b, style="List Bullet")
-        education = data.get("education", [])
-        if education:
-            add_heading(document, "Education", accent)
-            for ed in education:
-                head = " | ".join([x for x in [ed.get("degree"), ed.get("institution")] if x])
-                p = document.add_paragraph(head)
-                p.runs[0].bold = True
-                meta = " | ".join([x for x in [ed.get("location"), ed.get("dates")] if x])
-                if meta:
-                    document.add_paragraph(meta)
-        projects = data.get("projects", [])
-        if projects:
-            add_heading(document, "Projects", accent)
-            for pr in projects:
-                rp = document.add_paragraph(pr.get("name") or "Project")
-                rp.runs[0].bold = True
-                if pr.get("tech"):
-                    document.add_paragraph(pr["tech"]) 
-                for b in pr.get("bullets", []):
-                    document.add_paragraph(b, style="List Bullet")
-                if pr.get("link"):
-                    document.add_paragraph(pr["link"]) 
-        certifications = data.get("certifications", [])
-        if certifications:
-            add_heading(document, "Certifications", accent)
-            for c in certifications:
-                document.add_paragraph(c)
-        extras = data.get("extras", [])
-        if extras:
-            add_heading(document, "Extras", accent)
-            for e in extras:
-                document.add_paragraph(e)
-        languages = data.get("languages", [])
-        if languages:
-            add_heading(document, "Languages", accent)
-            document.add_paragraph(", ".join(languages))
-        if data.get("references"):
-            add_heading(document, "References", accent)
-            rp = document.add_paragraph(data["references"]) 
-            rp.alignment = WD_ALIGN_PARAGRAPH.JUSTIFY
-    document.save(output_path)
-
-def build_pdf(data, output_path, template="sidebar", accent="#b87333"):
-    c = canvas.Canvas(output_path, pagesize=LETTER)
+        if layout.job_title:
+            document.add_paragraph(layout.job_title)
+        if layout.contacts:
+            document.add_paragraph(layout.contact_line)
+    for key, title in DOCX_SECTIONS[template_key]:
+        lap(key)
+        section = layout.section(key)
+        if section and incremental:
+            _docx_section_cached(document, container, section, title, heading, accent, sidebar, template_key)
+        elif section:
+            _docx_section(document, container, section, title, heading, accent, sidebar)
+    lap.stop()
+    with timer("cv_stage_seconds", stage="serialize", template=template, format="docx"):
+        if (optimize or OPTIMIZE) == "size":
+            buf = io.BytesIO()
+            document.save(buf)
+            _write(output, repack_docx(buf.getvalue()))
+        else:
+            document.save(output)
+
+
+def _write(output, data):
+    if isinstance(output, str):
+        with open(output, "wb") as f:
+            f.write(data)
+    else:
+        output.write(data)
+
+PDF_MARGIN = 0.7*inch
+PDF_SIDEBAR_W = 2.1*inch
+_BLACK = HexColor('#000000')
+_WHITE = HexColor('#ffffff')
+
+
+class _PdfStyles:
+    # ParagraphStyles, colours and fonts for one template/accent/font family, shared by every request
+    def __init__(self, template, accent, family=HELVETICA):
+        self.template = template
+        self.accent = HexColor(accent)
+        self.regular = family.regular
+        self.bold = family.bold
+        self.sidebar_w = PDF_SIDEBAR_W if template == 'sidebar' else 0
+        self._styles = {}
+
+    def paragraph(self, font, size, color, leading, justify):
+        key = ('p', font, size, color, leading, justify)
+        style = self._styles.get(key)
+        if style is None:
+            style = self._styles.setdefault(key, ParagraphStyle(
+                name='Custom',
+                fontName=font,
+                fontSize=size,
+                textColor=color,
+                leading=leading,
+                alignment=TA_JUSTIFY if justify else TA_LEFT,
+            ))
+        return style
+
+    def bullet(self, color, bullet_gap):
+        key = ('b', color, bullet_gap)
+        style = self._styles.get(key)
+        if style is None:
+            style = self._styles.setdefault(key, ParagraphStyle(
+                name='Bullet',
+                fontName=self.regular,
+                fontSize=11,
+                leading=14,
+                leftIndent=bullet_gap,
+                bulletIndent=0,
+                textColor=color
+            ))
+        return style
+
+
+@lru_cache(maxsize=64)
+def _pdf_styles(template, accent, family=HELVETICA):
+    return _PdfStyles(template, accent, family)
+
+
+# section key -> heading per template, in drawing order
+PDF_SECTIONS = {
+    "sidebar": [
+        ("summary", "Professional Profile"),
+        ("experiences", "Career Summary"),
+        ("education", "Education"),
+        ("projects", "Projects"),
+        ("certifications", "Certifications"),
+        ("extras", "Extras"),
+        ("languages", "Languages"),
+        ("references", "References"),
+    ],
+    "band": [
+        ("summary", "Professional Profile"),
+        ("experiences", "Work Experience"),
+        ("education", "Education"),
+        ("projects", "Projects"),
+        ("certifications", "Certifications"),
+        ("extras", "Extras"),
+        ("languages", "Languages"),
+        ("references", "References"),
+    ],
+}
+PDF_SECTIONS["minimal"] = [("summary", "Summary"), ("skills", "Skills")] + PDF_SECTIONS["band"][1:]
+
+# extra space after each entry and section
+PDF_ENTRY_GAP = {"sidebar": 6, "band": 6, "minimal": 0}
+# the square a photo is fitted into; the sidebar's is its column width
+PDF_PHOTO_BOX = {"sidebar": PHOTO_INCHES*inch, "band": 1.0*inch, "minimal": 1.0*inch}
+
+
+class _PageLimit(Exception):
+    pass
+
+
+class _PdfOps(list):
+    # a run of wrapped paragraphs as (paragraph, height, space after, keep with next);
+    # (None, 0, n, keep) only moves the cursor. The heights are measured here, once, and
+    # pagination happens when the ops are placed (see _paginate).
+    def __init__(self, styles, width, page_h):
+        super().__init__()
+        self.styles = styles
+        self.width = width
+        self.page_h = page_h
+
+    def para(self, text, font=None, size=11, justify=False, keep=False):
+        style = self.styles.paragraph(font or self.styles.regular, size, _BLACK, 14, justify)
+        p = Paragraph(text.replace('\n', '<br/>'), style)
+        self.append((p, p.wrap(self.width, self.page_h)[1], 4, keep))
+
+    def bullet(self, text, keep=False):
+        p = Paragraph(text, self.styles.bullet(_BLACK, 12), bulletText='•')
+        self.append((p, p.wrap(self.width, self.page_h)[1], 2, keep))
+
+    def space(self, n, keep=False):
+        self.append((None, 0, n, keep))
+
+    def bullets(self, texts):
+        # an entry's last bullet isn't left alone at the top of a page: the one before goes with it
+        for i, text in enumerate(texts):
+            self.bullet(text, keep=len(texts) > 2 and i == len(texts) - 2)
+
+
+# False lays pages out greedily, breaking wherever the next paragraph doesn't fit
+PDF_KEEP_WITH_NEXT = True
+
+
+def _fits(run, y, bottom):
+    for p, p_h, advance, _ in run:
+        if p is not None:
+            if y - p_h < bottom:
+                return False
+            y -= p_h
+        y -= advance
+    return True
+
+
+def _place_run(run, y_ref, top, bottom):
+    # a run that doesn't fit below the cursor but does on a fresh page starts one
+    move = len(run) > 1 and y_ref[0] < top and not _fits(run, y_ref[0], bottom) and _fits(run, top, bottom)
+    for p, p_h, advance, _ in run:
+        if p is None:
+            y_ref[0] -= advance
+            continue
+        new_page = move or y_ref[0] - p_h < bottom
+        if new_page:
+            y_ref[0] = top
+            move = False
+        yield p, y_ref[0] - p_h, new_page
+        y_ref[0] -= p_h + advance
+
+
+def _paginate(ops, y_ref, top, bottom, keep=True):
+    """(paragraph, y to draw it at, whether a new page starts first) for measured ops.
+
+    Ops joined by keep-with-next are held until their run is complete and
+    then placed together: if the run doesn't fit below the cursor but does
+    on a fresh page, the page breaks before it, so a title or an entry's
+    header never ends a page. A run taller than a page breaks wherever it
+    has to. Only the run is held, so ops may come from a generator. y_ref is
+    the column's cursor, moved as in draw_pdf.
+    """
+    run = []
+    for op in ops:
+        run.append(op)
+        if not (keep and op[3]):
+            yield from _place_run(run, y_ref, top, bottom)
+            run = []
+    yield from _place_run(run, y_ref, top, bottom)
+
+
+def _pdf_entry_ops(styles, key, entry, width, gap, template_key, page_h):
+    ops = _PdfOps(styles, width, page_h)
+    # an entry's header lines are kept with what follows them, so none ends a page
+    if key == "experiences":
+        if template_key == 'sidebar':
+            if entry.dates:
+                ops.para(entry.dates, keep=True)
+            if entry.alt_head:
+                ops.para(entry.alt_head, styles.bold, 11, keep=True)
+        else:
+            if entry.head:
+                ops.para(entry.head, styles.bold, 11, keep=True)
+            if entry.meta:
+                ops.para(entry.meta, keep=True)
+        ops.bullets(entry.bullets)
+    elif key == "education":
+        if entry.head:
+            ops.para(entry.head, styles.bold, 11, keep=True)
+        if entry.meta:
+            ops.para(entry.meta)
+    elif key == "projects":
+        ops.para(entry.head, styles.bold, 11, keep=True)
+        if entry.tech:
+            ops.para(entry.tech, keep=True)
+        ops.bullets(entry.bullets)
+        if entry.link:
+            ops.para(entry.link)
+    # the last op doesn't hold on to the next entry
+    if ops and ops[-1][3]:
+        ops[-1] = ops[-1][:3] + (False,)
+    ops.space(gap)
+    return tuple(ops)
+
+
+def _pdf_section_parts(styles, section, title, width, gap, template_key, page_h, entry_ops=_pdf_entry_ops):
+    # yields the section's ops in pieces (title, then each entry or item) so a caller
+    # placing them straight away only holds one piece of wrapped text at a time
+    key = section.key
+    ops = _PdfOps(styles, width, page_h)
+    # the title stays with the section's first paragraph
+    ops.para(title.upper(), styles.bold, 12, keep=True)
+    ops.space(4, keep=True)
+    if section.entries:
+        yield tuple(ops)
+        for entry in section.entries:
+            yield entry_ops(styles, key, entry, width, gap, template_key, page_h)
+        return
+    if key in ("summary", "references"):
+        ops.para(section.text, justify=True)
+    elif key == "skills":
+        yield tuple(ops)
+        for s in section.items:
+            ops = _PdfOps(styles, width, page_h)
+            ops.bullet(s)
+            yield tuple(ops)
+        ops = _PdfOps(styles, width, page_h)
+    elif key == "languages":
+        ops.para(section.text)
+    else:
+        yield tuple(ops)
+        for item in section.items:
+            ops = _PdfOps(styles, width, page_h)
+            ops.para(item)
+            yield tuple(ops)
+        ops = _PdfOps(styles, width, page_h)
+    ops.space(gap)
+    yield tuple(ops)
+
+
+def _pdf_section_ops(*args):
+    return tuple(op for part in _pdf_section_parts(*args) for op in part)
+
+
+def _cached_ops(key, build, *args):
+    ops = fragment_cache.get(key)
+    if ops is None:
+        ops = build(*args)
+        fragment_cache.put(key, ops)
+    return ops
+
+
+def _paragraph_fonts(p):
+    bl = p.blPara
+    fonts = {p.style.fontName}
+    if bl.kind == 0:
+        fonts.add(bl.fontName)
+    else:
+        fonts.update(f.fontName for line in bl.lines for f in line.words if hasattr(f, 'fontName'))
+    if p.bulletText:
+        fonts.add(p.style.bulletFontName)
+    return fonts
+
+
+@lru_cache(maxsize=32)
+def _pdf_image(data, mimetype):
+    # (width, height, colour space, filter, stream, alpha stream) for a prepared photo. A JPEG
+    # goes in as it is; a PNG is decoded here once rather than by drawImage() on every render.
+    if mimetype == 'image/jpeg':
+        width, height, components = pdfutils.readJPEGInfo(io.BytesIO(data))[:3]
+        space = {1: 'DeviceGray', 3: 'DeviceRGB'}.get(components, 'DeviceCMYK')
+        return width, height, space, 'DCTDecode', data, None
+    from PIL import Image
+    im = Image.open(io.BytesIO(data))
+    alpha = zlib.compress(im.getchannel('A').tobytes()) if 'A' in im.getbands() else None
+    return im.width, im.height, 'DeviceRGB', 'FlateDecode', zlib.compress(im.convert('RGB').tobytes()), alpha
+
+
+def _image_xobject(name, width, height, space, filter, stream):
+    img = pdfdoc.PDFImageXObject(name)
+    img.width, img.height, img.bitsPerComponent, img.colorSpace = width, height, 8, space
+    img._filters = (filter,)
+    img.streamContent = stream
+    return img
+
+
+def _draw_photo(c, photo, x, y, w, h):
+    # what c.drawImage() does, with the XObject built from _pdf_image()
+    name = 'photo' + photo.id[:16]
+    doc = c._doc
+    reg_name = doc.getXObjectName(name)
+    if reg_name not in doc.idToObject:
+        width, height, space, filter, stream, alpha = _pdf_image(photo.data, photo.mimetype)
+        img = _image_xobject(name, width, height, space, filter, stream)
+        if alpha:
+            mask = _image_xobject(name + 'a', width, height, 'DeviceGray', 'FlateDecode', alpha)
+            img.smask = doc.Reference(mask, doc.getXObjectName(mask.name))
+        c._setXObjects(img)
+        doc.Reference(img, reg_name)
+        doc.addForm(name, img)
+    c._currentPageHasImages = 1
+    c.saveState()
+    c.translate(x, y)
+    c.scale(w, h)
+    c._code.append(f'/{reg_name} Do')
+    c.restoreState()
+    c._formsinuse.append(name)
+
+
+def _draw_paragraph(c, p, x, y):
+    # Same as p.drawOn(c, x, y). A paragraph's operators don't depend on where it sits, so
+    # they are recorded on its first draw and replayed when a cached fragment is placed
+    # again, as long as the canvas maps its fonts to the same resource names.
+    recorded = p.__dict__.get('_pdf_ops')
+    c.saveState()
+    c.translate(x, y)
+    if recorded is not None and all(c._doc.getInternalFontName(f) == name for f, name in recorded[0]):
+        c._code.extend(recorded[1])
+    else:
+        start = len(c._code)
+        # _drawOn() sets p.canv while drawing, so go through a shallow copy
+        copy.copy(p)._drawOn(c)
+        # markup other than line breaks may add links or images outside the content stream,
+        # and text in an embedded TrueType font is encoded for this document's glyph subsets
+        if '<' not in p.text.replace('<br/>', ''):
+            fonts = _paragraph_fonts(p)
+            if not any(pdfmetrics.getFont(f)._dynamicFont for f in fonts):
+                p._pdf_ops = (tuple((f, c._doc.getInternalFontName(f)) for f in fonts), tuple(c._code[start:]))
+    c.restoreState()
+
+
+# CVs with more paragraphs than this (roughly eight pages) are written page by page
+PDF_STREAMING_BLOCKS = 300
+
+def _pdf_blocks(layout):
+    n = 0
+    for section in layout.sections.values():
+        n += 1 + len(section.items) + sum(2 + len(e.bullets) for e in section.entries)
+    return n
+
+def build_pdf(data, output, template="sidebar", accent="#b87333", incremental=True, streaming=None, fonts="auto",
+              optimize=None):
+    # output may be a filesystem path or any writable binary stream (e.g. BytesIO)
+    # data may be the raw CV dict or a Layout from build_layout()
+    # incremental=False wraps every section again instead of reusing cached fragments
+    # streaming=True writes each page to output as soon as it is finished and bypasses the
+    # fragment cache, so memory stays flat however long the CV is; None decides by length
+    # fonts picks Helvetica or an embedded TrueType family (see draw_pdf)
+    # optimize="size" writes a smaller file (see utils.optimize); None means CV_OPTIMIZE
+    layout = build_layout(data)
+    if streaming is None:
+        streaming = _pdf_blocks(layout) > PDF_STREAMING_BLOCKS
+    if streaming:
+        c = StreamingCanvas(output, pagesize=LETTER)
+        incremental = False
+    else:
+        c = canvas.Canvas(output, pagesize=LETTER)
+    if (optimize or OPTIMIZE) == "size":
+        compact_pdf(c)
+    draw_pdf(c, layout, template, accent, incremental=incremental, fonts=fonts)
+    with timer("cv_stage_seconds", stage="serialize", template=template, format="pdf"):
+        c.save()
+
+
+def draw_pdf(c, data, template="sidebar", accent="#b87333", max_pages=None, incremental=True, fonts="auto"):
+    """Lay the CV out onto c and finish its last page; the caller saves it.
+
+    c is a ReportLab canvas or anything with the same drawing methods (see
+    utils.preview). Layout stops after max_pages pages when given. With
+    incremental, sections already wrapped for the same content are reused
+    from fragment_cache and only paginated again. fonts is "auto" (Helvetica
+    unless the text needs more than it covers), "helvetica" or "unicode";
+    see utils.fonts.
+    """
+    lap = Lap("cv_section_seconds", template=template, format="pdf")
+    lap("header")
+    layout = build_layout(data)
+    if template not in ("sidebar", "band"):
+        template_key = "minimal"
+    else:
+        template_key = template
     page_w, page_h = LETTER
-    margin = 0.7*inch
-
-    def wrap_draw(x, y_ref, text, font='Helvetica', size=11, color=HexColor('#000000'), width=page_w-2*margin, gap=14, justify=False):
-        style = ParagraphStyle(
-            name='Custom',
-            fontName=font,
-            fontSize=size,
-            textColor=color,
-            leading=gap,
-            alignment=TA_JUSTIFY if justify else TA_LEFT,
-        )
+    margin = PDF_MARGIN
+    styles = _pdf_styles(template_key, accent, pdf_family(layout, fonts))
+    regular, bold = styles.regular, styles.bold
+    page = [1]
+    # canvases that aren't PDF (previews) place wrapped paragraphs themselves
+    draw_paragraph = getattr(c, 'draw_paragraph', None) or (lambda p, x, y: _draw_paragraph(c, p, x, y))
+    place_photo = getattr(c, 'draw_photo', None) or (lambda photo, x, y, w, h: _draw_photo(c, photo, x, y, w, h))
+    photo_box = PDF_PHOTO_BOX[template_key] if layout.photo else 0
+
+    def draw_photo(x, top):
+        # the photo fitted into photo_box, hanging from top with its right edge at x + photo_box
+        # when it's narrower; returns its height
+        w, h = layout.photo.fit(photo_box, photo_box)
+        place_photo(layout.photo, x + photo_box - w if template_key != 'sidebar' else x, top - h, w, h)
+        return h
+
+    def footer():
+        c.setFillColor(_BLACK)
+        c.setFont(regular, 9)
+        c.drawString(page_w/2 - 14, margin/2, f'Page {page[0]}')
+
+    def new_page():
+        footer()
+        if max_pages and page[0] >= max_pages:
+            raise _PageLimit()
+        c.showPage()
+        page[0] += 1
+        if styles.sidebar_w:
+            c.setFillColor(styles.accent)
+            c.rect(0, 0, styles.sidebar_w, page_h, stroke=0, fill=1)
+        c.setFillColor(_BLACK)
+        return page_h - margin
+
+    # y_ref is a one-item list holding the column's cursor; it is moved past what was drawn.
+    # With can_break=False (the sidebar column) text that doesn't fit is dropped instead.
+    def wrap_draw(x, y_ref, text, font=None, size=11, color=_BLACK, width=page_w-2*margin, gap=14, justify=False, can_break=True):
+        style = styles.paragraph(font or regular, size, color, gap, justify)
         p = Paragraph(text.replace('\n', '<br/>'), style)
         p_w, p_h = p.wrap(width, page_h)
         if y_ref[0] - p_h < margin:
-            c.showPage()
-            if template == 'sidebar':
-                sidebar_w = 2.1*inch
-                c.setFillColor(HexColor(accent))
-                c.rect(0, 0, sidebar_w, page_h, stroke=0, fill=1)
-            y_ref[0] = page_h - margin
-            c.setFillColor(HexColor('#000000'))
-        p.drawOn(c, x, y_ref[0] - p_h)
+            if not can_break:
+                return
+            y_ref[0] = new_page()
+        draw_paragraph(p, x, y_ref[0] - p_h)
         y_ref[0] -= (p_h + 4)
 
-    def draw_bullet_paragraph(x, y_ref, text, width, color=HexColor('#000000'), bullet_char='•', bullet_gap=12):
-        style = ParagraphStyle(
-            name='Bullet',
-            fontName='Helvetica',
-            fontSize=11,
-            leading=14,
-            leftIndent=bullet_gap,
-            bulletIndent=0,
-            textColor=color
-        )
-        p = Paragraph(text, style, bulletText=bullet_char)
+    def draw_bullet_paragraph(x, y_ref, text, width, color=_BLACK, bullet_char='•', bullet_gap=12, can_break=True):
+        p = Paragraph(text, styles.bullet(color, bullet_gap), bulletText=bullet_char)
         p_w, p_h = p.wrap(width, page_h)
         if y_ref[0] - p_h < margin:
-            c.showPage()
-            if template == 'sidebar':
-                sidebar_w = 2.1*inch
-                c.setFillColor(HexColor(accent))
-                c.rect(0, 0, sidebar_w, page_h, stroke=0, fill=1)
-            y_ref[0] = page_h - margin
-            c.setFillColor(HexColor('#000000'))
-        p.drawOn(c, x, y_ref[0] - p_h)
+            if not can_break:
+                return
+            y_ref[0] = new_page()
+        draw_paragraph(p, x, y_ref[0] - p_h)
         y_ref[0] -= (p_h + 2)
 
-    if template == 'sidebar':
-        sidebar_w = 2.1*inch
-        right_x = sidebar_w + margin
-        right_w = page_w - right_x - margin
-        c.setFillColor(HexColor(accent))
+    def place(ops, x, y_ref):
+        # lays out measured section ops, starting new pages where _paginate breaks them
+        for p, y, break_before in _paginate(ops, y_ref, page_h - margin, margin, PDF_KEEP_WITH_NEXT):
+            if break_before:
+                new_page()
+            draw_paragraph(p, x, y)
+
+    def draw_section(x, y_ref, width, section, title, gap):
+        if not incremental:
+            parts = _pdf_section_parts(styles, section, title, width, gap, template_key, page_h)
+            place((op for part in parts for op in part), x, y_ref)
+            return
+
+        # wrapping doesn't depend on the accent, so fragments are shared between accents
+        def entry_ops(styles, key, entry, *rest):
+            return _cached_ops(("pdf", regular, key, entry) + rest, _pdf_entry_ops, styles, key, entry, *rest)
+
+        ops = _cached_ops(("pdf", template_key, regular, width, gap, title, section),
+                          _pdf_section_ops, styles, section, title, width, gap, template_key, page_h, entry_ops)
+        place(ops, x, y_ref)
+
+    if template_key == 'sidebar':
+        sidebar_w = styles.sidebar_w
+        x = sidebar_w + margin
+        width = page_w - x - margin
+        lx = margin*0.6
+        left_w = sidebar_w - margin
+        c.setFillColor(styles.accent)
         c.rect(0, 0, sidebar_w, page_h, stroke=0, fill=1)
-        c.setFillColor(HexColor('#000000'))
-        ly = page_h - margin
-        ry = page_h - margin
-        def section_right(title):
-            nonlocal ry
-            wrap_draw(right_x, [ry], title.upper(), 'Helvetica-Bold', 12, width=right_w)
-            ry -= 4
-        c.setFillColor(HexColor('#ffffff'))
-        c.setFont('Helvetica-Bold', 16)
-        c.drawString(margin*0.6, ly, (data.get('name','')).upper())
-        ly -= 18
-        c.setFont('Helvetica', 12)
-        if data.get('job_title'):
-            c.drawString(margin*0.6, ly, data['job_title'])
-            ly -= 16
-        c.setFont('Helvetica-Bold', 12)
-        c.drawString(margin*0.6, ly, 'Contact Details')
-        ly -= 14
-        c.setFont('Helvetica', 11)
-        for k in ['phone','email','location','linkedin','github','website']:
-            v = data.get(k)
-            if v:
-                wrap_draw(margin*0.6, [ly], v, 'Helvetica', 11, HexColor('#ffffff'), width=sidebar_w - margin)
-                ly -= 2
-        skills = data.get('skills', [])
-        if skills:
-            ly -= 6
-            c.setFont('Helvetica-Bold', 12)
-            c.drawString(margin*0.6, ly, 'Core Skills')
-            ly -= 14
-            for s in skills:
-                draw_bullet_paragraph(margin*0.6, [ly], s, width=sidebar_w - margin - 12, color=HexColor('#ffffff'))
-                ly -= 2
-        languages = data.get('languages', [])
-        if languages:
-            ly -= 6
-            c.setFont('Helvetica-Bold', 12)
-            c.drawString(margin*0.6, ly, 'Languages')
-            ly -= 14
-            wrap_draw(margin*0.6, [ly], ', '.join(languages), 'Helvetica', 11, HexColor('#ffffff'), width=sidebar_w - margin)
-        c.setFillColor(HexColor('#000000'))
-        wrap_draw(right_x, [ry], 'Curriculum Vitae (CV)', 'Helvetica-Bold', 14, width=right_w)
-        ry -= 8
-        wrap_draw(right_x, [ry], (data.get('name','')).upper(), 'Helvetica-Bold', 16, width=right_w)
-        ry -= 10
-        if data.get('job_title'):
-            wrap_draw(right_x, [ry], data['job_title'], 'Helvetica', 12, width=right_w)
-            ry -= 6
-        contacts = [data.get(k) for k in ['phone','email','location','linkedin','github','website'] if data.get(k)]
-        if contacts:
-            wrap_draw(right_x, [ry], ' | '.join(contacts), 'Helvetica', 11, width=right_w)
-            ry -= 4
-        if data.get('summary'):
-            section_right('Professional Profile')
-            wrap_draw(right_x, [ry], data['summary'], 'Helvetica', 11, width=right_w, justify=True)
-            ry -= 6
-        experiences = data.get('experiences', [])
-        if experiences:
-            section_right('Career Summary')
-            for exp in experiences:
-                head = ' | '.join([x for x in [exp.get('company'), exp.get('location'), exp.get('title')] if x])
-                date = exp.get('dates') or ''
-                if date:
-                    wrap_draw(right_x, [ry], date, 'Helvetica', 11, width=right_w)
-                if head:
-                    wrap_draw(right_x, [ry], head, 'Helvetica-Bold', 11, width=right_w)
-                for b in exp.get('bullets', []):
-                    draw_bullet_paragraph(right_x, [ry], b, width=right_w)
-                ry -= 6
-        education = data.get('education', [])
-        if education:
-            section_right('Education')
-            for ed in education:
-                head = ' | '.join([x for x in [ed.get('degree'), ed.get('institution')] if x])
-                meta = ' | '.join([x for x in [ed.get('location'), ed.get('dates')] if x])
-                if head:
-                    wrap_draw(right_x, [ry], head, 'Helvetica-Bold', 11, width=right_w)
-                if meta:
-                    wrap_draw(right_x, [ry], meta, 'Helvetica', 11, width=right_w)
-                ry -= 6
-        projects = data.get('projects', [])
-        if projects:
-            section_right('Projects')
-            for pr in projects:
-                wrap_draw(right_x, [ry], pr.get('name') or 'Project', 'Helvetica-Bold', 11, width=right_w)
-                if pr.get('tech'):
-                    wrap_draw(right_x, [ry], pr['tech'], 'Helvetica', 11, width=right_w)
-                for b in pr.get('bullets', []):
-                    draw_bullet_paragraph(right_x, [ry], b, width=right_w)
-                if pr.get('link'):
-                    wrap_draw(right_x, [ry], pr['link'], 'Helvetica', 11, width=right_w)
-                ry -= 6
-        certifications = data.get('certifications', [])
-        if certifications:
-            section_right('Certifications')
-            for ctext in certifications:
-                wrap_draw(right_x, [ry], ctext, 'Helvetica', 11, width=right_w)
-            ry -= 6
-        extras = data.get('extras', [])
-        if extras:
-            section_right('Extras')
-            for e in extras:
-                wrap_draw(right_x, [ry], e, 'Helvetica', 11, width=right_w)
-            ry -= 6
-        languages = data.get('languages', [])
-        if languages:
-            section_right('Languages')
-            wrap_draw(right_x, [ry], ', '.join(languages), 'Helvetica', 11, width=right_w)
-            ry -= 6
-        if data.get('references'):
-            section_right('References')
-            wrap_draw(right_x, [ry], data['references'], 'Helvetica', 11, width=right_w, justify=True)
-    elif template == 'band':
-        band_h = 0.9*inch
-        c.setFillColor(HexColor(accent))
+        ly = [page_h - margin]
+        y = [page_h - margin]
+        if photo_box:
+            ly[0] -= draw_photo(lx, ly[0] + 12) + 8
+        c.setFillColor(_WHITE)
+        c.setFont(bold, 16)
+        c.drawString(lx, ly[0], layout.name)
+        ly[0] -= 18
+        c.setFont(regular, 12)
+        if layout.job_title:
+            c.drawString(lx, ly[0], layout.job_title)
+            ly[0] -= 16
+        c.setFont(bold, 12)
+        c.drawString(lx, ly[0], 'Contact Details')
+        ly[0] -= 14
+        for v in layout.contacts:
+            wrap_draw(lx, ly, v, regular, 11, _WHITE, width=left_w, can_break=False)
+            ly[0] -= 2
+        lap('skills')
+        skills = layout.section('skills')
+        if skills and ly[0] - 20 > margin:
+            ly[0] -= 6
+            c.setFont(bold, 12)
+            c.drawString(lx, ly[0], 'Core Skills')
+            ly[0] -= 14
+            for s in skills.items:
+                draw_bullet_paragraph(lx, ly, s, width=left_w - 12, color=_WHITE, can_break=False)
+                ly[0] -= 2
+        lap('languages')
+        languages = layout.section('languages')
+        if languages and ly[0] - 20 > margin:
+            ly[0] -= 6
+            c.setFont(bold, 12)
+            c.drawString(lx, ly[0], 'Languages')
+            ly[0] -= 14
+            wrap_draw(lx, ly, languages.text, regular, 11, _WHITE, width=left_w, can_break=False)
+        c.setFillColor(_BLACK)
+        lap('header')
+        wrap_draw(x, y, 'Curriculum Vitae (CV)', bold, 14, width=width)
+        y[0] -= 8
+        wrap_draw(x, y, layout.name, bold, 16, width=width)
+        y[0] -= 10
+        if layout.job_title:
+            wrap_draw(x, y, layout.job_title, regular, 12, width=width)
+            y[0] -= 6
+        if layout.contacts:
+            wrap_draw(x, y, layout.contact_line, regular, 11, width=width)
+            y[0] -= 4
+    elif template_key == 'band':
+        x = margin
+        width = page_w - 2*margin
+        top = page_h - 0.45*inch
+        # grow the band so the (possibly wrapped) contact line stays on the accent colour
+        # the photo sits at the band's right end, beside the text
+        text_w = width - photo_box - 12 if photo_box else width
+        contacts_h = 0
+        if layout.contacts:
+            contacts_h = Paragraph(layout.contact_line, styles.paragraph(regular, 10, _WHITE, 14, False)).wrap(text_w, page_h)[1]
+        band_h = max(0.9*inch, 0.45*inch + 38 + contacts_h + 8, photo_box + 0.3*inch)
+        c.setFillColor(styles.accent)
         c.rect(0, page_h - band_h, page_w, band_h, stroke=0, fill=1)
-        y = page_h - margin
-        c.setFillColor(HexColor('#ffffff'))
-        c.setFont('Helvetica-Bold', 18)
-        c.drawString(margin, y-4, (data.get('name','')).upper())
-        c.setFont('Helvetica', 12)
-        if data.get('job_title'):
-            c.drawString(margin, y-22, data['job_title'])
-        contacts = [data.get(k) for k in ['phone','email','location','linkedin','github','website'] if data.get(k)]
-        if contacts:
-            c.setFont('Helvetica', 10)
-            wrap_draw(margin, [y-38], ' | '.join(contacts), 'Helvetica', 10, HexColor('#ffffff'), width=page_w-2*margin)
-        c.setFillColor(HexColor('#000000'))
-        y = page_h - band_h - margin
-        def section(title):
-            nonlocal y
-            wrap_draw(margin, [y], title.upper(), 'Helvetica-Bold', 12)
-            y -= 4
-        if data.get('summary'):
-            section('Professional Profile')
-            wrap_draw(margin, [y], data['summary'], 'Helvetica', 11, justify=True)
-            y -= 6
-        exps = data.get('experiences', [])
-        if exps:
-            section('Work Experience')
-            for exp in exps:
-                head = ' | '.join([x for x in [exp.get('title'), exp.get('company')] if x])
-                wrap_draw(margin, [y], head, 'Helvetica-Bold', 11)
-                meta = ' | '.join([x for x in [exp.get('location'), exp.get('dates')] if x])
-                if meta:
-                    wrap_draw(margin, [y], meta, 'Helvetica', 11)
-                for b in exp.get('bullets', []):
-                    draw_bullet_paragraph(margin, [y], b, width=page_w-2*margin)
-                y -= 6
-        edu = data.get('education', [])
-        if edu:
-            section('Education')
-            for ed in edu:
-                head = ' | '.join([x for x in [ed.get('degree'), ed.get('institution')] if x])
-                wrap_draw(margin, [y], head, 'Helvetica-Bold', 11)
-                meta = ' | '.join([x for x in [ed.get('location'), ed.get('dates')] if x])
-                if meta:
-                    wrap_draw(margin, [y], meta, 'Helvetica', 11)
-                y -= 6
-        prj = data.get('projects', [])
-        if prj:
-            section('Projects')
-            for pr in prj:
-                wrap_draw(margin, [y], pr.get('name') or 'Project', 'Helvetica-Bold', 11)
-                if pr.get('tech'):
-                    wrap_draw(margin, [y], pr['tech'], 'Helvetica', 11)
-                for b in pr.get('bullets', []):
-                    draw_bullet_paragraph(margin, [y], b, width=page_w-2*margin)
-                if pr.get('link'):
-                    wrap_draw(margin, [y], pr['link'], 'Helvetica', 11)
-                y -= 6
-        certs = data.get('certifications', [])
-        if certs:
-            section('Certifications')
-            for ctext in certs:
-                wrap_draw(margin, [y], ctext, 'Helvetica', 11)
-            y -= 6
-        extras = data.get('extras', [])
-        if extras:
-            section('Extras')
-            for e in extras:
-                wrap_draw(margin, [y], e, 'Helvetica', 11)
-            y -= 6
-        languages = data.get('languages', [])
-        if languages:
-            section('Languages')
-            wrap_draw(margin, [y], ', '.join(languages), 'Helvetica', 11)
-            y -= 6
-        if data.get('references'):
-            section('References')
-            wrap_draw(margin, [y], data['references'], 'Helvetica', 11, justify=True)
+        if photo_box:
+            draw_photo(page_w - margin - photo_box, page_h - (band_h - photo_box) / 2)
+        c.setFillColor(_WHITE)
+        c.setFont(bold, 18)
+        c.drawString(margin, top-4, layout.name)
+        c.setFont(regular, 12)
+        if layout.job_title:
+            c.drawString(margin, top-22, layout.job_title)
+        if layout.contacts:
+            wrap_draw(margin, [top-38], layout.contact_line, regular, 10, _WHITE, width=text_w)
+        c.setFillColor(_BLACK)
+        y = [page_h - band_h - 0.4*inch]
     else:
-        y = page_h - margin
-        def section(title):
-            nonlocal y
-            wrap_draw(margin, [y], title.upper(), 'Helvetica-Bold', 12)
-            y -= 4
-        wrap_draw(margin, [y], 'Curriculum Vitae (CV)', 'Helvetica-Bold', 14)
-        wrap_draw(margin, [y], (data.get('name','')).upper(), 'Helvetica-Bold', 16)
-        if data.get('job_title'):
-            wrap_draw(margin, [y], data['job_title'], 'Helvetica', 12)
-        contacts = [data.get(k) for k in ['phone','email','location','linkedin','github','website'] if data.get(k)]
-        if contacts:
-            wrap_draw(margin, [y], ' | '.join(contacts), 'Helvetica', 11)
-        if data.get('summary'):
-            section('Summary')
-            wrap_draw(margin, [y], data['summary'], 'Helvetica', 11, justify=True)
-        skills = data.get('skills', [])
-        if skills:
-            section('Skills')
-            for s in skills:
-                draw_bullet_paragraph(margin, [y], s, width=page_w-2*margin)
-        exps = data.get('experiences', [])
-        if exps:
-            section('Work Experience')
-            for exp in exps:
-                head = ' | '.join([x for x in [exp.get('title'), exp.get('company')] if x])
-                wrap_draw(margin, [y], head, 'Helvetica-Bold', 11)
-                meta = ' | '.join([x for x in [exp.get('location'), exp.get('dates')] if x])
-                if meta:
-                    wrap_draw(margin, [y], meta, 'Helvetica', 11)
-                for b in exp.get('bullets', []):
-                    draw_bullet_paragraph(margin, [y], b, width=page_w-2*margin)
-        edu = data.get('education', [])
-        if edu:
-            section('Education')
-            for ed in edu:
-                head = ' | '.join([x for x in [ed.get('degree'), ed.get('institution')] if x])
-                wrap_draw(margin, [y], head, 'Helvetica-Bold', 11)
-                meta = ' | '.join([x for x in [ed.get('location'), ed.get('dates')] if x])
-                if meta:
-                    wrap_draw(margin, [y], meta, 'Helvetica', 11)
-        prj = data.get('projects', [])
-        if prj:
-            section('Projects')
-            for pr in prj:
-                wrap_draw(margin, [y], pr.get('name') or 'Project', 'Helvetica-Bold', 11)
-                if pr.get('tech'):
-                    wrap_draw(margin, [y], pr['tech'], 'Helvetica', 11)
-                for b in pr.get('bullets', []):
-                    draw_bullet_paragraph(margin, [y], b, width=page_w-2*margin)
-                if pr.get('link'):
-                    wrap_draw(margin, [y], pr['link'], 'Helvetica', 11)
-        certs = data.get('certifications', [])
-        if certs:
-            section('Certifications')
-            for ctext in certs:
-                wrap_draw(margin, [y], ctext, 'Helvetica', 11)
-        extras = data.get('extras', [])
-        if extras:
-            section('Extras')
-            for e in extras:
-                wrap_draw(margin, [y], e, 'Helvetica', 11)
-        languages = data.get('languages', [])
-        if languages:
-            section('Languages')
-            wrap_draw(margin, [y], ', '.join(languages), 'Helvetica', 11)
-        if data.get('references'):
-            section('References')
-            wrap_draw(margin, [y], data['references'], 'Helvetica', 11, justify=True)
-    c.setFillColor(HexColor('#000000'))
-    c.setFont('Helvetica', 9)
-    c.drawString(page_w/2 - 14, margin/2, 'Page 1')
+        x = margin
+        width = page_w - 2*margin
+        y = [page_h - margin]
+        # the header lines make room for the photo in the top right corner
+        header_w = width - photo_box - 12 if photo_box else width
+        photo_bottom = y[0] - draw_photo(x + width - photo_box, y[0]) - 8 if photo_box else y[0]
+        wrap_draw(x, y, 'Curriculum Vitae (CV)', bold, 14, width=header_w)
+        wrap_draw(x, y, layout.name, bold, 16, width=header_w)
+        if layout.job_title:
+            wrap_draw(x, y, layout.job_title, regular, 12, width=header_w)
+        if layout.contacts:
+            wrap_draw(x, y, layout.contact_line, regular, 11, width=header_w)
+        y[0] = min(y[0], photo_bottom)
+    gap = PDF_ENTRY_GAP[template_key]
+    try:
+        for key, title in PDF_SECTIONS[template_key]:
+            lap(key)
+            section = layout.section(key)
+            if section:
+                draw_section(x, y, width, section, title, gap)
+    except _PageLimit:
+        pass
+    else:
+        footer()
     c.showPage()
-    c.save()
\ No newline at end of file
+    lap.stop()
+
+def render_timed(data, output_format="docx", template="sidebar", accent="#b87333", optimize=None):
+    # returns the document plus its section/serialize timings, for callers in another process
+    with collect(defer=True) as timings:
+        with timer("cv_stage_seconds", stage="build", template=template, format=output_format):
+            body = render(data, output_format, template, accent, optimize)
+    return body, timings
+
+def render(data, output_format="docx", template="sidebar", accent="#b87333", optimize=None):
+    buf = io.BytesIO()
+    if output_format == "pdf":
+        build_pdf(data, buf, template, accent, optimize=optimize)
+    else:
+        build_docx(data, buf, template, accent, optimize=optimize)
+    return buf.getvalue()
@@ -0,0 +1,204 @@
+"""Photos and logos: decoded once, downscaled to print size and kept by content hash.
+
+An upload is checked for size and pixel count from its header before any
+pixel is decoded, and JPEGs are decoded straight at a reduced scale (the
+decoder's DCT scaling) so a 50 MP phone photo never exists at full size in
+memory. Only a few uploads are decoded at once. The image is turned upright
+from its EXIF orientation, scaled to fit PHOTO_PX (the largest box a
+template draws it in, at PRINT_DPI) and saved as a JPEG, or a PNG if it has
+transparency, as logos often do.
+
+PhotoStore keeps the prepared images keyed by the SHA-256 of the upload, so
+the same file uploaded again isn't decoded again and every render embeds
+the prepared bytes as they are. A CV refers to its photo by that id.
+"""
+import hashlib
+import io
+import os
+import threading
+from collections import OrderedDict
+
+from utils.schema import PHOTO_ID, SchemaError
+
+# the sidebar's photo box is the widest; band and minimal draw it smaller
+PHOTO_INCHES = 1.4
+PRINT_DPI = 300
+PHOTO_PX = round(PHOTO_INCHES * PRINT_DPI)
+JPEG_QUALITY = 85
+MAX_PHOTO_BYTES = 10 * 1024 * 1024
+# pixels in the file, checked from its header
+MAX_PHOTO_PIXELS = 100_000_000
+# pixels actually decoded, after JPEG's reduced-scale decoding
+MAX_DECODE_PIXELS = 16_000_000
+
+_MIMETYPES = {"JPEG": "image/jpeg", "PNG": "image/png"}
+_decodes = threading.BoundedSemaphore(int(os.environ.get("CV_PHOTO_DECODES", 2)))
+
+
+def _error(message):
+    return SchemaError([{"field": "photo", "message": message}])
+
+
+class Photo:
+    __slots__ = ("id", "data", "mimetype", "width", "height")
+
+    def __init__(self, id, data, mimetype, width, height):
+        self.id = id
+        self.data = data
+        self.mimetype = mimetype
+        self.width = width
+        self.height = height
+
+    def fit(self, w, h):
+        # the largest (width, height) with the photo's proportions inside a w × h box
+        scale = min(w / self.width, h / self.height)
+        return self.width * scale, self.height * scale
+
+    def to_dict(self):
+        return {"photo": self.id, "width": self.width, "height": self.height, "bytes": len(self.data),
+                "mimetype": self.mimetype}
+
+
+def _open(raw):
+    from PIL import Image
+
+    try:
+        im = Image.open(io.BytesIO(raw))
+    except (OSError, Image.DecompressionBombError):
+        raise _error("is not an image in a supported format") from None
+    return im
+
+
+def prepare_photo(raw, photo_id=None, px=PHOTO_PX):
+    """raw image bytes -> a Photo at most px pixels on its longer side."""
+    from PIL import Image, ImageOps
+
+    if len(raw) > MAX_PHOTO_BYTES:
+        raise _error(f"is over the {MAX_PHOTO_BYTES} byte limit")
+    im = _open(raw)
+    w, h = im.size
+    if w * h > MAX_PHOTO_PIXELS:
+        raise _error(f"has more than {MAX_PHOTO_PIXELS} pixels")
+    with _decodes:
+        # a JPEG decodes at 1/2, 1/4 or 1/8 scale as long as that's still at least px
+        im.draft("RGB", (px, px))
+        if im.size[0] * im.size[1] > MAX_DECODE_PIXELS:
+            raise _error(f"would decode to more than {MAX_DECODE_PIXELS} pixels; use a smaller image")
+        try:
+            im = ImageOps.exif_transpose(im)
+            im.thumbnail((px, px), Image.LANCZOS)
+        except OSError:
+            raise _error("could not be decoded") from None
+    alpha = im.mode in ("RGBA", "LA", "PA") or (im.mode == "P" and "transparency" in im.info)
+    out = io.BytesIO()
+    if alpha:
+        im.convert("RGBA").save(out, "PNG", optimize=True)
+        mimetype = "image/png"
+    else:
+        im.convert("L" if im.mode in ("1", "L", "I", "I;16") else "RGB").save(
+            out, "JPEG", quality=JPEG_QUALITY, optimize=True)
+        mimetype = "image/jpeg"
+    return Photo(photo_id or hashlib.sha256(raw).hexdigest(), out.getvalue(), mimetype, im.width, im.height)
+
+
+class PhotoStore:
+    """Prepared photos by id, least recently used dropped past max_bytes.
+
+    With a directory they are also written there, so they outlive the
+    process and every process sharing it can find them.
+    """
+
+    def __init__(self, max_bytes=32 * 1024 * 1024, directory=None):
+        self.max_bytes = max_bytes
+        self.directory = directory
+        self._lock = threading.Lock()
+        self._mem = OrderedDict()
+        self._bytes = 0
+        self.counters = {"hits": 0, "misses": 0, "decodes": 0}
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def _remember(self, photo):
+        with self._lock:
+            if photo.id in self._mem:
+                return
+            self._mem[photo.id] = photo
+            self._bytes += len(photo.data)
+            while self._bytes > self.max_bytes and len(self._mem) > 1:
+                _, old = self._mem.popitem(last=False)
+                self._bytes -= len(old.data)
+
+    def _load(self, photo_id):
+        try:
+            with open(os.path.join(self.directory, photo_id), "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            return None
+        # only the header is read: these were written by prepare_photo()
+        im = _open(data)
+        return Photo(photo_id, data, _MIMETYPES.get(im.format, "image/jpeg"), im.width, im.height)
+
+    def get(self, photo_id):
+        with self._lock:
+            photo = self._mem.get(photo_id)
+            if photo is not None:
+                self._mem.move_to_end(photo_id)
+                self.counters["hits"] += 1
+                return photo
+        photo = self._load(photo_id) if self.directory and PHOTO_ID.match(photo_id) else None
+        if photo is None:
+            self.counters["misses"] += 1
+            return None
+        self.counters["hits"] += 1
+        self._remember(photo)
+        return photo
+
+    def put(self, raw):
+        """The prepared Photo for raw image bytes, decoding them only if they're new."""
+        photo_id = hashlib.sha256(raw).hexdigest()
+        photo = self.get(photo_id)
+        if photo is not None:
+            return photo
+        photo = prepare_photo(raw, photo_id)
+        self.counters["decodes"] += 1
+        if self.directory:
+            path = os.path.join(self.directory, photo_id)
+            # a temp file per writer, so two storing the same photo at once don't write into each other's
+            tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp, "wb") as f:
+                f.write(photo.data)
+            os.replace(tmp, path)
+        self._remember(photo)
+        return photo
+
+    def stats(self):
+        with self._lock:
+            return dict(self.counters, entries=len(self._mem), bytes=self._bytes, max_bytes=self.max_bytes)
+
+
+photo_store = PhotoStore(
+    max_bytes=int(os.environ.get("CV_PHOTO_CACHE_BYTES", 32 * 1024 * 1024)),
+    directory=os.environ.get("CV_PHOTO_DIR") or None,
+)
+
+
+def photo_for(value, store=None):
+    """A CV's "photo" value as a Photo: an id from PhotoStore, raw image bytes or a Photo."""
+    if not value:
+        return None
+    if isinstance(value, Photo):
+        return value
+    store = store or photo_store
+    if isinstance(value, (bytes, bytearray)):
+        return store.put(bytes(value))
+    photo = store.get(value)
+    if photo is None:
+        raise _error("is unknown or has expired; upload it again")
+    return photo
+
+
+def attach_photo(data):
+    # data with its photo id swapped for the Photo, for a render in another process
+    if isinstance(data, dict) and data.get("photo") and not isinstance(data["photo"], Photo):
+        return dict(data, photo=photo_for(data["photo"]))
+    return data
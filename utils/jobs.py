@@ -0,0 +1,223 @@
+import io
+import json
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from utils.executor import RenderBusy
+
+
+class MemoryResultStore:
+    """Results and job records in this process only."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._results = {}
+        self._records = {}
+
+    def put(self, job_id, body):
+        with self._lock:
+            self._results[job_id] = body
+
+    def open(self, job_id):
+        with self._lock:
+            body = self._results.get(job_id)
+        return None if body is None else io.BytesIO(body)
+
+    def put_record(self, job_id, record):
+        with self._lock:
+            self._records[job_id] = dict(record)
+
+    def get_record(self, job_id):
+        with self._lock:
+            record = self._records.get(job_id)
+        return None if record is None else dict(record)
+
+    def delete(self, job_id):
+        with self._lock:
+            self._results.pop(job_id, None)
+            self._records.pop(job_id, None)
+
+    def purge(self, cutoff):
+        with self._lock:
+            expired = [i for i, r in self._records.items() if (r.get("finished") or r["created"]) < cutoff]
+        for job_id in expired:
+            self.delete(job_id)
+
+
+class FileResultStore:
+    """Results and job records as files in a directory every app process shares.
+
+    A job's document is <id> and its record (status, times, error) <id>.json,
+    so a GET landing on another process than the POST still finds the job.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, job_id):
+        return os.path.join(self.directory, job_id)
+
+    def _write(self, path, body):
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(body)
+        os.replace(tmp, path)
+
+    def put(self, job_id, body):
+        self._write(self._path(job_id), body)
+
+    def open(self, job_id):
+        try:
+            return open(self._path(job_id), "rb")
+        except FileNotFoundError:
+            return None
+
+    def put_record(self, job_id, record):
+        self._write(self._path(job_id) + ".json", json.dumps(record).encode("utf-8"))
+
+    def get_record(self, job_id):
+        try:
+            with open(self._path(job_id) + ".json", "rb") as f:
+                return json.loads(f.read())
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def delete(self, job_id):
+        for path in (self._path(job_id), self._path(job_id) + ".json"):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def purge(self, cutoff):
+        # every file last written before cutoff: results and records of expired jobs, whichever
+        # process (or an earlier run of this one) wrote them, and temp files left by a crash
+        with os.scandir(self.directory) as entries:
+            for entry in entries:
+                try:
+                    if entry.is_file() and entry.stat().st_mtime < cutoff:
+                        os.remove(entry.path)
+                except FileNotFoundError:
+                    pass
+
+
+class Job:
+    __slots__ = ("id", "status", "output_format", "filename", "client", "error",
+                 "created", "started", "finished")
+
+    def __init__(self, output_format, filename, client="-"):
+        self.id = uuid.uuid4().hex
+        self.status = "queued"
+        self.output_format = output_format
+        self.filename = filename
+        # who submitted it, for the scheduler's per-client queues
+        self.client = client
+        self.error = None
+        self.created = time.time()
+        self.started = None
+        self.finished = None
+
+    def to_record(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    @classmethod
+    def from_record(cls, record):
+        job = cls.__new__(cls)
+        for name in cls.__slots__:
+            setattr(job, name, record.get(name))
+        return job
+
+    def to_dict(self):
+        now = time.time()
+        out = {"id": self.id, "status": self.status, "output_format": self.output_format}
+        out["queued_ms"] = round(((self.started or now) - self.created) * 1000, 1)
+        if self.started:
+            out["render_ms"] = round(((self.finished or now) - self.started) * 1000, 1)
+        if self.error:
+            out["error"] = self.error
+        return out
+
+
+class JobManager:
+    """Runs renders in the background and keeps finished results for ttl seconds.
+
+    Jobs this process runs are tracked here; each change of status is also
+    written to the store, which is how jobs run by other processes sharing it
+    are found. The store is swept of expired jobs as the manager starts and
+    then every tenth of ttl.
+    """
+
+    def __init__(self, render_fn, store=None, workers=2, ttl=600, max_pending=100):
+        self.render_fn = render_fn
+        self.store = store or MemoryResultStore()
+        self.ttl = ttl
+        self.max_pending = max_pending
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="cv-job")
+        self._lock = threading.Lock()
+        self._jobs = {}
+        self._next_sweep = 0.0
+        self.purge()
+
+    def submit(self, data, output_format, template, accent, filename, optimize=None, client="-"):
+        self.purge()
+        job = Job(output_format, filename, client)
+        with self._lock:
+            pending = sum(1 for j in self._jobs.values() if j.status in ("queued", "running"))
+            if pending >= self.max_pending:
+                raise RenderBusy()
+            self._jobs[job.id] = job
+        self.store.put_record(job.id, job.to_record())
+        self._pool.submit(self._run, job, data, template, accent, optimize)
+        return job
+
+    def _run(self, job, data, template, accent, optimize=None):
+        job.started = time.time()
+        job.status = "running"
+        self.store.put_record(job.id, job.to_record())
+        try:
+            # wait for a render slot rather than failing a job the client already queued
+            body = self.render_fn(data, job.output_format, template, accent, block=True, optimize=optimize,
+                                  client=job.client)
+            self.store.put(job.id, body)
+        except Exception as e:
+            job.error = str(e) or e.__class__.__name__
+            job.status = "failed"
+        else:
+            job.status = "done"
+        finally:
+            job.finished = time.time()
+            self.store.put_record(job.id, job.to_record())
+
+    def get(self, job_id):
+        self.purge()
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job is None:
+            # run by another process sharing the store
+            record = self.store.get_record(job_id)
+            now = time.time()
+            if record is not None and (record["finished"] or now) >= now - self.ttl:
+                job = Job.from_record(record)
+        return job
+
+    def purge(self):
+        now = time.time()
+        cutoff = now - self.ttl
+        with self._lock:
+            expired = [j for j in self._jobs.values() if j.finished and j.finished < cutoff]
+            for job in expired:
+                del self._jobs[job.id]
+            sweep = now >= self._next_sweep
+            if sweep:
+                self._next_sweep = now + self.ttl / 10
+        for job in expired:
+            self.store.delete(job.id)
+        if sweep:
+            self.store.purge(cutoff)
+
+    def shutdown(self):
+        self._pool.shutdown(cancel_futures=True)
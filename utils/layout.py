@@ -0,0 +1,123 @@
+from utils.images import photo_for
+
+
+CONTACT_FIELDS = ("phone", "email", "location", "linkedin", "github", "website")
+
+
+def _join(*parts):
+    return " | ".join(p for p in parts if p)
+
+
+def _items(value):
+    return tuple(str(v) for v in (value or []) if v)
+
+
+class _Record:
+    # compared and hashed by content, so a section can key the renderers' fragment caches
+    __slots__ = ()
+
+    def _key(self):
+        return tuple(getattr(self, k) for k in self.__slots__)
+
+    def __eq__(self, other):
+        return type(self) is type(other) and self._key() == other._key()
+
+    def __hash__(self):
+        return hash(self._key())
+
+
+class Entry(_Record):
+    # one experience/education/project; strings are pre-joined the way the templates print them
+    __slots__ = ("head", "meta", "dates", "alt_head", "tech", "link", "bullets")
+
+    def __init__(self, head="", meta="", dates="", alt_head="", tech="", link="", bullets=()):
+        self.head = head
+        self.meta = meta
+        self.dates = dates
+        self.alt_head = alt_head
+        self.tech = tech
+        self.link = link
+        self.bullets = bullets
+
+
+class Section(_Record):
+    __slots__ = ("key", "entries", "items", "text")
+
+    def __init__(self, key, entries=(), items=(), text=""):
+        self.key = key
+        self.entries = entries
+        self.items = items
+        self.text = text
+
+
+class Layout:
+    """Normalized CV content shared by every template and output format."""
+
+    __slots__ = ("name", "job_title", "contacts", "contact_line", "sections", "photo")
+
+    def __init__(self, name, job_title, contacts, sections, photo=None):
+        self.name = name
+        self.job_title = job_title
+        self.contacts = contacts
+        self.contact_line = _join(*contacts)
+        self.sections = sections
+        # a utils.images.Photo, already scaled for print
+        self.photo = photo
+
+    def section(self, key):
+        # None when the CV has nothing for that section
+        return self.sections.get(key)
+
+
+def _experience(exp):
+    return Entry(
+        head=_join(exp.get("title"), exp.get("company")),
+        meta=_join(exp.get("location"), exp.get("dates")),
+        dates=exp.get("dates") or "",
+        alt_head=_join(exp.get("company"), exp.get("location"), exp.get("title")),
+        bullets=_items(exp.get("bullets")),
+    )
+
+
+def _education(ed):
+    return Entry(
+        head=_join(ed.get("degree"), ed.get("institution")),
+        meta=_join(ed.get("location"), ed.get("dates")),
+        dates=ed.get("dates") or "",
+    )
+
+
+def _project(pr):
+    return Entry(
+        head=pr.get("name") or "Project",
+        tech=pr.get("tech") or "",
+        link=pr.get("link") or "",
+        bullets=_items(pr.get("bullets")),
+    )
+
+
+_ENTRY_BUILDERS = {"experiences": _experience, "education": _education, "projects": _project}
+
+
+def build_layout(data):
+    if isinstance(data, Layout):
+        return data
+    sections = {}
+    if data.get("summary"):
+        sections["summary"] = Section("summary", text=data["summary"])
+    for key in ("skills", "certifications", "extras"):
+        items = _items(data.get(key))
+        if items:
+            sections[key] = Section(key, items=items)
+    for key, build in _ENTRY_BUILDERS.items():
+        entries = tuple(build(item) for item in (data.get(key) or []) if isinstance(item, dict))
+        if entries:
+            sections[key] = Section(key, entries=entries)
+    languages = _items(data.get("languages"))
+    if languages:
+        sections["languages"] = Section("languages", items=languages, text=", ".join(languages))
+    if data.get("references"):
+        sections["references"] = Section("references", text=data["references"])
+    contacts = tuple(data.get(k) for k in CONTACT_FIELDS if data.get(k))
+    return Layout((data.get("name") or "").upper(), data.get("job_title") or "", contacts, sections,
+                  photo_for(data.get("photo")))
@@ -0,0 +1,155 @@
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# (timings, deferred) for the innermost collect(); timings is a list of (metric, labels, seconds)
+_collector = ContextVar("cv_timings", default=None)
+
+
+class Histogram:
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.count += 1
+        self.sum += value
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+
+
+class Registry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._histograms = {}
+        self._help = {}
+
+    def describe(self, name, text):
+        self._help[name] = text
+
+    def observe(self, name, value, labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            hist = self._histograms.get(key)
+            if hist is None:
+                hist = self._histograms[key] = Histogram()
+            hist.observe(value)
+
+    def render(self, extra=()):
+        lines = []
+        with self._lock:
+            by_name = {}
+            for (name, labels), hist in sorted(self._histograms.items()):
+                by_name.setdefault(name, []).append((labels, hist))
+            for name, series in by_name.items():
+                if name in self._help:
+                    lines.append(f"# HELP {name} {self._help[name]}")
+                lines.append(f"# TYPE {name} histogram")
+                for labels, hist in series:
+                    cumulative = 0
+                    for bound, n in zip(hist.buckets, hist.counts):
+                        cumulative += n
+                        lines.append(f"{name}_bucket{_labels(labels + (('le', repr(bound)),))} {cumulative}")
+                    lines.append(f"{name}_bucket{_labels(labels + (('le', '+Inf'),))} {hist.count}")
+                    lines.append(f"{name}_sum{_labels(labels)} {hist.sum}")
+                    lines.append(f"{name}_count{_labels(labels)} {hist.count}")
+        for name, kind, value in extra:
+            lines.append(f"# TYPE {name} {kind}")
+            lines.append(f"{name} {value}")
+        return "\n".join(lines) + "\n"
+
+
+def _labels(labels):
+    if not labels:
+        return ""
+    body = ",".join('{}="{}"'.format(k, str(v).replace("\\", "\\\\").replace('"', '\\"')) for k, v in labels)
+    return "{" + body + "}"
+
+
+REGISTRY = Registry()
+REGISTRY.describe("cv_stage_seconds", "Time spent in each /generate stage.")
+REGISTRY.describe("cv_section_seconds", "Time spent laying out each CV section.")
+REGISTRY.describe("cv_request_seconds", "Time to produce a response, per endpoint.")
+
+
+def _add(name, labels, seconds):
+    current = _collector.get()
+    if current is not None:
+        current[0].append((name, labels, seconds))
+        if current[1]:
+            return
+    REGISTRY.observe(name, seconds, labels)
+
+
+@contextmanager
+def collect(defer=False):
+    """Gather the timings recorded inside the block.
+
+    With defer=True they are kept out of the registry so they can be shipped
+    elsewhere (e.g. back from a worker process) and passed to record().
+    """
+    timings = []
+    token = _collector.set((timings, defer))
+    try:
+        yield timings
+    finally:
+        _collector.reset(token)
+
+
+def record(timings):
+    for name, labels, seconds in timings:
+        _add(name, labels, seconds)
+
+
+@contextmanager
+def timer(name, **labels):
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        _add(name, labels, time.perf_counter() - t0)
+
+
+class Lap:
+    """Times consecutive sections: lap('b') ends the running section and starts 'b'.
+
+    A section entered more than once is reported once, with the summed time.
+    """
+
+    def __init__(self, name, **labels):
+        self.name = name
+        self.labels = labels
+        self._totals = {}
+        self._section = None
+        self._t0 = None
+
+    def __call__(self, section):
+        now = time.perf_counter()
+        if self._section is not None:
+            self._totals[self._section] = self._totals.get(self._section, 0.0) + now - self._t0
+        self._section = section
+        self._t0 = now
+
+    def stop(self):
+        self(None)
+        for section, seconds in self._totals.items():
+            _add(self.name, dict(self.labels, section=section), seconds)
+        self._totals = {}
+
+
+def server_timing(timings):
+    totals = {}
+    for name, labels, seconds in timings:
+        if name == "cv_section_seconds":
+            key = f"{labels.get('format')}.{labels.get('section')}"
+        else:
+            key = labels.get("stage") or name
+        totals[key] = totals.get(key, 0.0) + seconds
+    return ", ".join(f"{k};dur={v * 1000:.2f}" for k, v in totals.items())
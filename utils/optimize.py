@@ -0,0 +1,194 @@
+"""optimize="size": smaller PDFs and DOCX files for a bit more CPU.
+
+PDF: the canvas's document is switched to a subclass that deflates every
+stream at level 9 and drops ReportLab's ASCII85 wrapping of page content
+(which makes it 25% bigger again), leaves out page-dictionary entries that
+only restate defaults, and writes only the document info that was set.
+ReportLab already shares font and resource objects between pages, so there
+is nothing left to deduplicate in these documents.
+
+DOCX: the saved package is repacked. python-docx's base template carries
+parts Word doesn't need (stylesWithEffects.xml, webSettings.xml, the
+customXml item, a thumbnail); they are dropped along with anything else no
+longer reachable through a relationship. styles.xml keeps only the styles
+the document (and numbering.xml) refers to, the defaults and whatever those
+are based on, without the latent-style table. Entries are deflated at
+level 9.
+"""
+import io
+import os
+import posixpath
+import re
+import zipfile
+import zlib
+
+from docx.opc.constants import RELATIONSHIP_TYPE as RT
+from lxml import etree
+from reportlab.pdfbase import pdfdoc
+
+from utils.schema import OPTIMIZE_MODES
+
+# process-wide default for build_docx/build_pdf, and for requests that don't ask
+OPTIMIZE = os.environ.get("CV_OPTIMIZE", "speed")
+if OPTIMIZE not in OPTIMIZE_MODES:
+    raise ValueError(f"CV_OPTIMIZE must be one of: {', '.join(OPTIMIZE_MODES)} (got {OPTIMIZE!r})")
+
+ZIP_LEVEL = 9
+
+
+class _Flate(pdfdoc.PDFStreamFilterZCompress):
+    def encode(self, text):
+        if isinstance(text, str):
+            text = text.encode("utf8")
+        return zlib.compress(text, 9)
+
+
+_FLATE = _Flate()
+
+
+class _CompactInfo(pdfdoc.PDFInfo):
+    # only the producer, the date and fields someone actually set
+    def format(self, document):
+        D = {"Producer": pdfdoc.PDFString(self.producer),
+             "CreationDate": pdfdoc.PDFDate(ts=document._timeStamp, dateFormatter=self._dateFormatter)}
+        for field in ("title", "author", "subject", "keywords"):
+            value = getattr(self, field)
+            if value and value != getattr(pdfdoc.PDFInfo, field):
+                D[field.capitalize()] = pdfdoc.PDFString(value)
+        return pdfdoc.PDFDictionary(D).format(document)
+
+
+class _CompactDocument:
+    # mixed into the canvas's PDFDocument class by compact_pdf()
+    def addPage(self, page):
+        if not page.Rotate:
+            page.Rotate = None
+        if page.Trans is not None and not page.Trans.dict:
+            page.Trans = None
+        if page.compression and page.stream:
+            # set Contents now so PDFPage.check_format doesn't add ASCII85
+            stream = pdfdoc.PDFStream(content=page.stream, filters=[_FLATE])
+            stream.__Comment__ = "page stream"
+            page.Contents = stream
+        super().addPage(page)
+
+    def format(self):
+        # font files and other streams added while saving
+        for obj in self.idToObject.values():
+            if isinstance(obj, pdfdoc.PDFStream) and obj.filters:
+                obj.filters = [_FLATE if f is pdfdoc.PDFZCompress else f
+                               for f in obj.filters if f is not pdfdoc.PDFBase85Encode]
+        return super().format()
+
+
+_compact_classes = {}
+
+
+def compact_pdf(c):
+    """Make canvas c write its PDF with the size options above."""
+    doc = c._doc
+    cls = doc.__class__
+    if cls not in _compact_classes:
+        _compact_classes[cls] = type("Compact" + cls.__name__, (_CompactDocument, cls), {})
+    doc.__class__ = _compact_classes[cls]
+    doc.info.__class__ = _CompactInfo
+    doc.setCompression(1)
+    c._pageCompression = 1
+    return c
+
+
+_DROP_RELS = {
+    "http://schemas.microsoft.com/office/2007/relationships/stylesWithEffects",
+    RT.WEB_SETTINGS,
+    RT.CUSTOM_XML,
+    RT.THUMBNAIL,
+}
+_CT_NS = "{http://schemas.openxmlformats.org/package/2006/content-types}"
+_W = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+_STYLE_REF = re.compile(rb'<w:(?:pStyle|rStyle|tblStyle|numStyleLink|styleLink) w:val="([^"]+)"')
+_styles_cache = {}
+
+
+def _rels_name(part):
+    head, tail = posixpath.split(part)
+    return posixpath.join(head, "_rels", tail + ".rels")
+
+
+def _reachable(files):
+    # parts reachable from the package relationships once _DROP_RELS are removed;
+    # rewrites the .rels files in files as it goes
+    keep, todo = set(), [""]
+    while todo:
+        part = todo.pop()
+        rels_name = _rels_name(part)
+        if rels_name not in files:
+            continue
+        root = etree.fromstring(files[rels_name])
+        for rel in list(root):
+            if rel.get("Type") in _DROP_RELS:
+                root.remove(rel)
+            elif rel.get("TargetMode") != "External":
+                target = posixpath.normpath(posixpath.join(posixpath.dirname(part), rel.get("Target"))).lstrip("/")
+                if target not in keep:
+                    keep.add(target)
+                    todo.append(target)
+        files[rels_name] = etree.tostring(root, xml_declaration=True, encoding="UTF-8", standalone=True)
+        keep.add(rels_name)
+    return keep
+
+
+def _strip_styles(styles_xml, used):
+    root = etree.fromstring(styles_xml)
+    styles = {s.get(_W + "styleId"): s for s in root.iter(_W + "style")}
+    keep = {sid for sid, s in styles.items() if sid in used or s.get(_W + "default") == "1"}
+    todo = list(keep)
+    while todo:
+        style = styles[todo.pop()]
+        for tag in ("basedOn", "link", "next"):
+            ref = style.find(_W + tag)
+            sid = ref.get(_W + "val") if ref is not None else None
+            if sid in styles and sid not in keep:
+                keep.add(sid)
+                todo.append(sid)
+    for sid, s in styles.items():
+        if sid not in keep:
+            root.remove(s)
+    latent = root.find(_W + "latentStyles")
+    if latent is not None:
+        root.remove(latent)
+    return etree.tostring(root, xml_declaration=True, encoding="UTF-8", standalone=True)
+
+
+def repack_docx(data):
+    """A .docx (bytes) rewritten with the size options above."""
+    with zipfile.ZipFile(io.BytesIO(data)) as src:
+        infos = {i.filename: i for i in src.infolist()}
+        files = {name: src.read(i) for name, i in infos.items()}
+    keep = _reachable(files)
+    keep.add("[Content_Types].xml")
+    ct = etree.fromstring(files["[Content_Types].xml"])
+    for override in ct.findall(_CT_NS + "Override"):
+        if override.get("PartName").lstrip("/") not in keep:
+            ct.remove(override)
+    files["[Content_Types].xml"] = etree.tostring(ct, xml_declaration=True, encoding="UTF-8", standalone=True)
+    if "word/styles.xml" in keep:
+        used = set()
+        for name in keep:
+            if name.endswith(".xml") and name != "word/styles.xml":
+                used.update(m.decode() for m in _STYLE_REF.findall(files[name]))
+        # the skeleton's styles.xml is the same for every document of a template,
+        # so the zip's CRC of it is enough to key the stripped copy
+        info = infos["word/styles.xml"]
+        key = (info.CRC, info.file_size, frozenset(used))
+        stripped = _styles_cache.get(key)
+        if stripped is None:
+            if len(_styles_cache) >= 64:
+                _styles_cache.clear()
+            stripped = _styles_cache[key] = _strip_styles(files["word/styles.xml"], used)
+        files["word/styles.xml"] = stripped
+    out = io.BytesIO()
+    with zipfile.ZipFile(out, "w", zipfile.ZIP_DEFLATED, compresslevel=ZIP_LEVEL) as dst:
+        for name in infos:
+            if name in keep:
+                dst.writestr(name, files[name])
+    return out.getvalue()
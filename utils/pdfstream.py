@@ -0,0 +1,119 @@
+"""ReportLab canvas that writes each finished page to the output straight away.
+
+ReportLab keeps every page (content stream and page dictionary) in memory
+until save(). StreamingCanvas writes both as soon as the page is shown and
+keeps only their object numbers and file offsets; fonts, the page tree and
+the xref are written by ReportLab's own code at save() as usual. PDF
+readers find objects through the xref, so the order they appear in the file
+doesn't matter.
+
+Encryption, annotations, outlines and signatures are not supported here;
+draw_pdf uses none of them.
+"""
+from reportlab import rl_config
+from reportlab.lib.pagesizes import LETTER
+from reportlab.pdfbase import pdfdoc
+from reportlab.pdfgen import canvas
+
+
+class _StreamFile(pdfdoc.PDFFile):
+    # PDFFile that writes through instead of collecting strings; add() still tracks offsets
+    def __init__(self, write, pdf_version):
+        super().__init__(pdf_version)
+        for s in self.strings:
+            write(s)
+        self.strings = []
+        self.write = write
+
+
+class StreamingDocument(pdfdoc.PDFDocument):
+    def __init__(self, write, **kwargs):
+        super().__init__(**kwargs)
+        self._file = _StreamFile(write, self._pdfVersion)
+        self._flushed = set()
+
+    def _write_object(self, name, obj):
+        data = pdfdoc.PDFIndirectObject(name, obj).format(self)
+        if not rl_config.invariant and rl_config.pdfComments:
+            self._file.add("%% %s: class %s \n" % (ascii(name), obj.__class__.__name__[:50]))
+        self.idToOffset[name] = self._file.add(data)
+
+    def flush_page(self):
+        """Write the page just added by Canvas.showPage() and let go of it."""
+        page = self.Pages.pages[-1]
+        page.check_format(self)
+        name = self.Reference(page).name
+        contents = self.Reference(page.Contents).name
+        self._write_object(contents, page.Contents)
+        self._write_object(name, page)
+        for n in (contents, name):
+            self.idToObject[n] = None
+            self._flushed.add(n)
+        # the page tree only needs the reference
+        self.Pages.pages[-1] = pdfdoc.PDFObjectReference(name)
+
+    def format(self):
+        # PDFDocument.format(), except already written objects are skipped and the
+        # output goes straight to the stream
+        cat = self.Catalog
+        info = self.info
+        self.Reference(cat)
+        self.Reference(info)
+        self.__accum__ = self._file
+        ids = []
+        counter = 0
+        while True:
+            counter += 1
+            if counter not in self.numberToId:
+                break
+            oid = self.numberToId[counter]
+            ids.append(oid)
+            if oid not in self._flushed:
+                self._write_object(oid, self.idToObject[oid])
+        del self.__accum__
+        xref = pdfdoc.PDFCrossReferenceTable()
+        xref.addsection(0, ids)
+        xrefoffset = self._file.add(xref.format(self))
+        trailer = pdfdoc.PDFTrailer(
+            startxref=xrefoffset,
+            Size=len(ids) + 1,
+            Root=self.Reference(cat),
+            Info=self.Reference(info),
+            Encrypt=None,
+            ID=self.ID(),
+        )
+        self._file.add(trailer.format(self))
+        return b""
+
+
+class StreamingCanvas(canvas.Canvas):
+    """Canvas whose pages are written to output as they are finished.
+
+    output is a path or a writable binary stream. Peak memory depends on the
+    largest page rather than on the number of pages.
+    """
+
+    def __init__(self, output, pagesize=LETTER, **kwargs):
+        self._close = isinstance(output, str)
+        self._out = open(output, "wb") if self._close else output
+        super().__init__(self._out, pagesize=pagesize, **kwargs)
+        doc = self._doc
+        self._doc = StreamingDocument(
+            self._out.write,
+            compression=doc.compression,
+            invariant=doc.invariant,
+            pdfVersion=doc._pdfVersion,
+        )
+        # the preamble registered the initial font with the document we just replaced
+        self._make_preamble()
+
+    def showPage(self):
+        super().showPage()
+        self._doc.flush_page()
+
+    def save(self):
+        try:
+            super().save()
+        finally:
+            if self._close:
+                self._out.close()
@@ -0,0 +1,174 @@
+import base64
+import io
+import os
+from functools import lru_cache
+from xml.sax.saxutils import escape, quoteattr
+
+import reportlab
+from reportlab.lib.pagesizes import LETTER
+
+from utils.fonts import font_file
+from utils.generator import draw_pdf
+
+PREVIEW_FORMATS = {"svg": "image/svg+xml", "png": "image/png"}
+PNG_SCALE = 0.75
+_RL_FONTS = os.path.join(os.path.dirname(reportlab.__file__), "fonts")
+
+
+def _hex(color):
+    r, g, b = color.rgb()
+    return "#%02x%02x%02x" % (round(r * 255), round(g * 255), round(b * 255))
+
+
+class PreviewCanvas:
+    """Records what draw_pdf paints onto a page as rects, text runs and the photo.
+
+    Only the first page is kept. Paragraphs arrive already wrapped by
+    ReportLab, so line breaks match the PDF exactly.
+    """
+
+    def __init__(self, pagesize=LETTER):
+        self.width, self.height = pagesize
+        self.ops = []
+        self._fill = "#000000"
+        self._font = ("Helvetica", 12)
+        self._done = False
+
+    def setFillColor(self, color):
+        self._fill = _hex(color)
+
+    def setFont(self, name, size):
+        self._font = (name, size)
+
+    def rect(self, x, y, w, h, stroke=1, fill=0):
+        if fill and not self._done:
+            self.ops.append(("rect", x, y, w, h, self._fill))
+
+    def drawString(self, x, y, text):
+        self._text(x, y, text, self._font[0], self._font[1], self._fill)
+
+    def showPage(self):
+        self._done = True
+
+    def save(self):
+        pass
+
+    def _text(self, x, y, text, font, size, fill, length=None):
+        if text and not self._done:
+            self.ops.append(("text", x, y, text, font, size, fill, length))
+
+    def draw_paragraph(self, p, x, y):
+        style = p.style
+        bl = p.blPara
+        avail = p.width - style.leftIndent - style.rightIndent
+        baseline = y + p.height - style.fontSize
+        if p.bulletText:
+            self._text(x + style.bulletIndent, baseline, p.bulletText, style.bulletFontName,
+                       style.bulletFontSize, _hex(getattr(style, "bulletColor", None) or style.textColor))
+        last = len(bl.lines) - 1
+        for i, line in enumerate(bl.lines):
+            if bl.kind == 0:
+                extra, words = line
+                text, font, size, color = " ".join(words), bl.fontName, bl.fontSize, bl.textColor
+            else:
+                frags = line.words
+                text = "".join(f.text for f in frags)
+                f = frags[0] if frags else style
+                font, size, color = f.fontName, f.fontSize, f.textColor
+            length = avail if style.alignment == 4 and i < last and text else None
+            lx = x + style.leftIndent + (style.firstLineIndent if i == 0 else 0)
+            self._text(lx, baseline, text, font, size, _hex(color), length)
+            baseline -= style.leading
+
+    def draw_photo(self, photo, x, y, w, h):
+        if not self._done:
+            self.ops.append(("photo", x, y, w, h, photo))
+
+    def to_svg(self):
+        h = self.height
+        out = [
+            f'<svg xmlns="http://www.w3.org/2000/svg" width="{self.width:g}" height="{h:g}" '
+            f'viewBox="0 0 {self.width:g} {h:g}">',
+            f'<rect width="{self.width:g}" height="{h:g}" fill="#ffffff"/>',
+            '<g font-family=%s>' % quoteattr("Helvetica, Arial, sans-serif"),
+        ]
+        for op in self.ops:
+            if op[0] == "rect":
+                _, x, y, w, rh, fill = op
+                out.append(f'<rect x="{x:.1f}" y="{h - y - rh:.1f}" width="{w:.1f}" height="{rh:.1f}" fill="{fill}"/>')
+            elif op[0] == "photo":
+                _, x, y, w, ph, photo = op
+                href = f"data:{photo.mimetype};base64,{base64.b64encode(photo.data).decode('ascii')}"
+                out.append(f'<image x="{x:.1f}" y="{h - y - ph:.1f}" width="{w:.1f}" height="{ph:.1f}" '
+                           f'preserveAspectRatio="none" href="{href}"/>')
+            else:
+                _, x, y, text, font, size, fill, length = op
+                attrs = f'x="{x:.1f}" y="{h - y:.1f}" font-size="{size:g}" fill="{fill}"'
+                if "Bold" in font:
+                    attrs += ' font-weight="bold"'
+                if length:
+                    attrs += f' textLength="{length:.1f}" lengthAdjust="spacing"'
+                out.append(f"<text {attrs}>{escape(text)}</text>")
+        out.append("</g></svg>")
+        return "\n".join(out).encode("utf-8")
+
+    def to_png(self, scale=PNG_SCALE):
+        from PIL import Image, ImageDraw
+
+        h = self.height
+        img = Image.new("RGB", (round(self.width * scale), round(h * scale)), "#ffffff")
+        draw = ImageDraw.Draw(img)
+        for op in self.ops:
+            if op[0] == "rect":
+                _, x, y, w, rh, fill = op
+                draw.rectangle([x * scale, (h - y - rh) * scale, (x + w) * scale, (h - y) * scale], fill=fill)
+            elif op[0] == "photo":
+                _, x, y, w, ph, photo = op
+                im = _photo_image(photo.data, round(w * scale), round(ph * scale))
+                img.paste(im, (round(x * scale), round((h - y - ph) * scale)), im if im.mode == "RGBA" else None)
+            else:
+                _, x, y, text, font, size, fill, _length = op
+                mask, (dx, dy) = _text_mask(text, round(size * scale), font)
+                img.paste(fill, (round(x * scale) + dx, round((h - y) * scale) + dy), mask)
+        buf = io.BytesIO()
+        img.save(buf, "PNG", optimize=False, compress_level=1)
+        return buf.getvalue()
+
+
+@lru_cache(maxsize=32)
+def _png_font(font, size):
+    # the PDF's own TrueType file when it embeds one; for Helvetica, Vera (it ships with
+    # ReportLab and covers the bullets/dashes Pillow's default font lacks)
+    from PIL import ImageFont
+
+    path = font_file(font) or os.path.join(_RL_FONTS, "VeraBd.ttf" if "Bold" in font else "Vera.ttf")
+    return ImageFont.truetype(path, size)
+
+
+@lru_cache(maxsize=16)
+def _photo_image(data, w, h):
+    # the prepared photo at preview size; it's the same on every preview of a CV
+    from PIL import Image
+
+    im = Image.open(io.BytesIO(data))
+    return im.convert("RGBA" if "A" in im.getbands() else "RGB").resize((max(w, 1), max(h, 1)), Image.LANCZOS)
+
+
+@lru_cache(maxsize=4096)
+def _text_mask(text, size, font="Helvetica"):
+    # glyph rasterising dominates PNG time; an edit only changes a few lines,
+    # so the rest are pasted from here on the next preview
+    from PIL import Image, ImageDraw
+
+    font = _png_font(font, size)
+    left, top, right, bottom = font.getbbox(text, anchor="ls")
+    mask = Image.new("L", (max(right - left, 1), max(bottom - top, 1)), 0)
+    ImageDraw.Draw(mask).text((-left, -top), text, fill=255, font=font, anchor="ls")
+    return mask, (left, top)
+
+
+def render_preview(data, template="sidebar", accent="#b87333", fmt="svg"):
+    """First page of the PDF layout as SVG or PNG bytes."""
+    c = PreviewCanvas()
+    draw_pdf(c, data, template, accent, max_pages=1)
+    return c.to_png() if fmt == "png" else c.to_svg()
@@ -0,0 +1,143 @@
+"""Per-client token buckets for /generate, charged by an estimate of render cost.
+
+Each client (its IP, or an API key listed in CV_API_KEYS) has a bucket that
+refills at `rate` tokens per second up to `burst`. A request takes
+request_cost() tokens: one per document plus a little per entry and bullet,
+so a 200-entry CV costs what dozens of ordinary ones do. When the bucket is
+short the request is refused with RateLimited, which carries how long until
+it would succeed.
+
+Bucket state lives in a store: MemoryBucketStore for one process, or
+SqliteBucketStore to share limits between processes on the same host.
+"""
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+BASE_COST = 1.0
+ENTRY_COST = 0.1
+BULLET_COST = 0.02
+
+
+class RateLimited(Exception):
+    def __init__(self, retry_after=1):
+        super().__init__("rate limit exceeded")
+        self.retry_after = retry_after
+
+
+def request_cost(data, documents=1):
+    """Tokens for rendering data (a CV dict) as `documents` documents."""
+    entries = len(data.get("certifications") or ()) + len(data.get("extras") or ()) + len(data.get("skills") or ())
+    bullets = 0
+    for key in ("experiences", "education", "projects"):
+        items = data.get(key) or ()
+        entries += len(items)
+        for item in items:
+            bullets += len(item.get("bullets") or ())
+    return documents * (BASE_COST + entries * ENTRY_COST + bullets * BULLET_COST)
+
+
+class MemoryBucketStore:
+    """Buckets in a dict; the least recently used are dropped (i.e. refilled) past max_keys."""
+
+    def __init__(self, max_keys=10000):
+        self.max_keys = max_keys
+        self._lock = threading.Lock()
+        self._buckets = OrderedDict()
+
+    def update(self, key, fn):
+        # fn(state or None) -> (new state, result); applied atomically
+        with self._lock:
+            state, result = fn(self._buckets.get(key))
+            self._buckets[key] = state
+            self._buckets.move_to_end(key)
+            if len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        return result
+
+
+class SqliteBucketStore:
+    """Buckets in an SQLite file, shared by every process that opens the same path."""
+
+    def __init__(self, path, idle_ttl=3600):
+        self.path = path
+        self.idle_ttl = idle_ttl
+        self._local = threading.local()
+        self._updates = 0
+        with self._connect() as db:
+            db.execute("CREATE TABLE IF NOT EXISTS buckets (key TEXT PRIMARY KEY, tokens REAL, stamp REAL)")
+
+    def _connect(self):
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = self._local.db = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+        return db
+
+    def update(self, key, fn):
+        db = self._connect()
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            row = db.execute("SELECT tokens, stamp FROM buckets WHERE key = ?", (key,)).fetchone()
+            state, result = fn(row)
+            db.execute("INSERT OR REPLACE INTO buckets (key, tokens, stamp) VALUES (?, ?, ?)", (key, *state))
+            self._updates += 1
+            if self._updates % 1000 == 0:
+                db.execute("DELETE FROM buckets WHERE stamp < ?", (time.time() - self.idle_ttl,))
+            db.execute("COMMIT")
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+        return result
+
+
+class RateLimiter:
+    def __init__(self, rate, burst=None, store=None):
+        self.rate = rate
+        self.burst = burst or rate * 10
+        self.store = store or MemoryBucketStore()
+        self.counters = {"allowed": 0, "limited": 0}
+
+    @property
+    def enabled(self):
+        return self.rate > 0
+
+    def take(self, client, cost):
+        """Charge client cost tokens, or raise RateLimited if its bucket is short."""
+        if not self.enabled:
+            return
+        # a request bigger than the bucket empties it rather than never getting through
+        cost = min(cost, self.burst)
+        now = time.time()
+
+        def charge(state):
+            tokens, stamp = state or (self.burst, now)
+            tokens = min(self.burst, tokens + max(0.0, now - stamp) * self.rate)
+            if tokens >= cost:
+                return (tokens - cost, now), 0.0
+            return (tokens, now), (cost - tokens) / self.rate
+
+        wait = self.store.update(client, charge)
+        if wait:
+            self.counters["limited"] += 1
+            raise RateLimited(max(1, int(wait + 0.999)))
+        self.counters["allowed"] += 1
+
+
+def limiter_from_env(environ=os.environ):
+    rate = float(environ.get("CV_RATE_LIMIT", 0))
+    path = environ.get("CV_RATE_LIMIT_DB")
+    return RateLimiter(
+        rate,
+        burst=float(environ.get("CV_RATE_BURST", 0)) or None,
+        store=SqliteBucketStore(path) if path else MemoryBucketStore(),
+    )
+
+
+def client_id(headers, remote_addr, api_keys=()):
+    """Bucket key for a request: a known API key, otherwise the client address."""
+    key = headers.get("X-API-Key")
+    if key and key in api_keys:
+        return "key:" + key
+    return "ip:" + (remote_addr or "-")
@@ -0,0 +1,180 @@
+"""Weighted fair admission to the render slots.
+
+FairScheduler lets at most `slots` renders run at once. Requests beyond
+that wait, and each freed slot goes to the waiting request with the lowest
+virtual finish time, as in weighted fair queueing: a request's tag is its
+client's previous tag, or the scheduler's virtual clock if the client has
+been idle, plus the request's cost. The clock is the tag of the request
+last admitted, whether it waited or not, so a client that was served
+without contention doesn't carry a debt into the next busy spell. A client sending many or heavy requests
+pushes its own tags out and others' requests overtake them, however deep
+its backlog is. A request rendering several documents at once holds as many
+slots (up to all of them) and waits until that many are free; the request
+at the head of the queue isn't overtaken by narrower ones meanwhile, so it
+can't starve. The queue is bounded, and with max_waiting_per_client so is
+each client's share of it; past either limit, or after waiting `timeout`
+seconds, a request gets RenderBusy.
+
+Threads wait with slot(); coroutines with slot_async(), without holding a
+thread while they wait.
+"""
+import asyncio
+import heapq
+import itertools
+import threading
+import time
+from contextlib import asynccontextmanager, contextmanager
+
+from utils import metrics
+from utils.executor import RenderBusy
+
+
+class _Waiter:
+    __slots__ = ("tag", "seq", "client", "n", "wake", "state")
+
+    def __init__(self, tag, seq, client, n, wake):
+        self.tag = tag
+        self.seq = seq
+        self.client = client
+        self.n = n
+        self.wake = wake
+        self.state = "waiting"  # -> "admitted" or "cancelled"
+
+    def __lt__(self, other):
+        return (self.tag, self.seq) < (other.tag, other.seq)
+
+
+class FairScheduler:
+    def __init__(self, slots=1, max_waiting=32, max_waiting_per_client=None, timeout=30, retry_after=1):
+        self.slots = slots
+        self.max_waiting = max_waiting
+        self.max_waiting_per_client = max_waiting_per_client  # None: no cap per client
+        self.timeout = timeout
+        self.retry_after = retry_after
+        self._lock = threading.Lock()
+        self._busy = 0
+        self._heap = []  # may still hold cancelled waiters; _queued counts the live ones
+        self._queued = 0
+        self._waiting = {}  # client -> requests waiting
+        self._finish = {}  # client -> virtual finish time of its last request
+        self._vtime = 0.0
+        self._seq = itertools.count()
+        self.counters = {"immediate": 0, "queued": 0, "rejected": 0}
+
+    def _enqueue(self, client, cost, n, wake):
+        # None when n slots are free straight away, else the waiter to be woken
+        with self._lock:
+            tag = max(self._vtime, self._finish.get(client, 0.0)) + cost
+            if self._busy + n <= self.slots and not self._queued:
+                self._busy += n
+                self._finish[client] = tag
+                self._vtime = max(self._vtime, tag)
+                self._prune()
+                self.counters["immediate"] += 1
+                return None
+            per_client = self.max_waiting_per_client
+            if self._queued >= self.max_waiting or (per_client and self._waiting.get(client, 0) >= per_client):
+                self.counters["rejected"] += 1
+                raise RenderBusy(self.retry_after)
+            self._finish[client] = tag
+            waiter = _Waiter(tag, next(self._seq), client, n, wake)
+            heapq.heappush(self._heap, waiter)
+            self._queued += 1
+            self._waiting[client] = self._waiting.get(client, 0) + 1
+            self.counters["queued"] += 1
+            return waiter
+
+    def _dequeued(self, waiter):
+        self._queued -= 1
+        n = self._waiting[waiter.client] - 1
+        if n:
+            self._waiting[waiter.client] = n
+        else:
+            del self._waiting[waiter.client]
+
+    def _admit(self):
+        # with the lock held: admit waiters, lowest tag first, for as long as the next one fits
+        while self._heap:
+            waiter = self._heap[0]
+            if waiter.state != "waiting":
+                heapq.heappop(self._heap)
+                continue
+            if self._busy + waiter.n > self.slots:
+                break
+            heapq.heappop(self._heap)
+            self._dequeued(waiter)
+            waiter.state = "admitted"
+            self._busy += waiter.n
+            self._vtime = max(self._vtime, waiter.tag)
+            waiter.wake()
+        self._prune()
+
+    def _prune(self):
+        if len(self._finish) > 4 * self.max_waiting:
+            # idle clients start again from the virtual clock anyway
+            self._finish = {c: t for c, t in self._finish.items() if t > self._vtime}
+
+    def _release(self, n=1):
+        with self._lock:
+            self._busy -= n
+            self._admit()
+
+    def _cancel(self, waiter):
+        # True if the waiter got a slot after all and must release it
+        with self._lock:
+            if waiter.state == "admitted":
+                return True
+            waiter.state = "cancelled"
+            self._dequeued(waiter)
+            self.counters["rejected"] += 1
+            # a wide waiter at the head may have been holding back narrower ones that fit now
+            self._admit()
+            return False
+
+    @contextmanager
+    def slot(self, client, cost=1.0, timeout=-1, n=1):
+        """Hold n render slots for the with-block; timeout=None waits as long as it takes."""
+        timeout = self.timeout if timeout == -1 else timeout
+        n = max(1, min(n, self.slots))
+        event = threading.Event()
+        t0 = time.perf_counter()
+        waiter = self._enqueue(client, cost, n, event.set)
+        if waiter is not None and not event.wait(timeout) and not self._cancel(waiter):
+            raise RenderBusy(self.retry_after)
+        metrics.REGISTRY.observe("cv_stage_seconds", time.perf_counter() - t0, {"stage": "queue"})
+        try:
+            yield
+        finally:
+            self._release(n)
+
+    @asynccontextmanager
+    async def slot_async(self, client, cost=1.0, timeout=-1, n=1):
+        timeout = self.timeout if timeout == -1 else timeout
+        n = max(1, min(n, self.slots))
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+
+        def wake():
+            loop.call_soon_threadsafe(lambda: future.done() or future.set_result(None))
+
+        t0 = time.perf_counter()
+        waiter = self._enqueue(client, cost, n, wake)
+        if waiter is not None:
+            try:
+                await asyncio.wait_for(asyncio.shield(future), timeout)
+            except asyncio.TimeoutError:
+                if not self._cancel(waiter):
+                    raise RenderBusy(self.retry_after)
+            except asyncio.CancelledError:
+                if self._cancel(waiter):
+                    self._release(n)
+                raise
+        metrics.REGISTRY.observe("cv_stage_seconds", time.perf_counter() - t0, {"stage": "queue"})
+        try:
+            yield
+        finally:
+            self._release(n)
+
+    def stats(self):
+        with self._lock:
+            return dict(self.counters, busy=self._busy, waiting=self._queued, clients_waiting=len(self._waiting))
@@ -0,0 +1,386 @@
+"""CV payload schema: typed records and a single-pass parser for form or JSON input.
+
+parse_form() and parse_json() return (CV, output_format, template, accent,
+optimize) or raise SchemaError listing every problem found, each as {"field", "message"}.
+Text is size-checked before it is stripped or decoded, so oversized payloads
+are rejected without further work.
+"""
+import json
+import re
+
+TEMPLATES = ("sidebar", "band", "minimal")
+OUTPUT_FORMATS = ("docx", "pdf")
+# utils.optimize; None (not given) means the server's CV_OPTIMIZE
+OPTIMIZE_MODES = ("speed", "size")
+DEFAULT_ACCENT = "#b87333"
+_ACCENT = re.compile(r"#[0-9a-fA-F]{6}\Z")
+
+# whole request body, checked from Content-Length before anything is read
+MAX_PAYLOAD_BYTES = 1024 * 1024
+# characters per value
+MAX_SHORT = 300
+MAX_TEXT = 10000
+MAX_ITEM = 1000
+# a form's *_json field before it is decoded
+MAX_JSON_FIELD = 512 * 1024
+# items per list
+MAX_ITEMS = {
+    "skills": 100,
+    "languages": 50,
+    "experiences": 100,
+    "education": 50,
+    "projects": 100,
+    "certifications": 200,
+    "extras": 2000,
+    "bullets": 50,
+}
+
+TEXT_FIELDS = ("name", "job_title", "phone", "email", "location", "linkedin", "github", "website", "summary", "references")
+LINE_FIELDS = ("skills", "languages")
+LIST_FIELDS = ("experiences", "education", "projects", "certifications", "extras")
+_LONG_TEXT = ("summary", "references")
+# the id POST /photos returns: the SHA-256 of the upload, as utils.images stores it
+PHOTO_ID = re.compile(r"[0-9a-f]{64}\Z")
+_decoder = json.JSONDecoder()
+
+
+class SchemaError(ValueError):
+    status = 400
+    title = "invalid CV payload"
+
+    def __init__(self, errors):
+        super().__init__("; ".join(f"{e['field']}: {e['message']}" if e["field"] else e["message"] for e in errors))
+        self.errors = errors
+
+
+class PayloadTooLarge(SchemaError):
+    status = 413
+    title = "payload too large"
+
+    def __init__(self, size, limit=MAX_PAYLOAD_BYTES):
+        super().__init__([{"field": "", "message": f"payload of {size} bytes is over the {limit} byte limit"}])
+
+
+class _Record:
+    # _text: short string fields, in __slots__ order; _bullets: whether a bullets list follows
+    __slots__ = ()
+    _text = ()
+    _bullets = False
+
+    def to_dict(self):
+        return {k: getattr(self, k) for k in self.__slots__}
+
+
+class Experience(_Record):
+    __slots__ = ("title", "company", "location", "dates", "bullets")
+    _text = __slots__[:4]
+    _bullets = True
+
+    def __init__(self, title="", company="", location="", dates="", bullets=()):
+        self.title = title
+        self.company = company
+        self.location = location
+        self.dates = dates
+        self.bullets = bullets
+
+    def to_dict(self):
+        return {"title": self.title, "company": self.company, "location": self.location, "dates": self.dates,
+                "bullets": self.bullets}
+
+
+class Education(_Record):
+    __slots__ = ("degree", "institution", "location", "dates")
+    _text = __slots__
+
+    def __init__(self, degree="", institution="", location="", dates=""):
+        self.degree = degree
+        self.institution = institution
+        self.location = location
+        self.dates = dates
+
+    def to_dict(self):
+        return {"degree": self.degree, "institution": self.institution, "location": self.location,
+                "dates": self.dates}
+
+
+class Project(_Record):
+    __slots__ = ("name", "tech", "link", "bullets")
+    _text = __slots__[:3]
+    _bullets = True
+
+    def __init__(self, name="", tech="", link="", bullets=()):
+        self.name = name
+        self.tech = tech
+        self.link = link
+        self.bullets = bullets
+
+    def to_dict(self):
+        return {"name": self.name, "tech": self.tech, "link": self.link, "bullets": self.bullets}
+
+
+class Certification(_Record):
+    __slots__ = ("name", "issuer", "date")
+    _text = __slots__
+
+    def __init__(self, name="", issuer="", date=""):
+        self.name = name
+        self.issuer = issuer
+        self.date = date
+
+    def __str__(self):
+        return " | ".join(v for v in (self.name, self.issuer, self.date) if v)
+
+
+class CV(_Record):
+    __slots__ = TEXT_FIELDS + LINE_FIELDS + LIST_FIELDS + ("photo",)
+
+    def to_dict(self):
+        # the plain dict build_layout(), render_key() and the job queue work with
+        data = {k: getattr(self, k) for k in TEXT_FIELDS + LINE_FIELDS}
+        data["experiences"] = [r.to_dict() for r in self.experiences]
+        data["education"] = [r.to_dict() for r in self.education]
+        data["projects"] = [r.to_dict() for r in self.projects]
+        data["certifications"] = [str(c) for c in self.certifications]
+        data["extras"] = self.extras
+        if self.photo:
+            # only when set, so CVs without one keep the render keys they had
+            data["photo"] = self.photo
+        return data
+
+
+def _path(parts):
+    # ("experiences", 2, "bullets", 0) -> "experiences[2].bullets[0]"; only built for errors
+    if isinstance(parts, str):
+        return parts
+    field = parts[0]
+    for p in parts[1:]:
+        field += f"[{p}]" if isinstance(p, int) else f".{p}"
+    return field
+
+
+def _valid_strings(values, limit):
+    # every value is a str of at most limit characters
+    for v in values:
+        if type(v) is not str or len(v) > limit:
+            return False
+    return True
+
+
+class _Parser:
+    # The common case (every value present and well-formed) is checked with plain type and
+    # length tests; values are only gone through field by field to say what is wrong.
+    def __init__(self):
+        self.errors = []
+
+    def error(self, field, message):
+        self.errors.append({"field": _path(field), "message": message})
+
+    def text(self, field, value, limit=MAX_SHORT):
+        if type(value) is str and len(value) <= limit:
+            return value.strip()
+        if value is None:
+            return ""
+        if not isinstance(value, str):
+            self.error(field, "must be a string")
+        else:
+            self.error(field, f"is longer than {limit} characters")
+        return ""
+
+    def strings(self, field, values, limit=MAX_ITEM):
+        # non-empty stripped strings from a list
+        if _valid_strings(values, limit):
+            return list(filter(None, map(str.strip, values)))
+        out = []
+        for i, v in enumerate(values):
+            v = self.text((*field, i) if isinstance(field, tuple) else (field, i), v, limit)
+            if v:
+                out.append(v)
+        return out
+
+    def sized(self, field, value, kind, message="must be a list of strings"):
+        # value as a list no longer than MAX_ITEMS[kind], or None after recording why not
+        if type(value) is not list:
+            self.error(field, message)
+            return None
+        if len(value) > MAX_ITEMS[kind]:
+            self.error(field, f"has more than {MAX_ITEMS[kind]} items")
+            return None
+        return value
+
+    def lines(self, field, value, kind):
+        # a list of strings, or one string with an item per line
+        if value is None:
+            return []
+        if isinstance(value, str):
+            if len(value) > MAX_ITEMS[kind] * MAX_ITEM:
+                self.error(field, "is too long")
+                return []
+            value = value.split("\n")
+        value = self.sized(field, value, kind)
+        return [] if value is None else self.strings(field, value)
+
+    def records(self, field, value, cls):
+        if value is None:
+            return []
+        value = self.sized(field, value, field, "must be a list")
+        if not value:
+            return []
+        names, bullets = cls._text, cls._bullets
+        out = []
+        for item in value:
+            if type(item) is not dict:
+                break
+            row = [item.get(k) for k in names]
+            if not _valid_strings(row, MAX_SHORT):
+                break
+            row = [v.strip() for v in row]
+            if bullets:
+                items = item.get("bullets")
+                if type(items) is not list or len(items) > MAX_ITEMS["bullets"] or not _valid_strings(items, MAX_ITEM):
+                    break
+                row.append(list(filter(None, map(str.strip, items))))
+            out.append(cls(*row))
+        else:
+            return out
+        # something is missing or malformed: go through them again, recording each problem
+        return [r for r in (self.record(field, i, item, cls) for i, item in enumerate(value)) if r is not None]
+
+    def record(self, field, i, item, cls):
+        if type(item) is not dict:
+            self.error((field, i), "must be an object")
+            return None
+        values = [self.text((field, i, k), item.get(k)) for k in cls._text]
+        if cls._bullets:
+            values.append(self.lines((field, i, "bullets"), item.get("bullets"), "bullets"))
+        return cls(*values)
+
+    def certifications(self, value):
+        # plain strings (what the page sends) or {name, issuer, date} objects
+        if value is None:
+            return []
+        value = self.sized("certifications", value, "certifications", "must be a list")
+        if not value:
+            return []
+        if _valid_strings(value, MAX_ITEM):
+            return [Certification(name) for name in filter(None, map(str.strip, value))]
+        out = []
+        for i, item in enumerate(value):
+            if type(item) is str:
+                cert = Certification(self.text(("certifications", i), item, MAX_ITEM))
+            else:
+                cert = self.record("certifications", i, item, Certification)
+            if cert is not None and cert.name:
+                out.append(cert)
+        return out
+
+    def photo(self, value):
+        if value is None or value == "":
+            return ""
+        if type(value) is str and PHOTO_ID.match(value.strip()):
+            return value.strip()
+        self.error("photo", "must be the id returned by POST /photos")
+        return ""
+
+
+def _cv(p, values):
+    cv = CV()
+    get = values.get
+    for k in TEXT_FIELDS:
+        setattr(cv, k, p.text(k, get(k), MAX_TEXT if k in _LONG_TEXT else MAX_SHORT))
+    cv.skills = p.lines("skills", get("skills"), "skills")
+    cv.languages = p.lines("languages", get("languages"), "languages")
+    cv.experiences = p.records("experiences", get("experiences"), Experience)
+    cv.education = p.records("education", get("education"), Education)
+    cv.projects = p.records("projects", get("projects"), Project)
+    cv.certifications = p.certifications(get("certifications"))
+    extras = get("extras")
+    extras = None if extras is None else p.sized("extras", extras, "extras")
+    cv.extras = [] if extras is None else p.strings("extras", extras)
+    cv.photo = p.photo(get("photo"))
+    return cv
+
+
+def _choice(p, field, value, allowed, default, multiple, fold=False):
+    # one allowed value or, with multiple, "a,b" / ["a", "b"] as a tuple in the order given
+    if not value:
+        return (default,) if multiple else default
+    if multiple and isinstance(value, str):
+        value = value.split(",")
+    elif not multiple or not isinstance(value, list):
+        value = [value]
+    out = []
+    for v in value:
+        if isinstance(v, str):
+            v = v.strip().lower() if fold else v.strip()
+        if v not in allowed:
+            p.error(field, f"must be {'any' if multiple else 'one'} of: {', '.join(allowed)}")
+            return (default,) if multiple else default
+        if v not in out:
+            out.append(v)
+    return tuple(out) if multiple else out[0]
+
+
+def _options(p, get, multiple=False):
+    output_format = _choice(p, "output_format", get("output_format"), OUTPUT_FORMATS, "docx", multiple, fold=True)
+    template = _choice(p, "template", get("template"), TEMPLATES, "sidebar", multiple)
+    accent = get("accent") or DEFAULT_ACCENT
+    if not isinstance(accent, str) or not _ACCENT.match(accent):
+        p.error("accent", "must be a #rrggbb colour")
+    optimize = _choice(p, "optimize", get("optimize"), OPTIMIZE_MODES, None, False, fold=True)
+    return output_format, template, accent, optimize
+
+
+def _finish(p, values, get, multiple):
+    cv = _cv(p, values)
+    options = _options(p, get, multiple)
+    if p.errors:
+        raise SchemaError(p.errors)
+    return (cv,) + options
+
+
+def _decode_lists(p, form):
+    values = {}
+    for k in LIST_FIELDS:
+        raw = form.get(f"{k}_json")
+        if not raw:
+            continue
+        if len(raw) > MAX_JSON_FIELD:
+            p.error(f"{k}_json", f"is longer than {MAX_JSON_FIELD} characters")
+            continue
+        # raw_decode skips json.loads' wrapper; loads only runs again for surrounding
+        # whitespace, and to word the error
+        try:
+            value, end = _decoder.raw_decode(raw)
+            if end != len(raw):
+                value = json.loads(raw)
+        except ValueError:
+            try:
+                value = json.loads(raw)
+            except ValueError as e:
+                p.error(f"{k}_json", f"is not valid JSON: {e}")
+                continue
+        values[k] = value
+    return values
+
+
+def parse_form(form, multiple=False):
+    """Parse the multipart/urlencoded form the page posts to /generate.
+
+    With multiple, output_format and template may list several values
+    ("docx,pdf") and come back as tuples.
+    """
+    p = _Parser()
+    values = form.to_dict()
+    values.update(_decode_lists(p, form))
+    return _finish(p, values, form.get, multiple)
+
+
+def parse_json(item, multiple=False):
+    """Parse one JSON object using the form's field names (lists given as lists).
+
+    multiple as for parse_form(); the values may also be JSON lists.
+    """
+    p = _Parser()
+    if not isinstance(item, dict):
+        raise SchemaError([{"field": "", "message": "expected a JSON object"}])
+    return _finish(p, item, item.get, multiple)
@@ -0,0 +1,100 @@
+"""Startup warm-up: pay first-use costs before the app reports ready.
+
+The first render in a fresh process imports the rest of python-docx and
+ReportLab, parses python-docx's default template, loads font metrics and
+builds the per-template skeletons and paragraph styles. WarmUp runs a list
+of named steps (normally one render per template and format) in a
+background thread and records how long each took; /healthz reports ready
+once they have all finished.
+"""
+import threading
+import time
+
+from utils.schema import DEFAULT_ACCENT, OUTPUT_FORMATS, TEMPLATES
+
+# touches every section and inline markup path, without being long
+WARMUP_CV = {
+    "name": "Warm Up",
+    "job_title": "Engineer",
+    "phone": "+1 555 0100",
+    "email": "warm.up@example.com",
+    "location": "Berlin",
+    "linkedin": "linkedin.com/in/warmup",
+    "github": "github.com/warmup",
+    "website": "warmup.dev",
+    "summary": "Builds <b>reliable</b> services – fast.",
+    "skills": ["Python", "Flask"],
+    "languages": ["English", "Deutsch"],
+    "references": "Available on request",
+    "experiences": [{"title": "Engineer", "company": "Café", "location": "Remote", "dates": "2020 – 2024",
+                     "bullets": ["Cut latency by 40%", "Ran on-call"]}],
+    "education": [{"degree": "BSc", "institution": "TU Berlin", "location": "Berlin", "dates": "2016 – 2020"}],
+    "projects": [{"name": "Tool", "tech": "Python", "link": "https://example.com", "bullets": ["Shipped it"]}],
+    "certifications": ["Certified"],
+    "extras": ["Maintainer"],
+}
+
+
+def render_steps(render, templates=TEMPLATES, formats=OUTPUT_FORMATS, accent=DEFAULT_ACCENT):
+    """(name, fn) for one render of WARMUP_CV per template × format.
+
+    With PDF in formats there is one more render whose text needs the
+    embedded TrueType family, so its font files are parsed up front too.
+    """
+    steps = [
+        (f"{template}/{fmt}", lambda t=template, f=fmt: render(WARMUP_CV, f, t, accent))
+        for template in templates
+        for fmt in formats
+    ]
+    if "pdf" in formats:
+        steps.append(("pdf/unicode", lambda: render(dict(WARMUP_CV, name="Варм Ап"), "pdf", templates[0], accent)))
+    return steps
+
+
+class WarmUp:
+    def __init__(self, steps):
+        self.steps = list(steps)
+        self.status = "pending"
+        self.error = None
+        self.timings = {}
+        self.seconds = None
+        self._done = threading.Event()
+
+    def run(self):
+        self.status = "running"
+        t0 = time.perf_counter()
+        try:
+            for name, fn in self.steps:
+                t = time.perf_counter()
+                fn()
+                self.timings[name] = time.perf_counter() - t
+        except Exception as e:
+            self.error = f"{name}: {e}"
+            self.status = "failed"
+        else:
+            self.status = "ready"
+        finally:
+            self.seconds = time.perf_counter() - t0
+            self._done.set()
+
+    def start(self):
+        threading.Thread(target=self.run, name="warm-up", daemon=True).start()
+
+    def skip(self):
+        self.status = "ready"
+        self._done.set()
+
+    @property
+    def ready(self):
+        return self.status == "ready"
+
+    def wait(self, timeout=None):
+        return self._done.wait(timeout)
+
+    def to_dict(self):
+        return {
+            "status": self.status,
+            "error": self.error,
+            "seconds": None if self.seconds is None else round(self.seconds, 4),
+            "steps": {k: round(v, 4) for k, v in self.timings.items()},
+        }
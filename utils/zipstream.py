@@ -0,0 +1,47 @@
+import zipfile
+
+
+class _ChunkWriter:
+    # write-only sink for ZipFile; no seek() so zipfile falls back to data descriptors
+    def __init__(self):
+        self._chunks = []
+        self._offset = 0
+
+    def write(self, b):
+        self._chunks.append(bytes(b))
+        self._offset += len(b)
+        return len(b)
+
+    def tell(self):
+        return self._offset
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        out = b"".join(self._chunks)
+        self._chunks = []
+        return out
+
+
+def iter_zip(entries):
+    """Yield a ZIP archive chunk by chunk from an iterable of (filename, bytes).
+
+    Only the entry currently being written is held in memory, so the archive
+    can be streamed to the client while later entries are still rendering.
+    """
+    sink = _ChunkWriter()
+    with zipfile.ZipFile(sink, "w") as zf:
+        for filename, body in entries:
+            # DOCX is already a deflated zip; compressing it again is wasted CPU
+            if filename.lower().endswith(".docx"):
+                compress_type = zipfile.ZIP_STORED
+            else:
+                compress_type = zipfile.ZIP_DEFLATED
+            zf.writestr(filename, body, compress_type=compress_type)
+            chunk = sink.drain()
+            if chunk:
+                yield chunk
+    chunk = sink.drain()
+    if chunk:
+        yield chunk